@@ -7,6 +7,7 @@ import tempfile
 import bcf.data
 from datetime import datetime
 from xml.dom import minidom
+from xml.sax.saxutils import escape, quoteattr
 from xmlschema import XMLSchema
 from contextlib import contextmanager
 from shutil import copyfile
@@ -56,13 +57,12 @@ class BcfXml:
         return self.project
 
     def edit_project(self):
-        self.document = minidom.Document()
+        self.document = self._create_document()
         root = self._create_element(self.document, "ProjectExtension")
         project = self._create_element(root, "Project", {"ProjectId": self.project.project_id})
         self._create_element(project, "Name", text=self.project.name)
         self._create_element(root, "ExtensionSchema", text="extensions.xsd")
-        with open(os.path.join(self.filepath, "project.bcfp"), "wb") as f:
-            f.write(self.document.toprettyxml(encoding="utf-8"))
+        self._write_document(self.document, "project.bcfp")
 
     def save_project(self, filepath):
         with cd(self.filepath):
@@ -78,11 +78,10 @@ class BcfXml:
         return self.version
 
     def edit_version(self):
-        self.document = minidom.Document()
+        self.document = self._create_document()
         root = self._create_element(self.document, "Version", {"VersionId": self.version})
         version = self._create_element(root, "DetailedVersion", text=self.version)
-        with open(os.path.join(self.filepath, "bcf.version"), "wb") as f:
-            f.write(self.document.toprettyxml(encoding="utf-8"))
+        self._write_document(self.document, "bcf.version")
 
     def get_topics(self):
         self.topics = {}
@@ -204,7 +203,7 @@ class BcfXml:
             topic.modified_date = datetime.utcnow().isoformat()
             topic.modified_author = self.author
 
-        self.document = minidom.Document()
+        self.document = self._create_document()
         root = self._create_element(self.document, "Markup")
 
         self.write_header(topic.header, root)
@@ -268,8 +267,7 @@ class BcfXml:
         self.write_comments(topic.comments, root)
         self.write_viewpoints(topic.viewpoints, root, topic)
 
-        with open(os.path.join(self.filepath, topic.guid, "markup.bcf"), "wb") as f:
-            f.write(self.document.toprettyxml(encoding="utf-8"))
+        self._write_document(self.document, topic.guid, "markup.bcf")
 
     def write_header(self, header, root):
         if not header or not header.files:
@@ -344,7 +342,7 @@ class BcfXml:
             self.write_viewpoint(viewpoint, topic)
 
     def write_viewpoint(self, viewpoint, topic):
-        document = minidom.Document()
+        document = self._create_document()
         root = self._create_element(document, "VisualizationInfo", {"Guid": viewpoint.guid})
         self.write_viewpoint_components(viewpoint, root)
         self.write_viewpoint_orthogonal_camera(viewpoint, root)
@@ -352,8 +350,7 @@ class BcfXml:
         self.write_viewpoint_lines(viewpoint, root)
         self.write_viewpoint_clipping_planes(viewpoint, root)
         self.write_viewpoint_bitmaps(viewpoint, root)
-        with open(os.path.join(self.filepath, topic.guid, viewpoint.viewpoint), "wb") as f:
-            f.write(document.toprettyxml(encoding="utf-8"))
+        self._write_document(document, topic.guid, viewpoint.viewpoint)
 
     def write_viewpoint_components(self, viewpoint, parent):
         if not viewpoint.components:
@@ -745,6 +742,13 @@ class BcfXml:
             self.logger.error(error)
         return data
 
+    def _create_document(self):
+        return minidom.Document()
+
+    def _write_document(self, document, *path):
+        with open(os.path.join(self.filepath, *path), "wb") as f:
+            f.write(document.toprettyxml(encoding="utf-8"))
+
     def _create_element(self, parent, name, attributes={}, text=None):
         element = self.document.createElement(name)
         for key, value in attributes.items():
@@ -760,3 +764,143 @@ class BcfXml:
 
     def __del__(self):
         self.close_project()
+
+
+class BcfXmlWriter(BcfXml):
+    """Streams a new BCF-XML project straight into zip archives
+
+    Unlike BcfXml, nothing is extracted to a temporary directory and XML is
+    serialised without pretty printing. Topics are written once when they are
+    added, so their viewpoints must be added to the topic first. The project
+    and version files are written when an archive is closed.
+
+    If max_topics is set, a new archive is started whenever an archive holds
+    that many topics. An archive may also be started explicitly using split.
+    The first archive is written to the filepath and following archives are
+    numbered, e.g. clashes.bcf, clashes.1.bcf, clashes.2.bcf.
+    """
+
+    def __init__(self, filepath, max_topics=None):
+        super().__init__()
+        self.zip_filepath = filepath
+        self.max_topics = max_topics
+        self.zip_file = None
+        self.filepaths = []
+        self.total_archive_topics = 0
+
+    def new_project(self):
+        self.project.project_id = str(uuid.uuid4())
+        self.project.name = "New Project"
+        self.split()
+
+    def edit_project(self):
+        pass
+
+    def edit_version(self):
+        pass
+
+    def save_project(self, filepath=None):
+        self.close_project()
+        return self.filepaths
+
+    def split(self):
+        self.close_project()
+        base, ext = os.path.splitext(self.zip_filepath)
+        if self.filepaths:
+            filepath = f"{base}.{len(self.filepaths)}{ext}"
+        else:
+            filepath = self.zip_filepath
+        self.filepaths.append(filepath)
+        self.zip_file = zipfile.ZipFile(filepath, "w", zipfile.ZIP_DEFLATED)
+        self.total_archive_topics = 0
+
+    def add_topic(self, topic=None):
+        if self.max_topics and self.total_archive_topics >= self.max_topics:
+            self.split()
+        if topic is None:
+            topic = bcf.data.Topic()
+        if not topic.guid:
+            topic.guid = str(uuid.uuid4())
+        if not topic.title:
+            topic.title = "New Topic"
+        for viewpoint in topic.viewpoints.values():
+            if viewpoint.snapshot and os.path.isfile(viewpoint.snapshot):
+                filename = viewpoint.guid + os.path.splitext(viewpoint.snapshot)[-1]
+                self.zip_file.write(viewpoint.snapshot, f"{topic.guid}/{filename}")
+                viewpoint.snapshot = filename
+        self.edit_topic(topic)
+        self.total_archive_topics += 1
+        return topic
+
+    def add_viewpoint(self, topic, viewpoint=None):
+        if not viewpoint:
+            viewpoint = bcf.data.Viewpoint()
+        if not viewpoint.guid:
+            viewpoint.guid = str(uuid.uuid4())
+        if not viewpoint.viewpoint:
+            viewpoint.viewpoint = f"{viewpoint.guid}.bcfv"
+        topic.viewpoints[viewpoint.guid] = viewpoint
+        return viewpoint
+
+    def close_project(self):
+        if not self.zip_file:
+            return
+        super().edit_project()
+        super().edit_version()
+        self.zip_file.close()
+        self.zip_file = None
+
+    def _create_document(self):
+        return XmlDocument()
+
+    def _write_document(self, document, *path):
+        self.zip_file.writestr("/".join(path), document.serialise())
+
+    def _create_element(self, parent, name, attributes={}, text=None):
+        element = XmlElement(name)
+        for key, value in attributes.items():
+            if isinstance(value, bool):
+                element.attributes.append((key, str(value).lower()))
+            elif value:
+                element.attributes.append((key, str(value)))
+        if text is not None:
+            element.text = str(text)
+        parent.children.append(element)
+        return element
+
+
+class XmlDocument:
+    """A minimal XML document which serialises much faster than minidom"""
+
+    def __init__(self):
+        self.children = []
+
+    def serialise(self):
+        output = ['<?xml version="1.0" encoding="utf-8"?>']
+        for child in self.children:
+            child.serialise(output)
+        return "".join(output).encode("utf-8")
+
+
+class XmlElement:
+    __slots__ = ("name", "attributes", "text", "children")
+
+    def __init__(self, name):
+        self.name = name
+        self.attributes = []
+        self.text = None
+        self.children = []
+
+    def serialise(self, output):
+        output.append("<" + self.name)
+        for key, value in self.attributes:
+            output.append(f" {key}={quoteattr(value)}")
+        if self.text is None and not self.children:
+            output.append("/>")
+            return
+        output.append(">")
+        if self.text is not None:
+            output.append(escape(self.text))
+        for child in self.children:
+            child.serialise(output)
+        output.append(f"</{self.name}>")
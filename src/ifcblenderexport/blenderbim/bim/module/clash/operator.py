@@ -287,8 +287,12 @@ class SmartClashGroup(bpy.types.Operator):
 
         # execute the smart grouping
         save_path = bpy.path.ensure_ext(bpy.context.scene.BIMClashProperties.smart_grouped_clashes_path, ".json")
+        props = bpy.context.scene.BIMClashProperties
         smart_grouped_clashes = ifc_clasher.smart_group_clashes(
-            clash_sets, bpy.context.scene.BIMClashProperties.smart_clash_grouping_max_distance
+            clash_sets,
+            props.smart_clash_grouping_max_distance,
+            group_by_class=props.should_group_clashes_by_class,
+            group_by_storey=props.should_group_clashes_by_storey,
         )
 
         # save smart_groups to json
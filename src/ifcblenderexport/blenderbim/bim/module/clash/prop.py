@@ -51,3 +51,5 @@ class BIMClashProperties(PropertyGroup):
     smart_clash_grouping_max_distance: IntProperty(
         name="Smart Clash Grouping Max Distance", default=3, soft_min=1, soft_max=10
     )
+    should_group_clashes_by_class: BoolProperty(name="Group By Class", default=False)
+    should_group_clashes_by_storey: BoolProperty(name="Group By Storey", default=False)
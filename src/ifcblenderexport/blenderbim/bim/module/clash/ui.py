@@ -117,6 +117,9 @@ class BIM_PT_clash_manager(Panel):
 
         row = layout.row(align=True)
         row.prop(props, "smart_clash_grouping_max_distance")
+        row = layout.row(align=True)
+        row.prop(props, "should_group_clashes_by_class")
+        row.prop(props, "should_group_clashes_by_storey")
 
         row = layout.row(align=True)
         row.operator("bim.smart_clash_group")
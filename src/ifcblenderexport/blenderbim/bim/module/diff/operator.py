@@ -28,7 +28,14 @@ class VisualiseDiff(bpy.types.Operator):
         #ifc_file = IfcStore.get_file() # In case we get from Store
         ifc_file = ifcopenshell.open(context.scene.DiffProperties.diff_new_file) # for Now refer to the new file
         with open(bpy.context.scene.DiffProperties.diff_json_file, "r") as file:
-            diff = json.load(file)
+            if bpy.context.scene.DiffProperties.diff_json_file.endswith(".ndjson"):
+                # Line-delimited diffs have a record per element with its status
+                diff = {"added": set(), "deleted": set(), "changed": set()}
+                for line in file:
+                    record = json.loads(line)
+                    diff.setdefault(record["status"], set()).add(record["global_id"])
+            else:
+                diff = json.load(file)
         for obj in bpy.context.visible_objects:
             obj.color = (1.0, 1.0, 1.0, 0.2)
             global_id = ifc_file.by_id(obj.BIMObjectProperties.ifc_definition_id).GlobalId
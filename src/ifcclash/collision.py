@@ -4,6 +4,7 @@
 import numpy as np
 
 import collections
+import heapq
 
 try:
     # pip install python-fcl
@@ -186,7 +187,11 @@ class CollisionManager(object):
         # Add collision object to set
         if name in self._objs:
             self._manager.unregisterObject(self._objs[name])
-        self._objs[name] = {"obj": o, "geom": bvh}
+        # the local bounds are kept for the broad phase of the clearance queries
+        bounds = None
+        if len(mesh.vertices):
+            bounds = np.array([np.min(mesh.vertices, axis=0), np.max(mesh.vertices, axis=0)])
+        self._objs[name] = {"obj": o, "geom": bvh, "bounds": bounds, "transform": transform}
         # store the name of the geometry
         self._names[id(bvh)] = name
 
@@ -229,6 +234,7 @@ class CollisionManager(object):
             o = self._objs[name]["obj"]
             o.setRotation(transform[:3, :3])
             o.setTranslation(transform[:3, 3])
+            self._objs[name]["transform"] = transform
             self._manager.update(o)
         else:
             raise ValueError("{} not in collision manager!".format(name))
@@ -583,6 +589,104 @@ class CollisionManager(object):
         else:
             return distance
 
+    def in_clearance_internal(self, clearance):
+        """
+        Get all pairs of objects in the manager that are closer
+        to each other than the clearance distance.
+
+        Candidate pairs are found by sweeping the world aligned
+        bounding boxes inflated by the clearance, after which the
+        exact distance is only computed for these pairs.
+
+        Parameters
+        -------------
+        clearance : float
+          The distance below which pairs are reported
+
+        Returns
+        -----------
+        pairs : list of (2-tuple of str, DistanceData)
+          The names of the objects and their distance data
+        """
+        names, boxes = self._world_boxes()
+        pairs = []
+        for i, j in _overlapping_boxes(boxes, boxes, clearance, internal=True):
+            data = self._distance(self, names[i], self, names[j], clearance)
+            if data is not None:
+                pairs.append(((names[i], names[j]), data))
+        return pairs
+
+    def in_clearance_other(self, other_manager, clearance):
+        """
+        Get all pairs of objects, one in each manager, that are
+        closer to each other than the clearance distance.
+
+        Parameters
+        -------------
+        other_manager : CollisionManager
+          Another collision manager object
+        clearance : float
+          The distance below which pairs are reported
+
+        Returns
+        -----------
+        pairs : list of (2-tuple of str, DistanceData)
+          The names of the objects (first from this manager,
+          second from the other_manager) and their distance data
+        """
+        names, boxes = self._world_boxes()
+        other_names, other_boxes = other_manager._world_boxes()
+        pairs = []
+        for i, j in _overlapping_boxes(boxes, other_boxes, clearance):
+            data = self._distance(self, names[i], other_manager, other_names[j], clearance)
+            if data is not None:
+                pairs.append(((names[i], other_names[j]), data))
+        return pairs
+
+    def _world_boxes(self):
+        """
+        Get the world aligned bounding boxes of the objects
+        in the manager from their transformed local bounds.
+
+        Returns
+        -----------
+        names : list of str
+          The names of the objects
+        boxes : (n, 2, 3) float
+          The lower and upper corners of every box
+        """
+        names = [name for name, o in self._objs.items() if o["bounds"] is not None]
+        boxes = np.zeros((len(names), 2, 3))
+        # the 8 corners of a box as indices into its lower and upper bounds
+        corners = np.array([[(i >> k) & 1 for k in range(3)] for i in range(8)])
+        for i, name in enumerate(names):
+            bounds, transform = self._objs[name]["bounds"], self._objs[name]["transform"]
+            points = bounds[corners, [0, 1, 2]]
+            points = points @ transform[:3, :3].T + transform[:3, 3]
+            boxes[i] = points.min(axis=0), points.max(axis=0)
+        return names, boxes
+
+    @staticmethod
+    def _distance(manager, name, other_manager, other_name, clearance):
+        """
+        Get the distance data for a pair of objects if they are
+        closer to each other than the clearance distance.
+
+        Returns
+        -----------
+        data : DistanceData or None
+          Distance data, None if the objects are further apart
+        """
+        request = fcl.DistanceRequest(enable_nearest_points=True)
+        result = fcl.DistanceResult()
+        distance = fcl.distance(manager._objs[name]["obj"], other_manager._objs[other_name]["obj"], request, result)
+        if distance >= clearance:
+            return None
+        data = DistanceData((name, other_name), result)
+        # penetrating objects are reported with a zero distance
+        data._distance = max(distance, 0.0)
+        return data
+
     def _get_BVH(self, mesh):
         """
         Get a BVH for a mesh.
@@ -618,6 +722,63 @@ class CollisionManager(object):
         return self._names[id(geom)]
 
 
+def _overlapping_boxes(boxes, other_boxes, clearance, internal=False):
+    """
+    Find the pairs of boxes that overlap when inflated by the
+    clearance distance by sweeping along the x axis.
+
+    Boxes of both sets are inflated by half the clearance and
+    visited in order of their lower x. Each box is only tested
+    against the boxes of the other set whose extent along x has
+    not ended yet, which are kept in a heap by their upper x.
+
+    Parameters
+    -----------
+    boxes : (n, 2, 3) float
+      Lower and upper corners of the first set of boxes
+    other_boxes : (m, 2, 3) float
+      Lower and upper corners of the second set of boxes
+    clearance : float
+      The distance by which the boxes are inflated
+    internal : bool
+      If true, both sets are the same and every pair is
+      only reported once
+
+    Returns
+    ------------
+    pairs : generator of (int, int)
+      Indices into boxes and other_boxes
+    """
+    if not len(boxes) or not len(other_boxes):
+        return
+    box_sets = [boxes] if internal else [boxes, other_boxes]
+    box_sets = [np.stack([b[:, 0] - clearance / 2.0, b[:, 1] + clearance / 2.0], axis=1) for b in box_sets]
+    set_indices = np.concatenate([np.full(len(b), s) for s, b in enumerate(box_sets)])
+    box_indices = np.concatenate([np.arange(len(b)) for b in box_sets])
+    lower_x = np.concatenate([b[:, 0, 0] for b in box_sets])
+    # the boxes of each set whose extent along x contains the sweep position
+    active = [[] for b in box_sets]
+    for e in np.argsort(lower_x, kind="stable"):
+        s, i = set_indices[e], box_indices[e]
+        box = box_sets[s][i]
+        other = len(box_sets) - 1 - s
+        heap = active[other]
+        while heap and heap[0][0] < box[0, 0]:
+            heapq.heappop(heap)
+        if heap:
+            candidates = np.array([j for upper_x, j in heap])
+            candidate_boxes = box_sets[other][candidates]
+            overlapping = np.all((candidate_boxes[:, 0] <= box[1]) & (candidate_boxes[:, 1] >= box[0]), axis=1)
+            for j in candidates[overlapping]:
+                if internal:
+                    yield min(i, j), max(i, j)
+                elif s == 0:
+                    yield i, j
+                else:
+                    yield j, i
+        heapq.heappush(active[s], (box[1, 0], i))
+
+
 def mesh_to_BVH(mesh):
     """
     Create a BVHModel object from a Trimesh object
@@ -3,11 +3,15 @@
 import collision
 import ifcopenshell
 import ifcopenshell.geom
+import ifcopenshell.util.element
 import ifcopenshell.util.selector
 import multiprocessing
 import numpy as np
+import hashlib
+import pickle
 import json
 import sys
+import os
 import argparse
 import logging
 
@@ -21,38 +25,147 @@ class IfcClasher:
     def __init__(self, settings):
         self.settings = settings
         self.geom_settings = ifcopenshell.geom.settings()
+        # Tessellate each IfcRepresentationMap once, meshes are shared by geometry id
+        self.geom_settings.set(self.geom_settings.INSTANCE_MAPPED_ITEMS, True)
         self.clash_sets = []
         self.clash_data = {"meshes": {}}
         self.global_data = {"meshes": {}, "matrices": {}}
+        self.cache = {}
+        self.previous_clash_sets = {}
+        self.changed_global_ids = None
+        # Cache entries (re)created during this run, which are reused but not unchanged
+        self.refreshed_elements = set()
 
     def clash(self):
+        self.load_incremental_data()
         for clash_set in self.clash_sets:
             self.process_clash_set(clash_set)
+        self.save_cache()
+
+    def load_incremental_data(self):
+        # Meshes and geometry fingerprints of elements from a previous run
+        if self.settings.cache and os.path.isfile(self.settings.cache):
+            self.settings.logger.info(f"Loading cache {self.settings.cache} ...")
+            with open(self.settings.cache, "rb") as cache_file:
+                self.cache = pickle.load(cache_file)
+        # Clash results of a previous run that are carried forward for unchanged elements
+        if self.settings.previous:
+            with open(self.settings.previous, "r") as previous_file:
+                self.previous_clash_sets = {c["name"]: c for c in json.load(previous_file)}
+        # An ifcdiff result takes precedence over fingerprints to detect changes
+        if self.settings.diff:
+            with open(self.settings.diff, "r") as diff_file:
+                if self.settings.diff.endswith(".ndjson"):
+                    records = (json.loads(line) for line in diff_file)
+                    self.changed_global_ids = {r["global_id"] for r in records if r["status"] != "deleted"}
+                else:
+                    diff = json.load(diff_file)
+                    self.changed_global_ids = set(diff.get("added", [])) | set(diff.get("changed", {}).keys())
+                    self.changed_global_ids |= set(diff.get("matched", {}).keys())
+
+    def save_cache(self):
+        if not self.settings.cache:
+            return
+        for file_cache in self.cache.values():
+            used_meshes = set(e["mesh"] for e in file_cache["elements"].values())
+            file_cache["meshes"] = {k: v for k, v in file_cache["meshes"].items() if k in used_meshes}
+        with open(self.settings.cache, "wb") as cache_file:
+            pickle.dump(self.cache, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
 
     def process_clash_set(self, clash_set):
+        # Without previous results unchanged elements still have to be clashed
+        # against each other, so they share the collision manager of the
+        # changed elements and only their tessellation is skipped.
+        previous = self.previous_clash_sets.get(clash_set["name"])
+        unchanged = {}
         for ab in ["a", "b"]:
             self.settings.logger.info(f"Creating collision manager {ab} ...")
             clash_set[f"{ab}_cm"] = collision.CollisionManager()
+            cached_cm = collision.CollisionManager() if previous else clash_set[f"{ab}_cm"]
+            unchanged[ab] = set()
             self.settings.logger.info(f"Loading files {ab} ...")
             for data in clash_set[ab]:
                 data["ifc"] = ifcopenshell.open(data["file"])
                 self.patch_ifc(data["ifc"])
                 self.settings.logger.info(f"Creating collision data for {ab} ...")
                 if len(data["ifc"].by_type("IfcElement")) > 0:
-                    self.add_collision_objects(data, clash_set[f"{ab}_cm"])
+                    unchanged[ab] |= self.add_collision_objects(data, clash_set[f"{ab}_cm"], cached_cm)
+            if previous:
+                clash_set[f"{ab}_cached_cm"] = cached_cm
 
+        # Pairs of collision managers to test, None for an internal test
         if "b" in clash_set and clash_set["b"]:
-            results = clash_set["a_cm"].in_collision_other(clash_set["b_cm"], return_data=True)
+            manager_pairs = [(clash_set["a_cm"], clash_set["b_cm"])]
+            if previous:
+                manager_pairs.append((clash_set["a_cm"], clash_set["b_cached_cm"]))
+                manager_pairs.append((clash_set["a_cached_cm"], clash_set["b_cm"]))
         else:
-            results = clash_set["a_cm"].in_collision_internal(return_data=True)
+            unchanged["b"] = unchanged["a"]
+            manager_pairs = [(clash_set["a_cm"], None)]
+            if previous:
+                manager_pairs.append((clash_set["a_cm"], clash_set["a_cached_cm"]))
 
-        if not results[0]:
-            return
+        clash_set["clashes"] = {}
+
+        if clash_set.get("clearance"):
+            self.process_clearances(clash_set, manager_pairs)
+        else:
+            self.process_contacts(clash_set, manager_pairs)
+
+        if previous:
+            self.carry_forward_clashes(clash_set, previous, unchanged["a"], unchanged["b"])
+
+    def process_clearances(self, clash_set, manager_pairs):
+        """Reports element pairs closer to each other than the clearance distance
+
+        This includes pairs that collide, which are reported with a zero
+        distance. The position of a clearance clash is halfway between the
+        closest points of both elements.
+        """
+        clearance = clash_set["clearance"]
+        for a_cm, b_cm in manager_pairs:
+            if b_cm is None:
+                pairs = a_cm.in_clearance_internal(clearance)
+            else:
+                pairs = a_cm.in_clearance_other(b_cm, clearance)
+
+            for (a_global_id, b_global_id), data in pairs:
+                key = f"{a_global_id}-{b_global_id}"
+                if key in clash_set["clashes"] and clash_set["clashes"][key]["distance"] <= data.distance:
+                    continue
+
+                a = self.get_element(clash_set["a"], a_global_id)
+                if "b" in clash_set and clash_set["b"]:
+                    b = self.get_element(clash_set["b"], b_global_id)
+                else:
+                    b = self.get_element(clash_set["a"], b_global_id)
+
+                a_point = np.array(data.point(a_global_id))
+                b_point = np.array(data.point(b_global_id))
+                clash_set["clashes"][key] = {
+                    "a_global_id": a_global_id,
+                    "b_global_id": b_global_id,
+                    "a_ifc_class": a.is_a(),
+                    "b_ifc_class": b.is_a(),
+                    "a_name": a.Name,
+                    "b_name": b.Name,
+                    "position": list((a_point + b_point) / 2),
+                    "distance": data.distance,
+                    "a_point": list(a_point),
+                    "b_point": list(b_point),
+                }
+
+    def process_contacts(self, clash_set, manager_pairs):
+        contacts = []
+        for a_cm, b_cm in manager_pairs:
+            if b_cm is None:
+                contacts.extend(a_cm.in_collision_internal(return_data=True)[1])
+            else:
+                contacts.extend(a_cm.in_collision_other(b_cm, return_data=True)[1])
 
         tolerance = clash_set["tolerance"] if "tolerance" in clash_set else 0.01
-        clash_set["clashes"] = {}
 
-        for contact in results[1]:
+        for contact in contacts:
             a_global_id, b_global_id = contact.names
             a = self.get_element(clash_set["a"], a_global_id)
             if "b" in clash_set and clash_set["b"]:
@@ -135,6 +248,22 @@ class IfcClasher:
                 "penetration_depth": contact.raw.penetration_depth,
             }
 
+    def carry_forward_clashes(self, clash_set, previous, unchanged_a, unchanged_b):
+        has_b = "b" in clash_set and clash_set["b"]
+        total = 0
+        for key, clash in previous.get("clashes", {}).items():
+            if key in clash_set["clashes"]:
+                continue
+            if clash["a_global_id"] not in unchanged_a or clash["b_global_id"] not in unchanged_b:
+                continue
+            # Geometry is unchanged, but names may have been edited
+            a = self.get_element(clash_set["a"], clash["a_global_id"])
+            b = self.get_element(clash_set["b" if has_b else "a"], clash["b_global_id"])
+            clash.update({"a_ifc_class": a.is_a(), "b_ifc_class": b.is_a(), "a_name": a.Name, "b_name": b.Name})
+            clash_set["clashes"][key] = clash
+            total += 1
+        self.settings.logger.info(f"Carried forward {total} clashes between unchanged elements")
+
     # https://stackoverflow.com/questions/42740765/intersection-between-line-and-triangle-in-3d
     def intersect_line_triangle(self, q1, q2, p1, p2, p3):
         def signed_tetra_volume(a, b, c, d):
@@ -163,16 +292,35 @@ class IfcClasher:
         import bcf.bcfxml
 
         for i, clash_set in enumerate(self.clash_sets):
-            bcfxml = bcf.bcfxml.BcfXml()
+            if i == 0:
+                filepath = self.settings.output
+            else:
+                filepath = self.settings.output + f".{i}"
+            bcfxml = bcf.bcfxml.BcfXmlWriter(filepath, max_topics=self.settings.bcf_max_topics)
             bcfxml.new_project()
             bcfxml.project.name = clash_set["name"]
             bcfxml.edit_project()
-            for key, clash in clash_set["clashes"].items():
+
+            clashes = list(clash_set["clashes"].values())
+            if self.settings.bcf_split_by_group:
+                # Smart groups are named, ungrouped clashes are written first
+                clashes.sort(key=lambda clash: str(clash.get("smart_group", "")))
+
+            for j, clash in enumerate(clashes):
+                if (
+                    self.settings.bcf_split_by_group
+                    and j
+                    and clash.get("smart_group") != clashes[j - 1].get("smart_group")
+                ):
+                    bcfxml.split()
                 topic = bcf.data.Topic()
                 topic.title = "{}/{} and {}/{}".format(
                     clash["a_ifc_class"], clash["a_name"], clash["b_ifc_class"], clash["b_name"]
                 )
-                topic = bcfxml.add_topic(topic)
+                if "distance" in clash:
+                    topic.description = "Clearance of {} required, elements are {:.3f} apart".format(
+                        clash_set["clearance"], clash["distance"]
+                    )
                 viewpoint = bcf.data.Viewpoint()
                 viewpoint.perspective_camera = bcf.data.PerspectiveCamera()
                 position = np.array(clash["position"])
@@ -198,10 +346,9 @@ class IfcClasher:
                 viewpoint.components.visibility.default_visibility = True
                 viewpoint.snapshot = self.get_viewpoint_snapshot(viewpoint, mat)
                 bcfxml.add_viewpoint(topic, viewpoint)
-            if i == 0:
-                bcfxml.save_project(self.settings.output)
-            else:
-                bcfxml.save_project(self.settings.output + f".{i}")
+                bcfxml.add_topic(topic)
+            for filepath in bcfxml.save_project():
+                self.settings.logger.info(f"Exported BCF to {filepath}")
 
     def get_viewpoint_snapshot(self, viewpoint, mat):
         return None # Possible to overload this function in a GUI application if used as a library
@@ -229,6 +376,8 @@ class IfcClasher:
         for result in results:
             del result["a_cm"]
             del result["b_cm"]
+            result.pop("a_cached_cm", None)
+            result.pop("b_cached_cm", None)
             for ab in ["a", "b"]:
                 for data in result[ab]:
                     if "ifc" in data:
@@ -245,44 +394,136 @@ class IfcClasher:
             except:
                 pass
 
-    def add_collision_objects(self, data, cm):
+    def add_collision_objects(self, data, cm, cached_cm=None):
+        """Adds the elements of a file to the collision managers
+
+        Elements of which the geometry is unchanged since the cache was written
+        are not tessellated again but added from the cache to cached_cm.
+        Returns the GlobalIds of these unchanged elements.
+        """
         self.clash_data["meshes"] = {}
         selector = ifcopenshell.util.selector.Selector()
+        include = exclude = None
         if "selector" not in data:
-            iterator = ifcopenshell.geom.iterator(
-                self.geom_settings,
-                data["ifc"],
-                multiprocessing.cpu_count(),
-                exclude=(data["ifc"].by_type("IfcSpatialStructureElement")),
-            )
+            exclude = data["ifc"].by_type("IfcSpatialStructureElement")
         elif data["mode"] == "e":
-            iterator = ifcopenshell.geom.iterator(
-                self.geom_settings,
-                data["ifc"],
-                multiprocessing.cpu_count(),
-                exclude=selector.parse(data["ifc"], data["selector"]),
-            )
+            exclude = selector.parse(data["ifc"], data["selector"])
         elif data["mode"] == "i":
-            iterator = ifcopenshell.geom.iterator(
-                self.geom_settings,
-                data["ifc"],
-                multiprocessing.cpu_count(),
-                include=selector.parse(data["ifc"], data["selector"]),
+            include = selector.parse(data["ifc"], data["selector"])
+
+        unchanged = set()
+        file_cache = None
+        if self.settings.cache:
+            # Selections of the same file in different clash sets are cached separately
+            cache_key = "{}|{}|{}".format(os.path.abspath(data["file"]), data.get("mode", ""), data.get("selector", ""))
+            file_cache = self.cache.setdefault(cache_key, {"elements": {}, "meshes": {}})
+            file_cache["key"] = cache_key
+            candidates = include if include is not None else self.get_clash_candidates(data["ifc"], exclude)
+            reused, unchanged = self.add_cached_collision_objects(
+                data, cm, cm if cached_cm is None else cached_cm, file_cache, candidates
             )
+            if reused:
+                include = [e for e in candidates if e.GlobalId not in reused]
+                exclude = None
+                if not include:
+                    return unchanged
+
+        iterator = ifcopenshell.geom.iterator(
+            self.geom_settings, data["ifc"], multiprocessing.cpu_count(), include=include, exclude=exclude
+        )
         valid_file = iterator.initialize()
         if not valid_file:
-            return False
+            return unchanged
         old_progress = -1
         while True:
             progress = iterator.progress() // 2
             if progress > old_progress:
                 print("\r[" + "#" * progress + " " * (50 - progress) + "]", end="")
                 old_progress = progress
-            self.add_collision_object(data, cm, iterator.get())
+            self.add_collision_object(data, cm, iterator.get(), file_cache)
             if not iterator.next():
                 break
-
-    def add_collision_object(self, data, cm, shape):
+        return unchanged
+
+    def add_cached_collision_objects(self, data, cm, cached_cm, file_cache, candidates):
+        """Adds elements of which the cached geometry is still valid
+
+        Returns the GlobalIds of all elements taken from the cache and of those
+        that are unchanged since the previous run. The latter are added to
+        cached_cm, elements refreshed earlier during this run to cm.
+        """
+        candidate_ids = set(e.GlobalId for e in candidates)
+        elements = file_cache["elements"]
+        for global_id in list(elements.keys()):
+            if global_id not in candidate_ids:
+                del elements[global_id]
+
+        reused = set()
+        unchanged = set()
+        meshes = {}
+        for element in candidates:
+            cached = elements.get(element.GlobalId)
+            if not cached:
+                continue
+            is_refreshed = (file_cache["key"], element.GlobalId) in self.refreshed_elements
+            if is_refreshed:
+                pass
+            elif self.changed_global_ids is not None:
+                if element.GlobalId in self.changed_global_ids:
+                    del elements[element.GlobalId]
+                    continue
+            elif cached["fingerprint"] != self.get_geometry_fingerprint(data["ifc"], element):
+                del elements[element.GlobalId]
+                continue
+            if cached["mesh"] not in meshes:
+                mesh = Mesh()
+                mesh.vertices, mesh.faces = file_cache["meshes"][cached["mesh"]]
+                mesh.digest = cached["mesh"]
+                meshes[cached["mesh"]] = mesh
+            self.global_data["meshes"][element.GlobalId] = meshes[cached["mesh"]]
+            self.global_data["matrices"][element.GlobalId] = cached["matrix"]
+            (cm if is_refreshed else cached_cm).add_object(element.GlobalId, meshes[cached["mesh"]], cached["matrix"])
+            reused.add(element.GlobalId)
+            if not is_refreshed:
+                unchanged.add(element.GlobalId)
+        self.settings.logger.info(f"Reused {len(reused)} elements from the cache, {len(unchanged)} are unchanged")
+        return reused, unchanged
+
+    def get_clash_candidates(self, ifc_file, exclude):
+        exclude = set(e.id() for e in exclude or [])
+        return [e for e in ifc_file.by_type("IfcProduct") if e.Representation and e.id() not in exclude]
+
+    def get_geometry_fingerprint(self, ifc_file, element):
+        """Hashes the placement, representation and openings of an element
+
+        Instances are numbered in the order in which they are traversed, so
+        that the fingerprint does not depend on the STEP ids in the file.
+        """
+        roots = [element.ObjectPlacement, element.Representation]
+        for rel in getattr(element, "HasOpenings", None) or []:
+            roots.extend([rel.RelatedOpeningElement.ObjectPlacement, rel.RelatedOpeningElement.Representation])
+        fingerprint = hashlib.sha1()
+        for root in roots:
+            if root is None:
+                fingerprint.update(b"$;")
+                continue
+            instances = ifc_file.traverse(root)
+            index = {inst.id(): i for i, inst in enumerate(instances)}
+            for inst in instances:
+                fingerprint.update(self.serialise_canonically(inst, index, True).encode("utf-8"))
+                fingerprint.update(b";")
+        return fingerprint.hexdigest()
+
+    def serialise_canonically(self, value, index, is_root=False):
+        if isinstance(value, ifcopenshell.entity_instance):
+            if value.id() and not is_root:
+                return f"#{index[value.id()]}"
+            return value.is_a() + "(" + ",".join(self.serialise_canonically(v, index) for v in value) + ")"
+        elif isinstance(value, tuple):
+            return "(" + ",".join(self.serialise_canonically(v, index) for v in value) + ")"
+        return repr(value)
+
+    def add_collision_object(self, data, cm, shape, file_cache=None):
         if shape is None:
             return
         element = data["ifc"].by_id(shape.guid)
@@ -302,6 +543,20 @@ class IfcClasher:
         self.global_data["matrices"][shape.guid] = mat
         cm.add_object(shape.guid, mesh, mat)
 
+        if file_cache is not None:
+            # Meshes are keyed by content, as geometry ids are not stable between runs
+            if not hasattr(mesh, "digest"):
+                mesh.digest = hashlib.sha1(mesh.vertices.tobytes() + mesh.faces.tobytes()).hexdigest()
+                file_cache["meshes"][mesh.digest] = (mesh.vertices, mesh.faces)
+            file_cache["elements"][shape.guid] = {
+                "fingerprint": None
+                if self.changed_global_ids is not None
+                else self.get_geometry_fingerprint(data["ifc"], element),
+                "mesh": mesh.digest,
+                "matrix": mat,
+            }
+            self.refreshed_elements.add((file_cache["key"], shape.guid))
+
     def create_mesh(self, shape):
         f = shape.geometry.faces
         v = shape.geometry.verts
@@ -338,8 +593,14 @@ class IfcClasher:
         if element.ObjectPlacement.RelativePlacement.RefDirection:
             element.ObjectPlacement.RelativePlacement.RefDirection.DirectionRatios = (1.0, 0.0, 0.0)
 
-    def smart_group_clashes(self, clash_sets, max_clustering_distance):
-        from sklearn.cluster import OPTICS
+    def smart_group_clashes(self, clash_sets, max_clustering_distance, group_by_class=False, group_by_storey=False):
+        """Groups clashes of each clash set which are chained together by their positions
+
+        Two clashes end up in the same group when they are within the maximum
+        clustering distance of each other, either directly or through other
+        clashes. Optionally, only clashes between the same pair of IFC classes
+        or located in the same pair of building storeys are grouped together.
+        """
         from collections import defaultdict
 
         count_of_input_clashes = 0
@@ -349,6 +610,14 @@ class IfcClasher:
 
         count_of_clash_sets = len(clash_sets)
 
+        # set the desired maximum distance between the grouped points
+        if max_clustering_distance > 0:
+            max_distance_between_grouped_points = max_clustering_distance
+        else:
+            max_distance_between_grouped_points = 3
+
+        storeys = {}
+        output_clash_sets = defaultdict(list)
         for clash_set in clash_sets:
             if not "clashes" in clash_set.keys():
                 print(f"Skipping clash set [{clash_set['name']}] since it contains no clash results.")
@@ -356,67 +625,39 @@ class IfcClasher:
             clashes = clash_set["clashes"]
             if len(clashes) == 0:
                 print(f"Skipping clash set [{clash_set['name']}] since it contains no clash results.")
+                output_clash_sets[clash_set["name"]].append({})
                 continue
 
             count_of_input_clashes += len(clashes)
 
-            positions = []
+            # Clashes are only grouped with clashes sharing the same key
+            keys = defaultdict(list)
             for clash in clashes.values():
-                positions.append(clash["position"])
-
-            data = np.array(positions)
+                key = ()
+                if group_by_class:
+                    key += (clash["a_ifc_class"], clash["b_ifc_class"])
+                if group_by_storey:
+                    key += (
+                        self.get_storey_name(clash_set, "a", clash["a_global_id"], storeys),
+                        self.get_storey_name(clash_set, "b", clash["b_global_id"], storeys),
+                    )
+                keys[key].append(clash)
+
+            smart_groups = {}
+            for key_clashes in keys.values():
+                positions = [clash["position"] for clash in key_clashes]
+                groups = self.group_positions(positions, max_distance_between_grouped_points)
+                group_names = {}
+                for clash, group in zip(key_clashes, groups):
+                    if group not in group_names:
+                        group_names[group] = f"{clash_set['name']} - {len(smart_groups) + 1}"
+                        smart_groups[group_names[group]] = []
+                    clash["smart_group"] = group_names[group]
+                    smart_groups[group_names[group]].append([clash["a_global_id"], clash["b_global_id"]])
 
-            # INPUTS
-            # set the desired maximum distance between the grouped points
-            if max_clustering_distance > 0:
-                max_distance_between_grouped_points = max_clustering_distance
-            else:
-                max_distance_between_grouped_points = 3
-
-            model = OPTICS(min_samples=2, max_eps=max_distance_between_grouped_points)
-            model.fit_predict(data)
-            pred = model.fit_predict(data)
-
-            # Insert the smart groups into the clashes
-            if len(pred) == len(clashes.values()):
-                i = 0
-                for clash in clashes.values():
-                    int_prediction = int(pred[i])
-                    if int_prediction == -1:
-                        # ungroup this clash since it's a single clash that we were not able to group.
-                        new_clash_group_number = np.amax(pred).item() + 1 + i
-                        clash["smart_group"] = new_clash_group_number
-                    else:
-                        clash["smart_group"] = int_prediction
-                    i += 1
-
-        # Create JSON with smart_groups that contain GlobalIDs
-        output_clash_sets = defaultdict(list)
-        for clash_set in clash_sets:
-            if not "clashes" in clash_set.keys():
-                continue
-            smart_groups = defaultdict(list)
-            for clash_id, content in clash_set["clashes"].items():
-                if "smart_group" in content:
-                    object_id_list = list()
-                    # Clash has been grouped, let's extract it.
-                    object_id_list.append(content["a_global_id"])
-                    object_id_list.append(content["b_global_id"])
-                    smart_groups[content["smart_group"]].append(object_id_list)
             count_of_smart_groups += len(smart_groups)
             output_clash_sets[clash_set["name"]].append(smart_groups)
 
-        # Rename the clash groups to something more sensible
-        for clash_set, smart_groups in output_clash_sets.items():
-            clash_set_name = clash_set
-            # Only select the clashes that correspond to the actively selected IFC Clash Set
-            i = 1
-            new_smart_group_name = ""
-            for smart_group, global_id_pairs in list(smart_groups[0].items()):
-                new_smart_group_name = f"{clash_set_name} - {i}"
-                smart_groups[0][new_smart_group_name] = smart_groups[0].pop(smart_group)
-                i += 1
-
         count_of_final_clash_sets = len(output_clash_sets)
         print(
             f"Took {count_of_input_clashes} clashes in {count_of_clash_sets} clash sets and turned",
@@ -425,11 +666,166 @@ class IfcClasher:
 
         return output_clash_sets
 
+    def group_positions(self, positions, max_distance, batch_size=1000000):
+        """Returns a group number per position, chaining positions within the max distance
+
+        Positions are hashed into a uniform grid with cells small enough that
+        all positions within a cell are within the max distance of each other.
+        Only positions of neighbouring cells then need to be compared, which
+        is done in batches of about batch_size position pairs, and connected
+        cells are merged using a union-find.
+        """
+        positions = np.array(positions, dtype=float).reshape(-1, 3)
+        cell_size = max_distance / np.sqrt(3)
+        reach = int(np.ceil(max_distance / cell_size))
+        squared_distance = max_distance * max_distance
+
+        cells = np.floor(positions / cell_size).astype(np.int64)
+        cells -= cells.min(axis=0) - reach
+        dimensions = cells.max(axis=0) + reach + 1
+        cell_keys = (cells[:, 0] * dimensions[1] + cells[:, 1]) * dimensions[2] + cells[:, 2]
+        unique_keys, cell_of_position, cell_counts = np.unique(cell_keys, return_inverse=True, return_counts=True)
+
+        # Unique keys are sorted, so positions sorted by cell are contiguous per cell
+        cell_positions = positions[np.argsort(cell_of_position, kind="stable")]
+        cell_starts = np.concatenate(([0], np.cumsum(cell_counts)[:-1]))
+
+        # Half of the neighbourhood suffices since each pair of cells is symmetrical
+        offsets = [
+            (x, y, z)
+            for x in range(-reach, reach + 1)
+            for y in range(-reach, reach + 1)
+            for z in range(-reach, reach + 1)
+            if (x, y, z) > (0, 0, 0)
+            and sum(max(abs(o) - 1, 0) ** 2 for o in (x, y, z)) * cell_size * cell_size <= squared_distance
+        ]
+
+        a_cells = []
+        b_cells = []
+        for x, y, z in offsets:
+            neighbour_keys = unique_keys + (x * dimensions[1] + y) * dimensions[2] + z
+            neighbours = np.searchsorted(unique_keys, neighbour_keys)
+            neighbours[neighbours == len(unique_keys)] = 0
+            is_occupied = unique_keys[neighbours] == neighbour_keys
+            a_cells.append(np.flatnonzero(is_occupied))
+            b_cells.append(neighbours[is_occupied])
+        a_cells = np.concatenate(a_cells)
+        b_cells = np.concatenate(b_cells)
+
+        # Cells of which the positions' bounding boxes are too far apart are never connected
+        cell_mins = np.minimum.reduceat(cell_positions, cell_starts)
+        cell_maxs = np.maximum.reduceat(cell_positions, cell_starts)
+        gaps = np.maximum(cell_mins[a_cells] - cell_maxs[b_cells], cell_mins[b_cells] - cell_maxs[a_cells])
+        gaps = np.maximum(gaps, 0)
+        is_reachable = np.einsum("ij,ij->i", gaps, gaps) <= squared_distance
+        a_cells = a_cells[is_reachable]
+        b_cells = b_cells[is_reachable]
+
+        parents = list(range(len(unique_keys)))
+
+        def find(cell):
+            while parents[cell] != cell:
+                parents[cell] = parents[parents[cell]]
+                cell = parents[cell]
+            return cell
+
+        def get_roots():
+            roots = np.array(parents)
+            while True:
+                next_roots = roots[roots]
+                if (next_roots == roots).all():
+                    return roots
+                roots = next_roots
+
+        def is_close(a_positions, b_positions):
+            differences = a_positions[:, None, :] - b_positions[None, :, :]
+            return (np.einsum("ijk,ijk->ij", differences, differences) <= squared_distance).any()
+
+        def connect(a_cells, b_cells, counts):
+            # Compares the first counts positions of each cell, cheapest pairs first
+            pair_sizes = counts[a_cells] * counts[b_cells]
+            pair_order = np.argsort(pair_sizes, kind="stable")
+            a_cells, b_cells, pair_sizes = a_cells[pair_order], b_cells[pair_order], pair_sizes[pair_order]
+            while len(pair_sizes):
+                total = max(np.searchsorted(np.cumsum(pair_sizes), batch_size, side="right"), 1)
+                a_batch, b_batch, sizes = a_cells[:total], b_cells[:total], pair_sizes[:total]
+                a_cells, b_cells, pair_sizes = a_cells[total:], b_cells[total:], pair_sizes[total:]
+
+                if sizes[0] > batch_size:
+                    # A single pair of dense cells is compared in chunks
+                    a_positions = cell_positions[cell_starts[a_batch[0]] :][: counts[a_batch[0]]]
+                    b_positions = cell_positions[cell_starts[b_batch[0]] :][: counts[b_batch[0]]]
+                    step = max(batch_size // len(b_positions), 1)
+                    chunks = range(0, len(a_positions), step)
+                    is_connected = [any(is_close(a_positions[i : i + step], b_positions) for i in chunks)]
+                else:
+                    pair = np.repeat(np.arange(total), sizes)
+                    index = np.arange(len(pair)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+                    b_count = counts[b_batch][pair]
+                    differences = (
+                        cell_positions[cell_starts[a_batch][pair] + index // b_count]
+                        - cell_positions[cell_starts[b_batch][pair] + index % b_count]
+                    )
+                    is_pair_close = np.einsum("ij,ij->i", differences, differences) <= squared_distance
+                    is_connected = np.bincount(pair[is_pair_close], minlength=total) > 0
+
+                for a, b in zip(a_batch[is_connected].tolist(), b_batch[is_connected].tolist()):
+                    a, b = find(a), find(b)
+                    if a != b:
+                        parents[a] = b
+
+                # Pairs of cells which are now connected through other cells are skipped
+                roots = get_roots()
+                is_separate = roots[a_cells] != roots[b_cells]
+                a_cells, b_cells, pair_sizes = a_cells[is_separate], b_cells[is_separate], pair_sizes[is_separate]
+
+        # Comparing a few positions per cell first connects most cells of dense clusters cheaply
+        connect(a_cells, b_cells, np.minimum(cell_counts, 8))
+        roots = get_roots()
+        is_separate = roots[a_cells] != roots[b_cells]
+        connect(a_cells[is_separate], b_cells[is_separate], cell_counts)
+
+        return [find(cell) for cell in cell_of_position.tolist()]
+
+    def get_storey_name(self, clash_set, ab, global_id, storeys):
+        """Returns the name of the storey containing an element of a clash set
+
+        Files are opened once and storey names are memoised in the storeys
+        dictionary, keyed by the file path and GlobalId.
+        """
+        for data in clash_set[ab]:
+            key = (data["file"], global_id)
+            if key in storeys:
+                return storeys[key]
+            if data["file"] not in storeys:
+                storeys[data["file"]] = data.get("ifc") or ifcopenshell.open(data["file"])
+            try:
+                element = storeys[data["file"]].by_guid(global_id)
+            except:
+                continue
+            while element and not element.is_a("IfcBuildingStorey"):
+                container = ifcopenshell.util.element.get_container(element)
+                if container:
+                    element = container
+                elif getattr(element, "Decomposes", None):
+                    element = element.Decomposes[0].RelatingObject
+                else:
+                    element = None
+            storeys[key] = element.Name if element else None
+            return storeys[key]
+
 
 class IfcClashSettings:
     def __init__(self):
         self.logger = None
         self.output = "clashes.json"
+        # Incremental clashing, see IfcClasher.add_collision_objects
+        self.cache = None
+        self.previous = None
+        self.diff = None
+        # BCF export may be split into multiple files, see IfcClasher.export_bcfxml
+        self.bcf_max_topics = None
+        self.bcf_split_by_group = False
 
 
 if __name__ == "__main__":
@@ -438,10 +834,43 @@ if __name__ == "__main__":
     parser.add_argument(
         "-o", "--output", type=str, help="The JSON diff file to output. Defaults to output.json", default="output.json"
     )
+    parser.add_argument(
+        "-c", "--cache", type=str, help="A cache file of element meshes, created if it does not exist", default=None
+    )
+    parser.add_argument(
+        "-p",
+        "--previous",
+        type=str,
+        help="The JSON output of a previous run, clashes between unchanged elements are carried forward",
+        default=None,
+    )
+    parser.add_argument(
+        "-d",
+        "--diff",
+        type=str,
+        help="An ifcdiff JSON file of the changed elements, used instead of geometry fingerprints",
+        default=None,
+    )
+    parser.add_argument(
+        "--bcf-max-topics",
+        type=int,
+        help="The maximum number of topics per BCF file, further topics are split into numbered files",
+        default=None,
+    )
+    parser.add_argument(
+        "--bcf-split-by-group",
+        action="store_true",
+        help="Write a separate BCF file for each smart group of clashes",
+    )
     args = parser.parse_args()
 
     settings = IfcClashSettings()
     settings.output = args.output
+    settings.cache = args.cache
+    settings.previous = args.previous
+    settings.diff = args.diff
+    settings.bcf_max_topics = args.bcf_max_topics
+    settings.bcf_split_by_group = args.bcf_split_by_group
     settings.logger = logging.getLogger("Clash")
     settings.logger.setLevel(logging.DEBUG)
     handler = logging.StreamHandler(sys.stdout)
@@ -197,7 +197,9 @@ int main(int argc, char** argv) {
 	typedef char char_t;
 #endif
 
-	double deflection_tolerance, angular_tolerance, force_space_transparency;
+	double deflection_tolerance, angular_tolerance, force_space_transparency, element_time_budget;
+	int max_boolean_operands, lod_resolution;
+	std::string level_of_detail;
 	inclusion_filter include_filter;
 	inclusion_traverse_filter include_traverse_filter;
 	exclusion_filter exclude_filter;
@@ -292,6 +294,16 @@ int main(int argc, char** argv) {
 		("disable-boolean-results",
 			"Specifies whether to disable the boolean operation within representations "
 			"such as clippings by means of IfcBooleanResult and subtypes")
+		("element-time-budget", po::value<double>(&element_time_budget)->default_value(-1.),
+			"Time in seconds after which remaining boolean operations (clippings and "
+			"opening subtractions) for a single element are skipped. Disabled by default.")
+		("max-boolean-operands", po::value<int>(&max_boolean_operands)->default_value(-1),
+			"Maximum number of boolean operands evaluated for a single element. Elements "
+			"with more operands are not clipped nor have their openings subtracted. "
+			"Disabled by default.")
+		("bounding-box-fallback",
+			"Specifies whether elements exceeding --element-time-budget or "
+			"--max-boolean-operands are to be replaced by their bounding box.")
 		("enable-layerset-slicing",
 			"Specifies whether to enable the slicing of products according "
 			"to their associated IfcMaterialLayerSet.")
@@ -329,6 +341,13 @@ int main(int argc, char** argv) {
 			"model in other modelling application in any case.")
 		("deflection-tolerance", po::value<double>(&deflection_tolerance)->default_value(1e-3),
 			"Sets the deflection tolerance of the mesher, 1e-3 by default if not specified.")
+		("level-of-detail", po::value<std::string>(&level_of_detail),
+			"Replaces the triangulation of elements by a reduced level of detail: 'full' (default), "
+			"'simplified', 'convex-hull' or 'bounding-box'. Bounding boxes are computed without "
+			"triangulating the elements.")
+		("lod-resolution", po::value<int>(&lod_resolution)->default_value(8),
+			"Number of grid cells along every axis of an element in which vertices are clustered "
+			"for --level-of-detail simplified, 8 by default if not specified.")
 		("force-space-transparency", po::value<double>(&force_space_transparency),
 			"Overrides transparency of spaces in geometry output.")
 		("angular-tolerance", po::value<double>(&angular_tolerance)->default_value(0.5),
@@ -460,6 +479,7 @@ int main(int argc, char** argv) {
 #endif
 	const bool disable_opening_subtractions = vmap.count("disable-opening-subtractions") != 0;
 	const bool disable_boolean_results = vmap.count("disable-boolean-results") != 0;
+	const bool bounding_box_fallback = vmap.count("bounding-box-fallback") != 0;
 	const bool include_plan = vmap.count("plan") != 0;
 	const bool include_model = vmap.count("model") != 0 || (!include_plan);
 	const bool enable_layerset_slicing = vmap.count("enable-layerset-slicing") != 0;
@@ -730,6 +750,7 @@ int main(int argc, char** argv) {
 #endif
 	settings.set(IfcGeom::IteratorSettings::DISABLE_OPENING_SUBTRACTIONS, disable_opening_subtractions);
 	settings.set(IfcGeom::IteratorSettings::DISABLE_BOOLEAN_RESULT, disable_boolean_results);
+	settings.set(IfcGeom::IteratorSettings::BOUNDING_BOX_FALLBACK, bounding_box_fallback);
 	settings.set(IfcGeom::IteratorSettings::INCLUDE_CURVES,               include_plan);
 	settings.set(IfcGeom::IteratorSettings::EXCLUDE_SOLIDS_AND_SURFACES,  !include_model);
 	settings.set(IfcGeom::IteratorSettings::APPLY_LAYERSETS,              enable_layerset_slicing);
@@ -751,8 +772,31 @@ int main(int argc, char** argv) {
 	settings.set(SerializerSettings::USE_ELEMENT_HIERARCHY, use_element_hierarchy);
     settings.set_deflection_tolerance(deflection_tolerance);
 	settings.set_angular_tolerance(angular_tolerance);
+	settings.set_element_time_budget(element_time_budget);
+	settings.set_max_boolean_operands(max_boolean_operands);
 	settings.precision = precision;
 
+	if (vmap.count("level-of-detail")) {
+		boost::to_lower(level_of_detail);
+		if (level_of_detail == "full") {
+			settings.set_level_of_detail(IfcGeom::IteratorSettings::LOD_FULL);
+		} else if (level_of_detail == "simplified") {
+			settings.set_level_of_detail(IfcGeom::IteratorSettings::LOD_SIMPLIFIED);
+		} else if (level_of_detail == "convex-hull") {
+			settings.set_level_of_detail(IfcGeom::IteratorSettings::LOD_CONVEX_HULL);
+		} else if (level_of_detail == "bounding-box") {
+			settings.set_level_of_detail(IfcGeom::IteratorSettings::LOD_BOUNDING_BOX);
+		} else {
+			cerr_ << "[Error] --level-of-detail should be one of full, simplified, convex-hull or bounding-box" << std::endl;
+			return EXIT_FAILURE;
+		}
+	}
+	if (lod_resolution < 1) {
+		cerr_ << "[Error] --lod-resolution should be at least 1" << std::endl;
+		return EXIT_FAILURE;
+	}
+	settings.set_lod_resolution(lod_resolution);
+
 	if (vmap.count("force-space-transparency")) {
 		settings.force_space_transparency(force_space_transparency);
 		IfcGeom::update_default_style("IfcSpace").Transparency().reset(force_space_transparency);
@@ -88,37 +88,204 @@ class IfcAttributeSetter:
 
 class IfcCsv:
     def __init__(self):
-        self.results = []
         self.attributes = []
         self.output = ""
         self.selector = None
         self.delimiter = ";"
+        self.format = "csv"
+        self.chunk_size = 10000
+        self.rejected_output = None
+        self.rejected_cells = []
 
     def export(self, ifc_file, elements):
+        """Exports the attributes of elements as rows of a CSV, Parquet or Arrow file
+
+        Rows are written in chunks as they are resolved, so they are never all
+        held in memory. Property sets and quantities are indexed once from
+        their relationships, and the properties of each definition are only
+        read once, no matter how many elements share it. Parquet and Arrow
+        rows are resolved twice, first to infer the type of each column from
+        all of its values, then to write them.
+        """
         self.ifc_file = ifc_file
-        for element in elements:
-            result = []
-            if hasattr(element, "GlobalId"):
-                result.append(element.GlobalId)
+        self.attribute_indices = {}
+        self.property_definitions = None
+        self.properties = {}
+        attributes = []
+        for attribute in self.attributes:
+            if "*" in attribute:
+                attributes.extend(self.get_wildcard_attributes(attribute))
             else:
-                result.append(None)
+                attributes.append(attribute)
+        self.attributes = attributes
+        header = ["GlobalId"] + self.attributes
+        if self.format == "csv":
+            self.write_csv(header, self.get_chunks(self.get_rows(elements)))
+        elif self.format in ("parquet", "arrow"):
+            elements = list(elements)
+            self.write_arrow(header, lambda: self.get_chunks(self.get_rows(elements)))
+        else:
+            raise ValueError("Unknown format {}, expected csv, parquet or arrow".format(self.format))
+
+    def get_rows(self, elements):
+        columns = [self.get_column(a) for a in self.attributes]
+        for element in elements:
+            related_elements = {}
+            row = [getattr(element, "GlobalId", None)]
+            for relation, key in columns:
+                if relation:
+                    if relation not in related_elements:
+                        related_elements[relation] = self.get_related_element(element, relation)
+                    related_element = related_elements[relation]
+                    row.append(self.get_element_value(related_element, key) if related_element else None)
+                else:
+                    row.append(self.get_element_value(element, key))
+            yield row
+
+    def get_chunks(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def get_column(self, attribute):
+        if "." in attribute and attribute.split(".")[0] in ("type", "material", "container"):
+            return attribute.split(".", 1)
+        return (None, attribute)
+
+    def get_related_element(self, element, relation):
+        try:
+            if relation == "type":
+                return ifcopenshell.util.element.get_type(element)
+            elif relation == "material":
+                return ifcopenshell.util.element.get_material(element)
+            elif relation == "container":
+                return ifcopenshell.util.element.get_container(element)
+        except:
+            return
+
+    def get_element_value(self, element, key):
+        # Resolves the same values as the selector, without a get_info and get_psets per value
+        if key == "id":
+            return element.id()
+        elif key == "type":
+            return element.is_a()
+        index = self.get_attribute_index(element, key)
+        if index is not None:
+            return element[index]
+        elif "." in key:
+            pset_name, prop = key.split(".", 1)
+            definition = self.get_property_definition(element, pset_name)
+            if definition:
+                return self.get_properties(definition).get(prop)
+
+    def get_attribute_index(self, element, key):
+        ifc_class = element.is_a()
+        if (ifc_class, key) not in self.attribute_indices:
+            # The wrapper does not raise for unknown names, so only forward attributes are looked up
+            index = None
+            if element.wrapped_data.get_attribute_category(key) == 1:
+                index = element.wrapped_data.get_argument_index(key)
+            self.attribute_indices[(ifc_class, key)] = index
+        return self.attribute_indices[(ifc_class, key)]
 
-            for index, attribute in enumerate(self.attributes):
-                if "*" in attribute:
-                    self.attributes.extend(self.get_wildcard_attributes(attribute))
-                    del self.attributes[index]
+    def get_property_definition(self, element, name):
+        if self.property_definitions is None:
+            self.property_definitions = {}
+            for rel in self.ifc_file.by_type("IfcRelDefinesByProperties"):
+                for related_object in rel.RelatedObjects:
+                    self.property_definitions.setdefault(related_object.id(), []).append(
+                        rel.RelatingPropertyDefinition
+                    )
+            for element_type in self.ifc_file.by_type("IfcTypeObject"):
+                self.property_definitions[element_type.id()] = list(element_type.HasPropertySets or [])
+        result = None
+        for definition in self.property_definitions.get(element.id(), []):
+            # Like get_psets, a later definition with the same name replaces an earlier one
+            if definition.Name == name:
+                result = definition
+        return result
 
-            for attribute in self.attributes:
-                result.append(self.selector.get_element_value(element, attribute))
-            self.results.append(result)
+    def get_properties(self, definition):
+        if definition.id() not in self.properties:
+            self.properties[definition.id()] = ifcopenshell.util.element.get_property_definition(definition)
+        return self.properties[definition.id()]
 
+    def write_csv(self, header, chunks):
         with open(self.output, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
-            header = ["GlobalId"]
-            header.extend(self.attributes)
             writer.writerow(header)
-            for row in self.results:
-                writer.writerow(row)
+            for chunk in chunks:
+                writer.writerows(chunk)
+
+    def write_arrow(self, header, get_chunks):
+        import pyarrow
+
+        # Types are inferred from all rows before any are written, so that all chunks share one schema
+        arrow_types = [None] * len(header)
+        for chunk in get_chunks():
+            arrow_types = [self.get_arrow_type(c, t) for c, t in zip(zip(*chunk), arrow_types)]
+        schema = pyarrow.schema([(h, t or pyarrow.string()) for h, t in zip(header, arrow_types)])
+        writer = self.get_arrow_writer(schema)
+        try:
+            for chunk in get_chunks():
+                arrays = [
+                    pyarrow.array([self.get_arrow_value(v, field.type) for v in c], type=field.type)
+                    for field, c in zip(schema, zip(*chunk))
+                ]
+                writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+        finally:
+            writer.close()
+
+    def get_arrow_writer(self, schema):
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        if self.format == "parquet":
+            return pyarrow.parquet.ParquetWriter(self.output, schema)
+        return pyarrow.ipc.new_file(self.output, schema)
+
+    def get_arrow_type(self, values, arrow_type=None):
+        """Returns the narrowest type which fits the values of a column and its previous type
+
+        Integers are widened to floats, and any other mix of types to strings.
+        """
+        import pyarrow
+
+        numeric_types = (pyarrow.int64(), pyarrow.float64())
+        for value in values:
+            if value is None or arrow_type == pyarrow.string():
+                continue
+            elif isinstance(value, bool):
+                value_type = pyarrow.bool_()
+            elif isinstance(value, int) and -(2**63) <= value < 2**63:
+                value_type = pyarrow.int64()
+            elif isinstance(value, (int, float)):
+                value_type = pyarrow.float64()
+            else:
+                value_type = pyarrow.string()
+            if arrow_type is None or arrow_type == value_type:
+                arrow_type = value_type
+            elif arrow_type in numeric_types and value_type in numeric_types:
+                arrow_type = pyarrow.float64()
+            else:
+                arrow_type = pyarrow.string()
+        return arrow_type
+
+    def get_arrow_value(self, value, arrow_type):
+        import pyarrow
+
+        if value is None:
+            return None
+        elif arrow_type == pyarrow.string():
+            return str(value)
+        elif arrow_type == pyarrow.float64():
+            return float(value)
+        return value
 
     def get_wildcard_attributes(self, attribute):
         results = set()
@@ -130,27 +297,151 @@ class IfcCsv:
                 results.update([p.Name for p in element.HasProperties])
             else:
                 results.update([p.Name for p in element.Quantities])
-        return ["{}.{}".format(pset_qto_name, n) for n in results]
+        return ["{}.{}".format(pset_qto_name, n) for n in sorted(results)]
 
     def Import(self, ifc):
+        """Imports the rows of a CSV into the elements with the GlobalId of their first column
+
+        Rows are read and applied in chunks. Elements, property sets,
+        quantity sets and their properties are looked up through indexes built
+        once for the file. Values are cast to the schema type of the attribute,
+        quantity or NominalValue they are set to. Empty cells are skipped.
+        Cells which cannot be set are listed in rejected_cells, and are also
+        written as a CSV to the rejected_output path if given.
+        """
         ifc_file = ifcopenshell.open(ifc)
+        self.ifc_file = ifc_file
+        self.schema = ifcopenshell.ifcopenshell_wrapper.schema_by_name(ifc_file.schema)
+        self.attribute_indices = {}
+        self.attribute_types = {}
+        self.property_definitions = None
+        self.definition_properties = {}
+        self.rejected_cells = []
+        self.elements = {e.GlobalId: e for e in ifc_file.by_type("IfcRoot")}
         with open(self.output, newline="", encoding="utf-8") as f:
             reader = csv.reader(f, delimiter=self.delimiter)
-            headers = []
-            for row in reader:
-                if not headers:
-                    headers = row
+            headers = next(reader, None)
+            if headers:
+                row_number = 1
+                for chunk in self.get_chunks(reader):
+                    self.import_rows(chunk, headers, row_number)
+                    row_number += len(chunk)
+        ifc_file.write(ifc)
+        if self.rejected_cells:
+            print("{} cells could not be imported".format(len(self.rejected_cells)))
+        if self.rejected_output:
+            with open(self.rejected_output, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["Row", "GlobalId", "Column", "Value", "Reason"])
+                writer.writerows(self.rejected_cells)
+
+    def import_rows(self, rows, headers, row_number):
+        updates = []
+        for i, row in enumerate(rows, row_number + 1):
+            if not row:
+                continue
+            element = self.elements.get(row[0])
+            if element is None:
+                self.rejected_cells.append((i, row[0], headers[0], row[0], "The element was not found"))
+                continue
+            # A class change replaces the element, so it happens before its other values are resolved
+            if "type" in headers[1:]:
+                value = row[headers.index("type")]
+                if value and element.is_a() != value:
+                    element = self.reassign_class(element, value)
+            for key, value in zip(headers[1:], row[1:]):
+                if value == "" or key in ("type", "id"):
                     continue
                 try:
-                    element = ifc_file.by_guid(row[0])
-                except:
-                    print("The element with GUID {} was not found".format(row[0]))
-                    continue
-                for i, value in enumerate(row):
-                    if i == 0:
-                        continue  # Skip GlobalId
-                    element = IfcAttributeSetter.set_element_key(ifc_file, element, headers[i], value)
-        ifc_file.write(ifc)
+                    updates.append(((i, row[0], key, value), self.get_update(element, key, value)))
+                except ValueError as e:
+                    self.rejected_cells.append((i, row[0], key, value, str(e)))
+        for cell, (entity, index, value) in updates:
+            try:
+                entity[index] = value
+            except (ValueError, TypeError, RuntimeError) as e:
+                self.rejected_cells.append(cell + (str(e),))
+
+    def reassign_class(self, element, ifc_class):
+        new_element = ifcopenshell.util.schema.reassign_class(self.ifc_file, element, ifc_class)
+        self.elements[new_element.GlobalId] = new_element
+        if self.property_definitions is not None and element.id() != new_element.id():
+            self.property_definitions[new_element.id()] = self.property_definitions.pop(element.id(), [])
+        return new_element
+
+    def get_update(self, element, key, value):
+        """Returns the entity, attribute index and cast value to set a cell"""
+        index = self.get_attribute_index(element, key)
+        if index is not None:
+            return (element, index, self.cast_value(value, self.get_attribute_type(element.is_a(), index)))
+        elif "." not in key:
+            raise ValueError("{} has no attribute {}".format(element.is_a(), key))
+        pset_name, prop_name = key.split(".", 1)
+        definition = self.get_property_definition(element, pset_name)
+        if not definition:
+            raise ValueError("The element has no property set {}".format(pset_name))
+        if definition.id() not in self.definition_properties:
+            if definition.is_a("IfcElementQuantity"):
+                properties = definition.Quantities
+            else:
+                properties = getattr(definition, "HasProperties", None) or []
+            self.definition_properties[definition.id()] = {p.Name: p for p in properties}
+        prop = self.definition_properties[definition.id()].get(prop_name)
+        if prop is None:
+            raise ValueError("{} has no property {}".format(pset_name, prop_name))
+        elif prop.is_a("IfcPhysicalSimpleQuantity"):
+            # The value of a quantity always follows its name, description and unit
+            return (prop, 3, self.cast_value(value, self.get_attribute_type(prop.is_a(), 3)))
+        elif prop.is_a("IfcPropertySingleValue") and prop.NominalValue:
+            value_type = prop.NominalValue.is_a()
+            nominal_value = self.ifc_file.create_entity(
+                value_type, self.cast_value(value, self.get_declaration_type(value_type))
+            )
+            return (prop, self.get_attribute_index(prop, "NominalValue"), nominal_value)
+        raise ValueError("The type of {} is unknown".format(key))
+
+    def get_attribute_type(self, ifc_class, index):
+        if (ifc_class, index) not in self.attribute_types:
+            attribute = self.schema.declaration_by_name(ifc_class).all_attributes()[index]
+            self.attribute_types[(ifc_class, index)] = self.get_primitive_type(attribute.type_of_attribute())
+        return self.attribute_types[(ifc_class, index)]
+
+    def get_declaration_type(self, ifc_class):
+        if ifc_class not in self.attribute_types:
+            self.attribute_types[ifc_class] = self.get_primitive_type(self.schema.declaration_by_name(ifc_class))
+        return self.attribute_types[ifc_class]
+
+    def get_primitive_type(self, declaration):
+        wrapper = ifcopenshell.ifcopenshell_wrapper
+        # Defined types are flattened to the simple type or enumeration they are based on
+        while isinstance(declaration, (wrapper.named_type, wrapper.type_declaration)):
+            declaration = declaration.declared_type()
+        if isinstance(declaration, wrapper.simple_type):
+            return declaration.declared_type()
+        elif isinstance(declaration, wrapper.enumeration_type):
+            return tuple(declaration.enumeration_items())
+
+    def cast_value(self, value, value_type):
+        if value_type in ("string", "binary"):
+            return value
+        elif value_type in ("real", "number"):
+            return float(value)
+        elif value_type == "integer":
+            number = float(value)
+            if not number.is_integer():
+                raise ValueError("{} is not an integer".format(value))
+            return int(number)
+        elif value_type in ("boolean", "logical"):
+            if value.lower() in ["1", "t", "true", "yes", "y", "uh-huh"]:
+                return True
+            elif value.lower() in ["0", "f", "false", "no", "n"]:
+                return False
+            raise ValueError("{} is not a boolean".format(value))
+        elif isinstance(value_type, tuple):
+            if value.upper() not in value_type:
+                raise ValueError("{} is not one of {}".format(value, ", ".join(value_type)))
+            return value.upper()
+        raise ValueError("Only simple values may be imported")
 
 
 if __name__ == "__main__":
@@ -159,8 +450,16 @@ if __name__ == "__main__":
     parser.add_argument("-c", "--csv", type=str, default="data.csv", help="The CSV file to import from or export to")
     parser.add_argument("-q", "--query", type=str, default="", help='Specify a IFC query selector, such as ".IfcWall"')
     parser.add_argument("-a", "--arguments", nargs="+", help="Specify attributes that are part of the extract, using the IfcQuery syntax such as 'type', 'Name' or 'Pset_Foo.Bar'")
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        choices=["csv", "parquet", "arrow"],
+        help="The format to export to, by default guessed from the extension of the output file",
+    )
     parser.add_argument("--export", action="store_true", help="Export from IFC to CSV")
     parser.add_argument("--import", action="store_true", help="Import from CSV to IFC")
+    parser.add_argument("--rejected", type=str, help="A CSV file to list the cells which could not be imported")
     args = parser.parse_args()
 
     if args.export:
@@ -171,8 +470,15 @@ if __name__ == "__main__":
         ifc_csv.output = args.csv
         ifc_csv.attributes = args.arguments if args.arguments else []
         ifc_csv.selector = selector
+        if args.format:
+            ifc_csv.format = args.format
+        elif args.csv.lower().endswith(".parquet"):
+            ifc_csv.format = "parquet"
+        elif args.csv.lower().endswith((".arrow", ".feather", ".ipc")):
+            ifc_csv.format = "arrow"
         ifc_csv.export(ifc_file, results)
     elif getattr(args, "import"):
         ifc_csv = IfcCsv()
         ifc_csv.output = args.csv
+        ifc_csv.rejected_output = args.rejected
         ifc_csv.Import(args.ifc)
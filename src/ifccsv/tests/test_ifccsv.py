@@ -0,0 +1,81 @@
+import os
+import sys
+import csv
+import ifcopenshell
+import ifcopenshell.guid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ifccsv import IfcCsv
+
+
+def create_file():
+    ifc_file = ifcopenshell.file(schema="IFC4")
+    wall = ifc_file.createIfcWall(ifcopenshell.guid.new(), Name="Wall")
+    properties = [
+        ifc_file.createIfcPropertySingleValue("IsExternal", None, ifc_file.createIfcBoolean(False)),
+        ifc_file.createIfcPropertySingleValue("Count", None, ifc_file.createIfcInteger(1)),
+        ifc_file.createIfcPropertySingleValue("Width", None, ifc_file.createIfcReal(1.5)),
+        ifc_file.createIfcPropertySingleValue("Reference", None, ifc_file.createIfcLabel("A")),
+    ]
+    pset = ifc_file.createIfcPropertySet(ifcopenshell.guid.new(), Name="Pset_WallCommon", HasProperties=properties)
+    quantity = ifc_file.createIfcQuantityLength("Length", None, None, 2.0)
+    qto = ifc_file.createIfcElementQuantity(
+        ifcopenshell.guid.new(), Name="Qto_WallBaseQuantities", Quantities=[quantity]
+    )
+    for definition in (pset, qto):
+        ifc_file.createIfcRelDefinesByProperties(ifcopenshell.guid.new(), None, None, None, [wall], definition)
+    return ifc_file
+
+
+def test_exporting_attributes_properties_and_quantities(tmp_path):
+    ifc_file = create_file()
+    wall = ifc_file.by_type("IfcWall")[0]
+    ifc_csv = IfcCsv()
+    ifc_csv.output = str(tmp_path / "export.csv")
+    ifc_csv.attributes = ["Name", "Pset_WallCommon.Reference", "Qto_WallBaseQuantities.Length"]
+    ifc_csv.export(ifc_file, [wall])
+    with open(ifc_csv.output, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ["GlobalId", "Name", "Pset_WallCommon.Reference", "Qto_WallBaseQuantities.Length"],
+        [wall.GlobalId, "Wall", "A", "2.0"],
+    ]
+
+
+def test_importing_attributes_properties_and_quantities(tmp_path):
+    ifc_path = str(tmp_path / "model.ifc")
+    ifc_file = create_file()
+    ifc_file.write(ifc_path)
+    global_id = ifc_file.by_type("IfcWall")[0].GlobalId
+    ifc_csv = IfcCsv()
+    ifc_csv.output = str(tmp_path / "import.csv")
+    with open(ifc_csv.output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=ifc_csv.delimiter)
+        writer.writerow(
+            [
+                "GlobalId",
+                "Name",
+                "Pset_WallCommon.IsExternal",
+                "Pset_WallCommon.Count",
+                "Pset_WallCommon.Width",
+                "Pset_WallCommon.Reference",
+                "Qto_WallBaseQuantities.Length",
+            ]
+        )
+        writer.writerow([global_id, "New Wall", "yes", "2", "2.5", "B", "3"])
+        writer.writerow(["1234567890123456789012", "Unknown", "", "", "", "", ""])
+        writer.writerow([global_id, "", "", "1.5", "", "", ""])
+    ifc_csv.Import(ifc_path)
+
+    ifc_file = ifcopenshell.open(ifc_path)
+    wall = ifc_file.by_type("IfcWall")[0]
+    pset, qto = [r.RelatingPropertyDefinition for r in wall.IsDefinedBy]
+    properties = {p.Name: p.NominalValue.wrappedValue for p in pset.HasProperties}
+    assert wall.Name == "New Wall"
+    assert properties == {"IsExternal": True, "Count": 2, "Width": 2.5, "Reference": "B"}
+    assert qto.Quantities[0].LengthValue == 3.0
+    assert [(c[0], c[1], c[2], c[3]) for c in ifc_csv.rejected_cells] == [
+        (3, "1234567890123456789012", "GlobalId", "1234567890123456789012"),
+        (4, global_id, "Pset_WallCommon.Count", "1.5"),
+    ]
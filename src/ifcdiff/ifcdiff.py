@@ -7,17 +7,38 @@ import time
 import json
 import argparse
 import decimal
+import hashlib
+import collections.abc
+import multiprocessing
 
 
 class IfcDiff:
-    def __init__(self, old_file, new_file, output_file, inverse_classes=None):
+    def __init__(
+        self,
+        old_file,
+        new_file,
+        output_file,
+        inverse_classes=None,
+        processes=1,
+        compare_shapes=False,
+        output_format="json",
+        match_distance=None,
+    ):
         self.old_file = old_file
         self.new_file = new_file
         self.output_file = output_file
         self.change_register = {}
-        self.representation_ids = []
         self.inverse_classes = inverse_classes
         self.precision = 2
+        self.fingerprinters = {}
+        self.processes = processes
+        self.compare_shapes = compare_shapes
+        self.geometry_settings = None
+        self.output_format = output_format
+        self.stream = None
+        self.total_changed = 0
+        self.match_distance = match_distance
+        self.matched_elements = {}
 
     def diff(self):
         print("# IFC Diff")
@@ -30,46 +51,155 @@ class IfcDiff:
 
         self.deleted_elements = old_elements - new_elements
         self.added_elements = new_elements - old_elements
-        same_elements = new_elements - self.added_elements
+        same_elements = [(g, g) for g in new_elements - self.added_elements]
+
+        self.create_fingerprinters()
+        if self.match_distance:
+            self.match_elements()
+            same_elements.extend((old, new) for new, old in self.matched_elements.items())
         total_same_elements = len(same_elements)
 
         print(" - {} item(s) were deleted".format(len(self.deleted_elements)))
         print(" - {} item(s) were added".format(len(self.added_elements)))
+        if self.match_distance:
+            print(" - {} item(s) were matched despite a different GlobalId".format(len(self.matched_elements)))
         print(" - {} item(s) were retained between the old and new IFC file".format(total_same_elements))
 
+        if self.output_format == "ndjson":
+            self.open_stream()
+
         start = time.time()
-        total_diffed = 0
 
-        for global_id in same_elements:
+        if self.processes > 1 and same_elements:
+            self.diff_elements_in_parallel(same_elements)
+        else:
+            self.diff_elements(same_elements, verbose=True)
+
+        print(" - {} item(s) were changed either geometrically or with data".format(self.total_changed))
+        print("# Diff finished in {:.2f} seconds".format(time.time() - start))
+
+    def diff_elements(self, global_id_pairs, verbose=False):
+        total_diffed = 0
+        total_global_ids = len(global_id_pairs)
+        for old_global_id, global_id in global_id_pairs:
             total_diffed += 1
-            print("{}/{} diffed ...".format(total_diffed, total_same_elements), end="\r", flush=True)
-            old_element = self.old.by_id(global_id)
+            if verbose:
+                print("{}/{} diffed ...".format(total_diffed, total_global_ids), end="\r", flush=True)
+            old_element = self.old.by_id(old_global_id)
             new_element = self.new.by_id(global_id)
-            self.diff_element(old_element, new_element)
-            self.diff_element_inverse_relationships(old_element, new_element)
-
-            representation_id = self.get_representation_id(new_element)
-            if representation_id in self.representation_ids:
-                continue
-            self.representation_ids.append(representation_id)
+            if self.is_changed("attributes", old_element, new_element):
+                self.diff_element(old_element, new_element)
+            if self.inverse_classes and self.is_changed("inverses", old_element, new_element):
+                self.diff_element_inverse_relationships(old_element, new_element)
             self.diff_element_geometry(old_element, new_element)
+            if global_id in self.change_register:
+                self.total_changed += 1
+                if self.stream:
+                    self.write_change(global_id, self.change_register.pop(global_id))
 
-        print(" - {} item(s) were changed either geometrically or with data".format(len(self.change_register.keys())))
-        print("# Diff finished in {:.2f} seconds".format(time.time() - start))
+    def diff_elements_in_parallel(self, global_id_pairs):
+        """Diffs elements using a pool of processes, each loading both files once
+
+        GlobalIds are split into many more partitions than processes to
+        balance the load, as some elements are much more expensive to diff
+        than others. Partitions are contiguous in sorted order, so that each
+        process can reuse its memoised fingerprints of shared entities. The
+        change registers of each partition are merged in the main process.
+        """
+        global_id_pairs = sorted(global_id_pairs)
+        total_partitions = min(len(global_id_pairs), self.processes * 8) or 1
+        size = -(-len(global_id_pairs) // total_partitions)
+        partitions = [global_id_pairs[i : i + size] for i in range(0, len(global_id_pairs), size)]
+        total_diffed = 0
+        with multiprocessing.Pool(
+            self.processes,
+            initializer=init_diff_process,
+            initargs=(self.old_file, self.new_file, self.inverse_classes, self.precision, self.compare_shapes),
+        ) as pool:
+            for change_register in pool.imap_unordered(diff_partition, partitions):
+                self.total_changed += len(change_register)
+                if self.stream:
+                    for global_id, changes in change_register.items():
+                        self.write_change(global_id, changes)
+                else:
+                    self.change_register.update(change_register)
+                total_diffed += 1
+                print("{}/{} partitions diffed ...".format(total_diffed, len(partitions)), end="\r", flush=True)
 
     def export(self):
+        if self.output_format == "ndjson":
+            # Records were already written while diffing
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            return
         with open(self.output_file, "w", encoding="utf-8") as diff_file:
             json.dump(
                 {
                     "added": list(self.added_elements),
                     "deleted": list(self.deleted_elements),
                     "changed": self.change_register,
+                    "matched": self.matched_elements,
                 },
                 diff_file,
                 indent=4,
                 cls=DiffEncoder,
             )
 
+    def open_stream(self):
+        """Starts a line-delimited JSON output, with one record per element
+
+        Records of added and deleted elements are written immediately, and a
+        record of a changed element is written as soon as it is diffed, after
+        which its changes are no longer kept in memory.
+        """
+        self.stream = open(self.output_file, "w", encoding="utf-8", buffering=1)
+        for global_id in self.added_elements:
+            self.stream.write(json.dumps({"global_id": global_id, "status": "added"}) + "\n")
+        for global_id in self.deleted_elements:
+            self.stream.write(json.dumps({"global_id": global_id, "status": "deleted"}) + "\n")
+        for global_id, old_global_id in self.matched_elements.items():
+            record = {"global_id": global_id, "status": "matched", "old_global_id": old_global_id}
+            self.stream.write(json.dumps(record) + "\n")
+
+    def write_change(self, global_id, changes):
+        record = {"global_id": global_id, "status": "changed", "changes": list(self.get_change_entries(changes))}
+        self.stream.write(json.dumps(record, cls=DiffEncoder) + "\n")
+
+    def get_change_entries(self, changes):
+        """Yields typed change entries from the merged changes of an element
+
+        Each entry has a type of attribute, relationship or geometry, the kind
+        of change, and where applicable the attribute path and old and new
+        values. Paths are relative to the element, or start with the index of
+        the inverse relationship.
+        """
+        for change, value in changes.items():
+            if change == "has_geometry_change":
+                if "geometry_change" not in changes:
+                    yield {"type": "geometry", "change": "changed"}
+                continue
+            elif change == "geometry_change":
+                entry = {"type": "geometry", "change": value["type"]}
+                entry.update({k: v for k, v in value.items() if k != "type"})
+                yield entry
+                continue
+            for path in value:
+                entry = {
+                    "type": "relationship" if path.startswith("root[") else "attribute",
+                    "change": change,
+                    "path": path[len("root") :].lstrip("."),
+                }
+                detail = value[path] if isinstance(value, dict) else None
+                if isinstance(detail, dict) and ("old_value" in detail or "new_value" in detail):
+                    entry["old"] = detail.get("old_value")
+                    entry["new"] = detail.get("new_value")
+                elif change.endswith("_added"):
+                    entry["new"] = detail
+                elif change.endswith("_removed"):
+                    entry["old"] = detail
+                yield entry
+
     def load(self):
         print("Loading old file ...")
         self.old = ifcopenshell.open(self.old_file)
@@ -88,6 +218,143 @@ class IfcDiff:
         except:
             return 2
 
+    def match_elements(self):
+        """Pairs deleted and added elements which are likely the same element
+
+        This is for files of which the authoring tool regenerates GlobalIds.
+        Deleted elements are indexed in a grid by their class and placement
+        position, so that each added element is only compared to elements of
+        the same class within the match distance in metres. Candidate pairs
+        are scored by their distance and the similarity of their name, type
+        and representation, and the best scoring pairs are matched first.
+        """
+        import itertools
+        import ifcopenshell.util.placement
+
+        old_scale = self.get_unit_scale(self.old)
+        new_scale = self.get_unit_scale(self.new)
+        old_placements = ifcopenshell.util.placement.PlacementResolver(self.old)
+        new_placements = ifcopenshell.util.placement.PlacementResolver(self.new)
+
+        index = {}
+        for global_id in self.deleted_elements:
+            element = self.old.by_id(global_id)
+            position = self.get_position(element, old_scale, old_placements)
+            if position is None:
+                continue
+            cell = tuple(int(v // self.match_distance) for v in position)
+            index.setdefault((element.is_a(), cell), []).append((global_id, element, position))
+
+        candidates = []
+        for global_id in self.added_elements:
+            element = self.new.by_id(global_id)
+            position = self.get_position(element, new_scale, new_placements)
+            if position is None:
+                continue
+            cell = tuple(int(v // self.match_distance) for v in position)
+            for offset in itertools.product((-1, 0, 1), repeat=3):
+                neighbour = tuple(c + o for c, o in zip(cell, offset))
+                for old_global_id, old_element, old_position in index.get((element.is_a(), neighbour), ()):
+                    distance = sum((a - b) ** 2 for a, b in zip(position, old_position)) ** 0.5
+                    if distance > self.match_distance:
+                        continue
+                    similarity = self.get_similarity(old_element, element)
+                    candidates.append((distance / self.match_distance + 1 - similarity, old_global_id, global_id))
+
+        matched_old_elements = set()
+        for score, old_global_id, global_id in sorted(candidates):
+            if old_global_id in matched_old_elements or global_id in self.matched_elements:
+                continue
+            matched_old_elements.add(old_global_id)
+            self.matched_elements[global_id] = old_global_id
+
+        self.deleted_elements -= matched_old_elements
+        self.added_elements -= set(self.matched_elements.keys())
+
+    def get_unit_scale(self, ifc_file):
+        import ifcopenshell.util.unit
+
+        try:
+            return ifcopenshell.util.unit.calculate_unit_scale(ifc_file)
+        except:
+            return 1
+
+    def get_position(self, element, unit_scale, placements):
+        placement = getattr(element, "ObjectPlacement", None)
+        if not placement or not placement.is_a("IfcLocalPlacement"):
+            return None
+        return [float(v) * unit_scale for v in placements.get_matrix(placement)[:3, 3]]
+
+    def get_similarity(self, old_element, new_element):
+        """Returns the similarity of two elements from 0 to 1 by name, type and representation"""
+        import difflib
+        import ifcopenshell.util.element
+
+        old_name = old_element.Name or ""
+        new_name = new_element.Name or ""
+        name_similarity = difflib.SequenceMatcher(None, old_name, new_name).ratio() if old_name or new_name else 1
+
+        old_type = ifcopenshell.util.element.get_type(old_element)
+        new_type = ifcopenshell.util.element.get_type(new_element)
+        old_type = (old_type.is_a(), old_type.Name) if old_type else None
+        new_type = (new_type.is_a(), new_type.Name) if new_type else None
+        type_similarity = 1 if old_type == new_type else 0
+
+        old_fingerprinter, new_fingerprinter = self.fingerprinters["geometry"]
+        old_representation = old_fingerprinter.get_fingerprint(old_element.Representation)
+        new_representation = new_fingerprinter.get_fingerprint(new_element.Representation)
+        representation_similarity = 1 if old_representation == new_representation else 0
+
+        return (name_similarity + type_similarity + representation_similarity) / 3
+
+    def create_fingerprinters(self):
+        """Creates fingerprinters for each kind of comparison of both files
+
+        Their excluded attributes mirror the exclude_regex_paths of the
+        DeepDiff comparisons, so that DeepDiff only needs to run on elements
+        of which the fingerprints differ. Geometry is compared by fingerprint
+        alone, ignoring the element which voids or projects an opening.
+        """
+        excludes = {
+            "attributes": ("GlobalId", "Representation", "OwnerHistory", "ObjectPlacement"),
+            "inverses": (
+                "GlobalId",
+                "OwnerHistory",
+                "RelatedObjects",
+                "RelatingObject",
+                "RelatingDefinitions",
+                "RelatedObjectsType",
+            ),
+            "geometry": ("GlobalId", "OwnerHistory", "RelatingBuildingElement"),
+        }
+        for name, exclude in excludes.items():
+            self.fingerprinters[name] = (
+                Fingerprinter(self.precision, exclude),
+                Fingerprinter(self.precision, exclude),
+            )
+
+    def is_changed(self, name, old_element, new_element):
+        old_fingerprinter, new_fingerprinter = self.fingerprinters[name]
+        old_fingerprint = old_fingerprinter.get_fingerprint(self.get_compared_value(name, self.old, old_element))
+        new_fingerprint = new_fingerprinter.get_fingerprint(self.get_compared_value(name, self.new, new_element))
+        return old_fingerprint != new_fingerprint
+
+    def get_compared_value(self, name, ifc_file, element):
+        if name == "attributes":
+            return element
+        elif name == "inverses":
+            relationships = ifc_file.get_inverse(element)
+            if self.inverse_classes[0] != "all":
+                relationships = [x for x in relationships if x.is_a() in self.inverse_classes]
+            return list(relationships)
+        elif name == "geometry":
+            return [
+                element.ObjectPlacement,
+                element.Representation,
+                getattr(element, "HasOpenings", None),
+                getattr(element, "HasProjections", None),
+            ]
+
     def diff_element(self, old_element, new_element):
         diff = DeepDiff(
             old_element,
@@ -97,13 +364,25 @@ class IfcDiff:
             ignore_numeric_type_changes=True,
             exclude_regex_paths=[
                 r"root.*id$",
+                r".*GlobalId.*",
                 r".*Representation.*",
                 r".*OwnerHistory.*",
                 r".*ObjectPlacement.*",
             ],
         )
         if diff and new_element.GlobalId:
-            self.change_register.setdefault(new_element.GlobalId, {}).update(diff)
+            self.register_change(new_element.GlobalId, diff)
+
+    def register_change(self, global_id, diff):
+        # Attribute and relationship changes of the same kind are merged rather than replaced
+        changes = self.change_register.setdefault(global_id, {})
+        for change, value in diff.items():
+            if change not in changes:
+                changes[change] = value
+            elif isinstance(value, dict):
+                changes[change] = {**changes[change], **value}
+            else:
+                changes[change] = [*changes[change], *value]
 
     def diff_element_inverse_relationships(self, old_element, new_element):
         if not self.inverse_classes:
@@ -134,64 +413,184 @@ class IfcDiff:
             ],
         )
         if diff and new_element.GlobalId:
-            self.change_register.setdefault(new_element.GlobalId, {}).update(diff)
+            self.register_change(new_element.GlobalId, diff)
 
     def diff_element_geometry(self, old_element, new_element):
+        if not self.is_changed("geometry", old_element, new_element) or not new_element.GlobalId:
+            return
+        if not self.compare_shapes:
+            return self.change_register.setdefault(new_element.GlobalId, {}).update({"has_geometry_change": True})
         try:
-            DeepDiff(
-                old_element.ObjectPlacement,
-                new_element.ObjectPlacement,
-                terminate_on_first=True,
-                significant_digits=self.precision,
-                ignore_string_type_changes=True,
-                ignore_numeric_type_changes=True,
-                exclude_regex_paths=r"root.*id$",
-            )
-            DeepDiff(
-                old_element.Representation,
-                new_element.Representation,
-                terminate_on_first=True,
-                skip_after_n=1000,  # Arbitrary value to "skim" check
-                significant_digits=self.precision,
-                ignore_string_type_changes=True,
-                ignore_numeric_type_changes=True,
-                exclude_regex_paths=r"root.*id$",
-            )
-            DeepDiff(
-                old_element.HasOpenings,
-                new_element.HasOpenings,
-                terminate_on_first=True,
-                significant_digits=self.precision,
-                ignore_string_type_changes=True,
-                ignore_numeric_type_changes=True,
-                exclude_regex_paths=r"root.*id$",
-            )
-            DeepDiff(
-                old_element.HasProjections,
-                new_element.HasProjections,
-                terminate_on_first=True,
-                significant_digits=self.precision,
-                ignore_string_type_changes=True,
-                ignore_numeric_type_changes=True,
-                exclude_regex_paths=r"root.*id$",
-            )
+            geometry_change = self.diff_element_shape(old_element, new_element)
         except:
-            if new_element.GlobalId:
-                return self.change_register.setdefault(new_element.GlobalId, {}).update({"has_geometry_change": True})
+            # Elements without a shape or which fail to tessellate are reported as changed
+            geometry_change = None
+        else:
+            if not geometry_change:
+                return
+        change = self.change_register.setdefault(new_element.GlobalId, {})
+        change["has_geometry_change"] = True
+        if geometry_change:
+            change["geometry_change"] = geometry_change
+
+    def diff_element_shape(self, old_element, new_element):
+        """Compares the tessellated shapes of two elements in world coordinates
+
+        This is only done for elements of which the geometry fingerprints
+        differ, so that geometry which is written differently but has the
+        same shape is not reported. Changed shapes are classified as moved
+        if only their position changed, resized if the size of their
+        bounding box changed, or otherwise reshaped.
+        """
+        import numpy as np
+
+        old_shape = self.get_shape_summary(self.old, old_element)
+        new_shape = self.get_shape_summary(self.new, new_element)
+        tolerance = 10 ** -self.precision
 
-    def get_representation_id(self, element):
-        if not element.Representation:
+        translation = new_shape["min"] - old_shape["min"]
+        size_change = (new_shape["max"] - new_shape["min"]) - (old_shape["max"] - old_shape["min"])
+        volume_change = new_shape["volume"] - old_shape["volume"]
+        area_change = new_shape["area"] - old_shape["area"]
+
+        if (np.abs(size_change) > tolerance).any():
+            change_type = "resized"
+        elif (
+            old_shape["vertices"] != new_shape["vertices"]
+            or round(old_shape["volume"], self.precision) != round(new_shape["volume"], self.precision)
+            or round(old_shape["area"], self.precision) != round(new_shape["area"], self.precision)
+        ):
+            change_type = "reshaped"
+        elif (np.abs(translation) > tolerance).any():
+            change_type = "moved"
+        else:
             return None
-        for representation in element.Representation.Representations:
-            if not representation.is_a("IfcShapeRepresentation"):
-                continue
-            if (
-                representation.RepresentationIdentifier == "Body"
-                and representation.RepresentationType != "MappedRepresentation"
-            ):
-                return representation.id()
-            elif representation.RepresentationIdentifier == "Body":
-                return representation.Items[0].MappingSource.MappedRepresentation.id()
+
+        return {
+            "type": change_type,
+            "translation": [float(v) for v in translation],
+            "distance": float(np.linalg.norm(translation)),
+            "size_change": [float(v) for v in size_change],
+            "volume_change": float(volume_change),
+            "area_change": float(area_change),
+        }
+
+    def get_shape_summary(self, ifc_file, element):
+        """Returns the world bounding box, volume, area and a vertex hash of an element
+
+        The vertex hash is of the set of vertices relative to the bounding
+        box, rounded to the precision, so it does not depend on the position
+        of the element nor on the order of its vertices and triangles.
+        """
+        import numpy as np
+        import ifcopenshell.geom
+
+        if self.geometry_settings is None:
+            self.geometry_settings = ifcopenshell.geom.settings()
+            self.geometry_settings.set(self.geometry_settings.USE_WORLD_COORDS, True)
+
+        geometry = ifcopenshell.geom.create_shape(self.geometry_settings, element).geometry
+        vertices = np.array(geometry.verts, dtype=float).reshape(-1, 3)
+        triangles = vertices[np.array(geometry.faces, dtype=int).reshape(-1, 3)]
+        minimum = vertices.min(axis=0)
+        maximum = vertices.max(axis=0)
+
+        # Relative to the bounding box to keep the volume and area numerically stable
+        a, b, c = (triangles - minimum).transpose(1, 0, 2)
+        volume = abs(np.einsum("ij,ij->i", a, np.cross(b, c)).sum()) / 6
+        area = np.linalg.norm(np.cross(b - a, c - a), axis=1).sum() / 2
+
+        # Adding zero turns negative zero into zero
+        rounded_vertices = np.unique(np.round(vertices - minimum, self.precision) + 0.0, axis=0)
+        return {
+            "min": minimum,
+            "max": maximum,
+            "volume": float(volume),
+            "area": float(area),
+            "vertices": hashlib.blake2b(rounded_vertices.tobytes(), digest_size=16).hexdigest(),
+        }
+
+
+# The IfcDiff of a process in the pool of IfcDiff.diff_elements_in_parallel
+process_ifc_diff = None
+
+
+def init_diff_process(old_file, new_file, inverse_classes, precision, compare_shapes):
+    global process_ifc_diff
+    process_ifc_diff = IfcDiff(old_file, new_file, None, inverse_classes, compare_shapes=compare_shapes)
+    process_ifc_diff.old = ifcopenshell.open(old_file)
+    process_ifc_diff.new = ifcopenshell.open(new_file)
+    process_ifc_diff.precision = precision
+    process_ifc_diff.create_fingerprinters()
+
+
+def diff_partition(global_ids):
+    process_ifc_diff.change_register = {}
+    process_ifc_diff.diff_elements(global_ids)
+    # Differences may hold entity instances, which cannot be sent between processes
+    return json.loads(json.dumps(process_ifc_diff.change_register, cls=DiffEncoder))
+
+
+class Fingerprinter:
+    """Hashes the attribute subgraphs of entities bottom-up
+
+    Every entity is hashed once and memoised, so entities shared by many
+    elements, like types, materials, property sets and mapped
+    representations, are only traversed once per file. Only direct
+    attributes are followed, inverse attributes are not.
+
+    Entity ids are never part of a fingerprint, and attributes of which the
+    name contains any of the excluded strings are skipped at any depth.
+    Numbers are formatted to the precision in decimal places, like the
+    significant digits of DeepDiff, so that integers and reals and numbers
+    which only differ beyond the precision have the same fingerprint.
+    """
+
+    def __init__(self, precision, exclude=()):
+        self.precision = precision
+        self.exclude = exclude
+        self.fingerprints = {}
+        self.attribute_indices = {}
+
+    def get_fingerprint(self, value):
+        return hashlib.blake2b(self.canonicalise(value).encode("utf-8"), digest_size=16).hexdigest()
+
+    def canonicalise(self, value):
+        if isinstance(value, ifcopenshell.entity_instance):
+            return self.get_entity_fingerprint(value)
+        elif isinstance(value, (tuple, list)):
+            return "(" + ",".join(self.canonicalise(v) for v in value) + ")"
+        elif isinstance(value, bool):
+            return ".T." if value else ".F."
+        elif isinstance(value, (int, float)):
+            # Adding zero turns negative zero into zero
+            return "{:.{}f}".format(round(value, self.precision) + 0.0, self.precision)
+        elif value is None:
+            return "$"
+        return repr(value)
+
+    def get_entity_fingerprint(self, entity):
+        entity_id = entity.id()
+        if not entity_id:
+            # Entities without an id, such as defined type values in selects, are not memoised
+            return entity.is_a() + "(" + ",".join(self.canonicalise(v) for v in entity) + ")"
+        fingerprint = self.fingerprints.get(entity_id)
+        if fingerprint:
+            return fingerprint
+        elif fingerprint is not None:
+            # The entity references itself through its attributes
+            return "#"
+        self.fingerprints[entity_id] = ""
+        ifc_class = entity.is_a()
+        indices = self.attribute_indices.get(ifc_class)
+        if indices is None:
+            indices = self.attribute_indices[ifc_class] = [
+                i for i in range(len(entity)) if not any(e in entity.attribute_name(i) for e in self.exclude)
+            ]
+        content = ifc_class + "(" + ",".join(self.canonicalise(entity[i]) for i in indices) + ")"
+        fingerprint = hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+        self.fingerprints[entity_id] = fingerprint
+        return fingerprint
 
 
 class DiffEncoder(json.JSONEncoder):
@@ -199,10 +598,15 @@ class DiffEncoder(json.JSONEncoder):
         try:
             return json.JSONEncoder.default(self, obj)
         except:
+            # Sets of changed paths are written as lists so they can be read back
+            if isinstance(obj, collections.abc.Set):
+                return list(obj)
+            # Anything else, such as the classes of DeepDiff type changes, is written as text
             return str(obj)
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Required for process pools when packaged with pyinstaller
     parser = argparse.ArgumentParser(description="Show the difference between two IFC files")
     parser.add_argument("old", type=str, help="The old IFC file")
     parser.add_argument("new", type=str, help="The new IFC file")
@@ -216,8 +620,45 @@ if __name__ == "__main__":
         help='A list of IFC classes to check in inverse relationships, like "IfcRelDefinesByProperties", or "all".',
         default="",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="The number of processes to diff elements in parallel. Defaults to 1",
+        default=1,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        choices=["json", "ndjson"],
+        help="Either a single JSON document, or line-delimited JSON streamed while diffing. Defaults to json",
+        default="json",
+    )
+    parser.add_argument(
+        "-m",
+        "--match-distance",
+        type=float,
+        help="Match deleted and added elements of the same class within this distance in metres, for new GlobalIds",
+        default=None,
+    )
+    parser.add_argument(
+        "-s",
+        "--shapes",
+        action="store_true",
+        help="Compare the tessellated shapes of elements with geometry changes, reporting how they changed",
+    )
     args = parser.parse_args()
 
-    ifc_diff = IfcDiff(args.old, args.new, args.output, args.relationships.split())
+    ifc_diff = IfcDiff(
+        args.old,
+        args.new,
+        args.output,
+        args.relationships.split(),
+        processes=args.jobs,
+        compare_shapes=args.shapes,
+        output_format=args.format,
+        match_distance=args.match_distance,
+    )
     ifc_diff.diff()
     ifc_diff.export()
@@ -0,0 +1,34 @@
+import os
+import sys
+import json
+from deepdiff import DeepDiff
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ifcdiff import IfcDiff
+
+
+def export_changes(tmp_path, diff):
+    output_file = str(tmp_path / "diff.json")
+    ifc_diff = IfcDiff("old.ifc", "new.ifc", output_file)
+    ifc_diff.added_elements = set()
+    ifc_diff.deleted_elements = set()
+    ifc_diff.register_change("2O2Fr$t4X7Zf8NOew3FLOH", diff)
+    ifc_diff.export()
+    with open(output_file, encoding="utf-8") as diff_file:
+        return json.load(diff_file)["changed"]["2O2Fr$t4X7Zf8NOew3FLOH"]
+
+
+def test_exporting_a_name_change_from_none(tmp_path):
+    diff = DeepDiff({"Name": None}, {"Name": "x"}, ignore_string_type_changes=True)
+    changes = export_changes(tmp_path, diff)
+    change = changes["type_changes"]["root['Name']"]
+    assert change["new_value"] == "x"
+    assert change["old_value"] is None
+    assert change["new_type"] == str(str)
+
+
+def test_exporting_changed_items_as_lists(tmp_path):
+    diff = DeepDiff({"Name": "x"}, {"Name": "x", "Description": "y"})
+    changes = export_changes(tmp_path, diff)
+    assert changes["dictionary_item_added"] == ["root['Description']"]
@@ -22,6 +22,7 @@
 
 #include <cmath>
 #include <array>
+#include <chrono>
 
 static const double ALMOST_ZERO = 1.e-9;
 
@@ -231,6 +232,14 @@ private:
 	faceset_helper* faceset_helper_;
 	double disable_boolean_result;
 
+	double element_time_budget;
+	double max_boolean_operands;
+
+	// Per-product state for enforcing the time budget and boolean operand limit,
+	// reset by begin_element_budget() for every product that is processed.
+	std::chrono::steady_clock::time_point element_start_;
+	bool element_budget_exceeded_;
+
 	gp_Vec offset = gp_Vec{0.0, 0.0, 0.0};
 	gp_Quaternion rotation = gp_Quaternion{};
 	gp_Trsf offset_and_rotation = gp_Trsf();
@@ -256,6 +265,10 @@ public:
 		, faceset_helper_(nullptr)
 		, layerset_first(-1.)
 		, disable_boolean_result(-1.)
+		, element_time_budget(-1.)
+		, max_boolean_operands(-1.)
+		, element_start_(std::chrono::steady_clock::now())
+		, element_budget_exceeded_(false)
 	{}
 
 	MAKE_TYPE_NAME(Kernel)(const MAKE_TYPE_NAME(Kernel)& other)
@@ -271,6 +284,10 @@ public:
 		, faceset_helper_(nullptr)
 		, layerset_first(other.layerset_first)
 		, disable_boolean_result(other.disable_boolean_result)
+		, element_time_budget(other.element_time_budget)
+		, max_boolean_operands(other.max_boolean_operands)
+		, element_start_(std::chrono::steady_clock::now())
+		, element_budget_exceeded_(false)
 
 		, offset(other.offset)
 		, rotation(other.rotation)
@@ -288,6 +305,8 @@ public:
 		placement_rel_to = other.placement_rel_to;
 		layerset_first = other.layerset_first;
 		disable_boolean_result = other.disable_boolean_result;
+		element_time_budget = other.element_time_budget;
+		max_boolean_operands = other.max_boolean_operands;
 
 		offset = other.offset;
 		rotation = other.rotation;
@@ -330,6 +349,19 @@ public:
 
 	bool fit_halfspace(const TopoDS_Shape& a, const TopoDS_Shape& b, TopoDS_Shape& box, double& height);
 
+	/// Resets the time budget and operand limit state for a new product
+	void begin_element_budget();
+	/// Returns true when the time budget for the current product has been exhausted,
+	/// in which case the product is flagged and a warning is logged once.
+	bool element_budget_exhausted(const IfcUtil::IfcBaseClass* inst);
+	/// Returns true when the number of operands exceeds GV_MAX_BOOLEAN_OPERANDS,
+	/// in which case the product is flagged and a warning is logged once.
+	bool boolean_operand_limit_exceeded(size_t n, const IfcUtil::IfcBaseClass* inst);
+	/// Counts the second operands in the (nested) boolean results of an item
+	size_t count_boolean_operands(const IfcSchema::IfcBooleanResult* l);
+	/// Replaces the shapes by their axis aligned bounding boxes in item coordinates
+	void replace_by_bounding_boxes(IfcRepresentationShapeItems& shapes);
+
 	const Handle_Geom_Curve intersect(const Handle_Geom_Surface&, const Handle_Geom_Surface&);
 	const Handle_Geom_Curve intersect(const Handle_Geom_Surface&, const TopoDS_Face&);
 	const Handle_Geom_Curve intersect(const TopoDS_Face&, const Handle_Geom_Surface&);
@@ -390,8 +422,12 @@ public:
         const IteratorSettings&, IfcSchema::IfcRepresentation*, IfcSchema::IfcProduct*, IfcGeom::BRepElement<P, PP>*);
 
 	const IfcSchema::IfcMaterial* get_single_material_association(const IfcSchema::IfcProduct*);
-	IfcSchema::IfcRepresentation* representation_mapped_to(const IfcSchema::IfcRepresentation* representation);
-	IfcSchema::IfcProduct::list::ptr products_represented_by(const IfcSchema::IfcRepresentation*);
+	IfcSchema::IfcRepresentation* representation_mapped_to(const IfcSchema::IfcRepresentation* representation, bool instance_mapped_items = false);
+	IfcSchema::IfcProduct::list::ptr products_represented_by(const IfcSchema::IfcRepresentation*, bool instance_mapped_items = false);
+	/// Obtains the transformation of a mapped item, fails for mappings that are not rigid transformations
+	bool mapped_item_transformation(const IfcSchema::IfcMappedItem*, gp_Trsf&);
+	/// Obtains the mapping transformation in case the product refers to the representation by means of a mapped item
+	bool instance_transformation(const IfcSchema::IfcRepresentation*, const IfcSchema::IfcProduct*, gp_Trsf&);
 	const SurfaceStyle* get_style(const IfcSchema::IfcRepresentationItem*);
 	const SurfaceStyle* get_style(const IfcSchema::IfcMaterial*);
 	
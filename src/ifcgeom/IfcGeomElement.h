@@ -93,6 +93,7 @@ namespace IfcGeom {
 		Transformation<PP> _transformation;
         IfcUtil::IfcBaseEntity* product_;
 		std::vector<const IfcGeom::Element<P, PP>*> _parents;
+		bool _budget_exceeded;
 	public:
 
 		friend bool operator == (const Element<P, PP> & element1, const Element<P, PP> & element2) {
@@ -128,11 +129,15 @@ namespace IfcGeom {
         IfcUtil::IfcBaseEntity* product() const { return product_; }
 		const std::vector<const IfcGeom::Element<P, PP>*> parents() const { return _parents; }
 		void SetParents(std::vector<const IfcGeom::Element<P, PP>*> newparents) { _parents = newparents; }
+		// Whether the geometry is a simplified fallback because the time budget or
+		// boolean operand limit in the IteratorSettings was exceeded for this element
+		bool budget_exceeded() const { return _budget_exceeded; }
+		void set_budget_exceeded(bool value) { _budget_exceeded = value; }
 
 		Element(const ElementSettings& settings, int id, int parent_id, const std::string& name, const std::string& type,
             const std::string& guid, const std::string& context, const gp_Trsf& trsf, IfcUtil::IfcBaseEntity* product)
 			: _id(id), _parent_id(parent_id), _name(name), _type(type), _guid(guid), _context(context), _transformation(settings, trsf)
-            , product_(product)
+            , product_(product), _budget_exceeded(false)
 		{ 
 			std::ostringstream oss;
 
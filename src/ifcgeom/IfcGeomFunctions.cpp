@@ -86,6 +86,7 @@
 #include <TopExp_Explorer.hxx>
 
 #include <BRepPrimAPI_MakePrism.hxx>
+#include <BRepPrimAPI_MakeBox.hxx>
 #include <BRepBuilderAPI_MakeShell.hxx>
 #include <BRepBuilderAPI_MakeSolid.hxx>
 #include <BRepPrimAPI_MakeHalfSpace.hxx>
@@ -1415,6 +1416,12 @@ void IfcGeom::Kernel::setValue(GeomValue var, double value) {
 	case GV_DISABLE_BOOLEAN_RESULT:
 		disable_boolean_result = value;
 		break;
+	case GV_ELEMENT_TIME_BUDGET:
+		element_time_budget = value;
+		break;
+	case GV_MAX_BOOLEAN_OPERANDS:
+		max_boolean_operands = value;
+		break;
 	default:
 		throw std::runtime_error("Invalid setting");
 	}
@@ -1444,10 +1451,81 @@ double IfcGeom::Kernel::getValue(GeomValue var) const {
 		return layerset_first;
 	case GV_DISABLE_BOOLEAN_RESULT:
 		return disable_boolean_result;
+	case GV_ELEMENT_TIME_BUDGET:
+		return element_time_budget;
+	case GV_MAX_BOOLEAN_OPERANDS:
+		return max_boolean_operands;
 	}
 	throw std::runtime_error("Invalid setting");
 }
 
+void IfcGeom::Kernel::begin_element_budget() {
+	element_start_ = std::chrono::steady_clock::now();
+	element_budget_exceeded_ = false;
+}
+
+bool IfcGeom::Kernel::element_budget_exhausted(const IfcUtil::IfcBaseClass* inst) {
+	if (element_budget_exceeded_) {
+		return true;
+	}
+	if (element_time_budget <= 0.) {
+		return false;
+	}
+	const std::chrono::duration<double> elapsed = std::chrono::steady_clock::now() - element_start_;
+	if (elapsed.count() > element_time_budget) {
+		Logger::Message(Logger::LOG_WARNING, "Time budget of " + boost::lexical_cast<std::string>(element_time_budget) + "s exceeded, skipping remaining boolean operations for:", inst);
+		element_budget_exceeded_ = true;
+	}
+	return element_budget_exceeded_;
+}
+
+bool IfcGeom::Kernel::boolean_operand_limit_exceeded(size_t n, const IfcUtil::IfcBaseClass* inst) {
+	if (max_boolean_operands < 0. || n <= max_boolean_operands) {
+		return false;
+	}
+	if (!element_budget_exceeded_) {
+		Logger::Message(Logger::LOG_WARNING, boost::lexical_cast<std::string>(n) + " boolean operands exceed the maximum of " + boost::lexical_cast<std::string>((int) max_boolean_operands) + ", skipping boolean operations for:", inst);
+		element_budget_exceeded_ = true;
+	}
+	return true;
+}
+
+size_t IfcGeom::Kernel::count_boolean_operands(const IfcSchema::IfcBooleanResult* l) {
+	// Every boolean result contributes a single (second) operand. The traversal is iterative
+	// because clipping chains exported by some vendors are thousands of levels deep.
+	size_t n = 0;
+	std::vector<const IfcSchema::IfcBooleanResult*> stack = { l };
+	while (!stack.empty()) {
+		const IfcSchema::IfcBooleanResult* b = stack.back();
+		stack.pop_back();
+		++n;
+		if (auto op1 = b->FirstOperand()->as<IfcSchema::IfcBooleanResult>()) {
+			stack.push_back(op1);
+		}
+		if (auto op2 = b->SecondOperand()->as<IfcSchema::IfcBooleanResult>()) {
+			stack.push_back(op2);
+		}
+	}
+	return n;
+}
+
+void IfcGeom::Kernel::replace_by_bounding_boxes(IfcRepresentationShapeItems& shapes) {
+	for (auto& item : shapes) {
+		Bnd_Box bb;
+		BRepBndLib::Add(item.Shape(), bb);
+		if (bb.IsVoid()) {
+			continue;
+		}
+		double x1, y1, z1, x2, y2, z2;
+		bb.Get(x1, y1, z1, x2, y2, z2);
+		// Flat or linear geometries would otherwise yield a degenerate box
+		const double eps = getValue(GV_PRECISION);
+		gp_Pnt p1(x1 - eps, y1 - eps, z1 - eps), p2(x2 + eps, y2 + eps, z2 + eps);
+		TopoDS_Shape box = BRepPrimAPI_MakeBox(p1, p2).Solid();
+		item = IfcRepresentationShapeItem(item.ItemId(), item.Placement(), box, item.hasStyle() ? &item.Style() : nullptr);
+	}
+}
+
 namespace {
 
 	// Returns the vertex part of an TopoDS_Edge edge that is not TopoDS_Vertex vertex
@@ -1785,6 +1863,8 @@ IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_representation_and
 	IfcGeom::Representation::BRep* shape;
 	IfcGeom::IfcRepresentationShapeItems shapes, shapes2;
 
+	begin_element_budget();
+
 	if ( !convert_shapes(representation, shapes) ) {
 		return 0;
 	}
@@ -1895,6 +1975,13 @@ IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_representation_and
 		Logger::Error("Failed to construct placement");
 	}
 
+	if (settings.get(IteratorSettings::INSTANCE_MAPPED_ITEMS)) {
+		gp_Trsf mapped_item_trsf;
+		if (instance_transformation(representation, product, mapped_item_trsf)) {
+			trsf.Multiply(mapped_item_trsf);
+		}
+	}
+
 	// Does the IfcElement have any IfcOpenings?
 	// Note that openings for IfcOpeningElements are not processed
 	IfcSchema::IfcRelVoidsElement::list::ptr openings = find_openings(product);
@@ -1902,7 +1989,19 @@ IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_representation_and
 	const std::string product_type = product->declaration().name();
 	ElementSettings element_settings(settings, getValue(GV_LENGTH_UNIT), product_type);
 
-    if (!settings.get(IfcGeom::IteratorSettings::DISABLE_OPENING_SUBTRACTIONS) && openings && openings->size()) {
+	// Opening subtractions are skipped when the budget for this product is already exhausted
+	// or when there are more openings than the number of boolean operands allowed.
+	const bool subtract_openings = !settings.get(IfcGeom::IteratorSettings::DISABLE_OPENING_SUBTRACTIONS) &&
+		openings && openings->size() &&
+		!element_budget_exhausted(product) &&
+		!boolean_operand_limit_exceeded(openings->size(), product);
+
+	if (!subtract_openings && settings.get(IteratorSettings::BOUNDING_BOX_FALLBACK) && element_budget_exhausted(product)) {
+		replace_by_bounding_boxes(shapes);
+		representation_id_builder << "-bbox";
+	}
+
+    if (subtract_openings) {
 		representation_id_builder << "-openings";
 		for (IfcSchema::IfcRelVoidsElement::list::it it = openings->begin(); it != openings->end(); ++it) {
 			representation_id_builder << "-" << (*it)->data().id();
@@ -1940,6 +2039,11 @@ IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_representation_and
 			opened_shapes = shapes;
 		}
 
+		if (settings.get(IteratorSettings::BOUNDING_BOX_FALLBACK) && element_budget_exhausted(product)) {
+			replace_by_bounding_boxes(opened_shapes);
+			representation_id_builder << "-bbox";
+		}
+
         if (settings.get(IteratorSettings::USE_WORLD_COORDS)) {
 			for ( IfcGeom::IfcRepresentationShapeItems::iterator it = opened_shapes.begin(); it != opened_shapes.end(); ++ it ) {
 				it->prepend(trsf);
@@ -1978,6 +2082,8 @@ IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_representation_and
 		product
 	);
 
+	elem->set_budget_exceeded(element_budget_exceeded_);
+
 	if (settings.get(IteratorSettings::VALIDATE_QUANTITIES)) {
 		auto rels = product->IsDefinedBy();
 		for (auto& rel : *rels) {
@@ -2050,7 +2156,7 @@ IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_representation_and
 	return elem;
 }
 
-IfcSchema::IfcRepresentation* IfcGeom::Kernel::representation_mapped_to(const IfcSchema::IfcRepresentation* representation) {
+IfcSchema::IfcRepresentation* IfcGeom::Kernel::representation_mapped_to(const IfcSchema::IfcRepresentation* representation, bool instance_mapped_items) {
 	IfcSchema::IfcRepresentation* representation_mapped_to = 0;
 	try {
 		IfcSchema::IfcRepresentationItem::list::ptr items = representation->Items();
@@ -2059,7 +2165,11 @@ IfcSchema::IfcRepresentation* IfcGeom::Kernel::representation_mapped_to(const If
 			if (item->declaration().is(IfcSchema::IfcMappedItem::Class())) {
 				if (item->StyledByItem()->size() == 0) {
 					IfcSchema::IfcMappedItem* mapped_item = item->as<IfcSchema::IfcMappedItem>();
-					if (is_identity_transform(mapped_item->MappingTarget())) {
+					gp_Trsf mapped_item_trsf;
+					if (instance_mapped_items && mapped_item_transformation(mapped_item, mapped_item_trsf)) {
+						// The mapping transformation is incorporated in the placement of the product
+						representation_mapped_to = mapped_item->MappingSource()->MappedRepresentation();
+					} else if (is_identity_transform(mapped_item->MappingTarget())) {
 						IfcSchema::IfcRepresentationMap* map = mapped_item->MappingSource();
 						if (is_identity_transform(map->MappingOrigin())) {
 							representation_mapped_to = map->MappedRepresentation();
@@ -2075,7 +2185,7 @@ IfcSchema::IfcRepresentation* IfcGeom::Kernel::representation_mapped_to(const If
 	return representation_mapped_to;
 }
 
-IfcSchema::IfcProduct::list::ptr IfcGeom::Kernel::products_represented_by(const IfcSchema::IfcRepresentation* representation) {
+IfcSchema::IfcProduct::list::ptr IfcGeom::Kernel::products_represented_by(const IfcSchema::IfcRepresentation* representation, bool instance_mapped_items) {
 	IfcSchema::IfcProduct::list::ptr products(new IfcSchema::IfcProduct::list);
 
 	IfcSchema::IfcProductRepresentation::list::ptr prodreps = representation->OfProductRepresentation();
@@ -2106,13 +2216,18 @@ IfcSchema::IfcProduct::list::ptr IfcGeom::Kernel::products_represented_by(const
 
 	if (maps->size() == 1) {
 		IfcSchema::IfcRepresentationMap* map = *maps->begin();
-		if (is_identity_transform(map->MappingOrigin())) {
+		if (instance_mapped_items || is_identity_transform(map->MappingOrigin())) {
 			IfcSchema::IfcMappedItem::list::ptr items = map->MapUsage();
 			for (IfcSchema::IfcMappedItem::list::it it = items->begin(); it != items->end(); ++it) {
 				IfcSchema::IfcMappedItem* item = *it;
 				if (item->StyledByItem()->size() != 0) continue;
 
-				if (!is_identity_transform(item->MappingTarget())) {
+				if (instance_mapped_items) {
+					gp_Trsf mapped_item_trsf;
+					if (!mapped_item_transformation(item, mapped_item_trsf)) {
+						continue;
+					}
+				} else if (!is_identity_transform(item->MappingTarget())) {
 					continue;
 				}
 
@@ -2133,9 +2248,66 @@ IfcSchema::IfcProduct::list::ptr IfcGeom::Kernel::products_represented_by(const
 	return products;
 }
 
+bool IfcGeom::Kernel::mapped_item_transformation(const IfcSchema::IfcMappedItem* item, gp_Trsf& trsf) {
+	IfcSchema::IfcCartesianTransformationOperator* transform = item->MappingTarget();
+	if (transform->declaration().is(IfcSchema::IfcCartesianTransformationOperator3DnonUniform::Class()) ||
+		!transform->declaration().is(IfcSchema::IfcCartesianTransformationOperator3D::Class()))
+	{
+		// Non-uniform scaling cannot be expressed in the 4x3 element matrix
+		return false;
+	}
+
+	gp_Trsf target, origin;
+	IfcGeom::Kernel::convert((IfcSchema::IfcCartesianTransformationOperator3D*) transform, target);
+	if (std::abs(target.ScaleFactor() - 1.) > 1.e-9) {
+		// Scaled and mirrored mappings would alter the volume and orientation of the
+		// shared geometry, consumers expect element matrices to be rigid transformations.
+		return false;
+	}
+
+	IfcSchema::IfcAxis2Placement* placement = item->MappingSource()->MappingOrigin();
+	if (placement->declaration().is(IfcSchema::IfcAxis2Placement3D::Class())) {
+		IfcGeom::Kernel::convert((IfcSchema::IfcAxis2Placement3D*) placement, origin);
+	} else {
+		gp_Trsf2d trsf_2d;
+		IfcGeom::Kernel::convert((IfcSchema::IfcAxis2Placement2D*) placement, trsf_2d);
+		origin = trsf_2d;
+	}
+
+	// Same order of application as in convert(const IfcSchema::IfcMappedItem*, ...)
+	trsf = target;
+	trsf.Multiply(origin);
+	return true;
+}
+
+bool IfcGeom::Kernel::instance_transformation(const IfcSchema::IfcRepresentation* representation, const IfcSchema::IfcProduct* product, gp_Trsf& trsf) {
+	if (!product->hasRepresentation()) {
+		return false;
+	}
+
+	IfcSchema::IfcRepresentation::list::ptr reps = product->Representation()->Representations();
+	for (IfcSchema::IfcRepresentation::list::it it = reps->begin(); it != reps->end(); ++it) {
+		if (*it == representation) {
+			// Processed by means of its own representation
+			return false;
+		}
+	}
+
+	for (IfcSchema::IfcRepresentation::list::it it = reps->begin(); it != reps->end(); ++it) {
+		IfcSchema::IfcRepresentationItem::list::ptr items = (*it)->Items();
+		if (items->size() != 1) continue;
+		IfcSchema::IfcMappedItem* item = (*items->begin())->as<IfcSchema::IfcMappedItem>();
+		if (item && item->MappingSource()->MappedRepresentation() == representation) {
+			return mapped_item_transformation(item, trsf);
+		}
+	}
+
+	return false;
+}
+
 template <typename P, typename PP>
 IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_processed_representation(
-    const IteratorSettings& /*settings*/, IfcSchema::IfcRepresentation* representation, IfcSchema::IfcProduct* product,
+    const IteratorSettings& settings, IfcSchema::IfcRepresentation* representation, IfcSchema::IfcProduct* product,
     IfcGeom::BRepElement<P, PP>* brep)
 {
 	int parent_id = -1;
@@ -2160,6 +2332,13 @@ IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_processed_represen
 		Logger::Error("Failed to construct placement");
 	}
 
+	if (settings.get(IteratorSettings::INSTANCE_MAPPED_ITEMS)) {
+		gp_Trsf mapped_item_trsf;
+		if (instance_transformation(representation, product, mapped_item_trsf)) {
+			trsf.Multiply(mapped_item_trsf);
+		}
+	}
+
 	std::string context_string = "";
 	if (representation->hasRepresentationIdentifier()) {
 		context_string = representation->RepresentationIdentifier();
@@ -2169,7 +2348,7 @@ IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_processed_represen
 
 	const std::string product_type = product->declaration().name();
 
-	return new BRepElement<P, PP>(
+	auto elem = new BRepElement<P, PP>(
 		product->data().id(),
 		parent_id,
 		name, 
@@ -2180,6 +2359,11 @@ IfcGeom::BRepElement<P, PP>* IfcGeom::Kernel::create_brep_for_processed_represen
 		brep->geometry_pointer(),
         product
 	);
+
+	// The geometry is shared, so is the fact whether it is a simplified fallback
+	elem->set_budget_exceeded(brep->budget_exceeded());
+
+	return elem;
 }
 
 template IFC_GEOM_API IfcGeom::BRepElement<float, float>* IfcGeom::Kernel::create_brep_for_representation_and_product<float, float>(
@@ -667,7 +667,7 @@ namespace IfcGeom {
 				if (!ifcproducts) {
 					// Init. the list of filtered IfcProducts for this representation
 					ifcproducts = IfcSchema::IfcProduct::list::ptr(new IfcSchema::IfcProduct::list);
-					IfcSchema::IfcProduct::list::ptr unfiltered_products = kernel.products_represented_by(representation);
+					IfcSchema::IfcProduct::list::ptr unfiltered_products = kernel.products_represented_by(representation, settings.get(IteratorSettings::INSTANCE_MAPPED_ITEMS));
 					// Include only the desired products for processing.
 					for (IfcSchema::IfcProduct::list::it jt = unfiltered_products->begin(); jt != unfiltered_products->end(); ++jt) {
 						IfcSchema::IfcProduct* prod = *jt;
@@ -701,10 +701,11 @@ namespace IfcGeom {
 
 					// Check if this represenation has (or will be) processed as part its mapped representation
 					bool representation_processed_as_mapped_item = false;
-					IfcSchema::IfcRepresentation* representation_mapped_to = kernel.representation_mapped_to(representation);
+					const bool instance_mapped_items = settings.get(IteratorSettings::INSTANCE_MAPPED_ITEMS);
+					IfcSchema::IfcRepresentation* representation_mapped_to = kernel.representation_mapped_to(representation, instance_mapped_items);
 					if (representation_mapped_to) {
 						representation_processed_as_mapped_item = geometry_reuse_ok_for_current_representation_ && (
-							ok_mapped_representations->contains(representation_mapped_to) || reuse_ok_(kernel.products_represented_by(representation_mapped_to)));
+							ok_mapped_representations->contains(representation_mapped_to) || reuse_ok_(kernel.products_represented_by(representation_mapped_to, instance_mapped_items)));
 					}
 
 					if (representation_processed_as_mapped_item) {
@@ -1008,6 +1009,8 @@ namespace IfcGeom {
 				? +1.0
 				: -1.0
 			);
+			kernel.setValue(IfcGeom::Kernel::GV_ELEMENT_TIME_BUDGET, settings.element_time_budget());
+			kernel.setValue(IfcGeom::Kernel::GV_MAX_BOOLEAN_OPERANDS, settings.max_boolean_operands());
 
 			if (settings.get(IteratorSettings::BUILDING_LOCAL_PLACEMENT)) {
 				if (settings.get(IteratorSettings::SITE_LOCAL_PLACEMENT)) {
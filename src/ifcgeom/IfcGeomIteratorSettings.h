@@ -94,16 +94,46 @@ namespace IfcGeom
 			EDGE_ARROWS = 1 << 19,
 			/// Disables the evaluation of IfcBooleanResult and simply returns FirstOperand
 			DISABLE_BOOLEAN_RESULT = 1 << 20,
+			/// When the time budget or the maximum number of boolean operands for an
+			/// element is exceeded, replace its geometry by the bounding box of the
+			/// unclipped body rather than returning the unclipped body itself.
+			BOUNDING_BOX_FALLBACK = 1 << 21,
+			/// Reuses the geometry of an IfcRepresentationMap for all products that
+			/// reference it by means of an IfcMappedItem, also when the mapping is a
+			/// rigid transformation other than identity. The mapping transformation is then
+			/// incorporated in the element transformation matrix so that the geometry
+			/// is only created once and shared by means of its id.
+			INSTANCE_MAPPED_ITEMS = 1 << 22,
 			/// Number of different setting flags.
-			NUM_SETTINGS = 20
+			NUM_SETTINGS = 22
         };
         /// Used to store logical OR combination of setting flags.
         typedef unsigned SettingField;
 
+        /// Enumeration of the levels of detail at which triangulated
+        /// representations can be generated, see set_level_of_detail().
+        enum LevelOfDetail
+        {
+            /// The full triangulation according to the deflection tolerances.
+            LOD_FULL = 0,
+            /// The triangulation simplified by clustering its vertices on a
+            /// regular grid of lod_resolution() cells along every axis.
+            LOD_SIMPLIFIED = 1,
+            /// The convex hull of the vertices of the triangulation.
+            LOD_CONVEX_HULL = 2,
+            /// The axis-aligned bounding box. The representation is not
+            /// triangulated at all, the box is derived from the BRep directly.
+            LOD_BOUNDING_BOX = 3
+        };
+
         IteratorSettings()
             : settings_(WELD_VERTICES) // OR options that default to true here
             , deflection_tolerance_(1.e-3)
 			, angular_tolerance_(0.5)
+			, element_time_budget_(-1.)
+			, max_boolean_operands_(-1)
+			, level_of_detail_(LOD_FULL)
+			, lod_resolution_(8)
         {
         }
 
@@ -131,6 +161,44 @@ namespace IfcGeom
 			force_space_transparency_ = value;
 		}		
 
+		/// Time in seconds after which the boolean operations for a single element
+		/// are no longer evaluated. The element is then returned with its unclipped
+		/// body (or bounding box, see BOUNDING_BOX_FALLBACK) and flagged by means of
+		/// Element::budget_exceeded(). Negative values disable the budget (default).
+		double element_time_budget() const { return element_time_budget_; }
+		void set_element_time_budget(double value) {
+			element_time_budget_ = value;
+		}
+
+		/// Maximum number of boolean operands (clippings, boolean results and
+		/// opening subtractions) to evaluate for a single element. Elements that
+		/// exceed this number are handled as if their time budget was exceeded.
+		/// Negative values disable the limit (default).
+		int max_boolean_operands() const { return max_boolean_operands_; }
+		void set_max_boolean_operands(int value) {
+			max_boolean_operands_ = value;
+		}
+
+		/// The level of detail of triangulated representations, one of the
+		/// LevelOfDetail values, LOD_FULL by default.
+		int level_of_detail() const { return level_of_detail_; }
+		void set_level_of_detail(int value) {
+			if (value < LOD_FULL || value > LOD_BOUNDING_BOX) {
+				throw IfcParse::IfcException("Invalid level of detail");
+			}
+			level_of_detail_ = value;
+		}
+
+		/// Number of grid cells along every axis of the bounding box of the
+		/// element in which vertices are clustered for LOD_SIMPLIFIED, 8 by default.
+		int lod_resolution() const { return lod_resolution_; }
+		void set_lod_resolution(int value) {
+			if (value < 1) {
+				throw IfcParse::IfcException("Level of detail resolution should be at least 1");
+			}
+			lod_resolution_ = value;
+		}
+
         /// Get boolean value for a single settings or for a combination of settings.
         bool get(SettingField setting) const
         {
@@ -157,6 +225,9 @@ namespace IfcGeom
     protected:
         SettingField settings_;
         double deflection_tolerance_, angular_tolerance_, force_space_transparency_;
+		double element_time_budget_;
+		int max_boolean_operands_;
+		int level_of_detail_, lod_resolution_;
     };
 
     class IFC_GEOM_API ElementSettings : public IteratorSettings
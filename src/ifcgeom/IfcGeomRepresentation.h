@@ -40,6 +40,13 @@
 #include "../ifcgeom/IfcRepresentationShapeItem.h"
 
 #include <TopoDS_Compound.hxx>
+#include <BRepBndLib.hxx>
+#include <Bnd_Box.hxx>
+
+#include <array>
+#include <map>
+#include <set>
+#include <tuple>
 
 namespace IfcGeom {
 
@@ -135,34 +142,19 @@ namespace IfcGeom {
 				, id_(shape_model.id())
 				, weld_offset_(0)
 			{
+				if (settings().level_of_detail() == IteratorSettings::LOD_BOUNDING_BOX) {
+					// No need to triangulate, the box is derived from the BRep.
+					addBoundingBox(shape_model);
+					return;
+				}
+
 				for ( IfcGeom::IfcRepresentationShapeItems::const_iterator iit = shape_model.begin(); iit != shape_model.end(); ++ iit ) {
 					
 					// Don't weld vertices that belong to different items to prevent non-manifold situations.
 					weld_offset_ += welds.size();
 					welds.clear();
 
-					int surface_style_id = -1;
-					if (iit->hasStyle()) {
-						Material adapter(&iit->Style());
-						std::vector<Material>::const_iterator jt = std::find(_materials.begin(), _materials.end(), adapter);
-						if (jt == _materials.end()) {
-							surface_style_id = (int)_materials.size();
-							_materials.push_back(adapter);
-						} else {
-							surface_style_id = (int)(jt - _materials.begin());
-						}
-					}
-
-					if (settings().get(IteratorSettings::APPLY_DEFAULT_MATERIALS) && surface_style_id == -1) {
-						Material material(IfcGeom::get_default_style(settings().element_type()));
-						std::vector<Material>::const_iterator mit = std::find(_materials.begin(), _materials.end(), material);
-						if (mit == _materials.end()) {
-							surface_style_id = (int)_materials.size();
-							_materials.push_back(material);
-						} else {
-							surface_style_id = (int)(mit - _materials.begin());
-						}
-					}
+					const int surface_style_id = addMaterial(*iit);
 
 					const TopoDS_Shape& s = iit->Shape();
 					const gp_GTrsf& trsf = iit->Placement();
@@ -347,7 +339,29 @@ namespace IfcGeom {
 
                     BRepTools::Clean(s);
 				}
+
+				if (settings().level_of_detail() != IteratorSettings::LOD_FULL) {
+					reduce(settings().level_of_detail(), settings().lod_resolution());
+				}
+			}
+
+			/// Creates a reduced level of detail of an existing triangulation, so
+			/// that for example a convex hull can be obtained alongside the full mesh.
+			Triangulation(const Triangulation& full, int level_of_detail, int lod_resolution)
+				: Representation(full.settings())
+				, id_(full.id_)
+				, _verts(full._verts)
+				, _faces(full._faces)
+				, _edges(full._edges)
+				, _normals(full._normals)
+				, uvs_(full.uvs_)
+				, _material_ids(full._material_ids)
+				, _materials(full._materials)
+				, weld_offset_(0)
+			{
+				reduce(level_of_detail, lod_resolution);
 			}
+
 			virtual ~Triangulation() {}
 
             /// Generates UVs for a single mesh using box projection.
@@ -380,7 +394,396 @@ namespace IfcGeom {
                 return uvs;
             }
 
+            /// Simplifies a triangle mesh by clustering its vertices on a regular grid with
+            /// the given number of cells along every axis of its bounding box. Vertices are
+            /// replaced by the average of their cell. Triangles that collapse or coincide
+            /// with a triangle emitted earlier are dropped.
+            static void cluster_vertices(const std::vector<gp_XYZ>& points, const std::vector<int>& faces, const std::vector<int>& material_ids, int resolution,
+                std::vector<gp_XYZ>& clustered_points, std::vector<int>& clustered_faces, std::vector<int>& clustered_material_ids)
+            {
+                if (points.empty()) {
+                    return;
+                }
+
+                gp_XYZ lower = points.front(), upper = points.front();
+                for (std::vector<gp_XYZ>::const_iterator it = points.begin(); it != points.end(); ++it) {
+                    for (int i = 1; i <= 3; ++i) {
+                        lower.SetCoord(i, (std::min)(lower.Coord(i), it->Coord(i)));
+                        upper.SetCoord(i, (std::max)(upper.Coord(i), it->Coord(i)));
+                    }
+                }
+
+                double cell_size[3];
+                for (int i = 0; i < 3; ++i) {
+                    cell_size[i] = (upper.Coord(i + 1) - lower.Coord(i + 1)) / resolution;
+                }
+
+                typedef std::tuple<int, int, int> Cell;
+                std::map<Cell, int> cells;
+                std::vector<int> remap(points.size());
+                std::vector<int> counts;
+
+                for (size_t i = 0; i < points.size(); ++i) {
+                    int index[3];
+                    for (int j = 0; j < 3; ++j) {
+                        // Flat dimensions consist of a single cell
+                        index[j] = cell_size[j] > 0.
+                            ? (std::min)(static_cast<int>((points[i].Coord(j + 1) - lower.Coord(j + 1)) / cell_size[j]), resolution - 1)
+                            : 0;
+                    }
+                    const Cell cell(index[0], index[1], index[2]);
+                    std::map<Cell, int>::const_iterator it = cells.find(cell);
+                    if (it == cells.end()) {
+                        remap[i] = cells[cell] = (int)clustered_points.size();
+                        clustered_points.push_back(points[i]);
+                        counts.push_back(1);
+                    } else {
+                        remap[i] = it->second;
+                        clustered_points[it->second] += points[i];
+                        counts[it->second] ++;
+                    }
+                }
+
+                for (size_t i = 0; i < clustered_points.size(); ++i) {
+                    clustered_points[i] /= counts[i];
+                }
+
+                std::set<std::array<int, 3> > emitted;
+                for (size_t i = 0; i + 2 < faces.size(); i += 3) {
+                    std::array<int, 3> triangle = {{ remap[faces[i]], remap[faces[i + 1]], remap[faces[i + 2]] }};
+                    if (triangle[0] == triangle[1] || triangle[1] == triangle[2] || triangle[0] == triangle[2]) {
+                        continue;
+                    }
+                    std::array<int, 3> key = triangle;
+                    std::sort(key.begin(), key.end());
+                    if (!emitted.insert(key).second) {
+                        continue;
+                    }
+                    clustered_faces.insert(clustered_faces.end(), triangle.begin(), triangle.end());
+                    clustered_material_ids.push_back(i / 3 < material_ids.size() ? material_ids[i / 3] : -1);
+                }
+            }
+
+            /// Computes the convex hull of a set of points by means of incremental insertion.
+            /// Triangles are oriented outwards. Returns false when the points do not span a
+            /// volume, e.g. for planar or linear sets of points.
+            static bool convex_hull(const std::vector<gp_XYZ>& points, std::vector<int>& faces)
+            {
+                if (points.size() < 4) {
+                    return false;
+                }
+
+                // Initial tetrahedron from extreme points
+                size_t i0 = 0, i1 = 0, i2 = 0, i3 = 0;
+                for (size_t i = 1; i < points.size(); ++i) {
+                    if (points[i].X() < points[i0].X()) {
+                        i0 = i;
+                    }
+                }
+                double max_distance = 0.;
+                for (size_t i = 0; i < points.size(); ++i) {
+                    const double d = (points[i] - points[i0]).Modulus();
+                    if (d > max_distance) {
+                        max_distance = d;
+                        i1 = i;
+                    }
+                }
+
+                // Tolerance relative to the size of the point set
+                const double eps = max_distance * 1.e-9;
+                if (max_distance <= 0.) {
+                    return false;
+                }
+
+                const gp_XYZ axis = (points[i1] - points[i0]) / max_distance;
+                double max_line_distance = 0.;
+                for (size_t i = 0; i < points.size(); ++i) {
+                    const double d = ((points[i] - points[i0]) ^ axis).Modulus();
+                    if (d > max_line_distance) {
+                        max_line_distance = d;
+                        i2 = i;
+                    }
+                }
+                if (max_line_distance <= eps) {
+                    return false;
+                }
+
+                gp_XYZ normal = (points[i1] - points[i0]) ^ (points[i2] - points[i0]);
+                normal.Normalize();
+                double max_plane_distance = 0.;
+                for (size_t i = 0; i < points.size(); ++i) {
+                    const double d = std::fabs((points[i] - points[i0]).Dot(normal));
+                    if (d > max_plane_distance) {
+                        max_plane_distance = d;
+                        i3 = i;
+                    }
+                }
+                if (max_plane_distance <= eps) {
+                    return false;
+                }
+
+                struct HullFace {
+                    int v[3];
+                    gp_XYZ normal;
+                    double offset;
+                };
+
+                // The hull only grows, so the centroid of the initial tetrahedron
+                // remains inside and is used to orient new faces outwards.
+                const gp_XYZ inside = (points[i0] + points[i1] + points[i2] + points[i3]) / 4.;
+
+                std::vector<HullFace> hull;
+                auto add_face = [&points, &inside, &hull](int a, int b, int c) {
+                    HullFace f;
+                    gp_XYZ n = (points[b] - points[a]) ^ (points[c] - points[a]);
+                    const double m = n.Modulus();
+                    if (m > 0.) {
+                        n /= m;
+                    }
+                    if (n.Dot(inside - points[a]) > 0.) {
+                        std::swap(b, c);
+                        n.Reverse();
+                    }
+                    f.v[0] = a; f.v[1] = b; f.v[2] = c;
+                    f.normal = n;
+                    f.offset = n.Dot(points[a]);
+                    hull.push_back(f);
+                };
+
+                add_face((int)i0, (int)i1, (int)i2);
+                add_face((int)i0, (int)i1, (int)i3);
+                add_face((int)i0, (int)i2, (int)i3);
+                add_face((int)i1, (int)i2, (int)i3);
+
+                for (size_t i = 0; i < points.size(); ++i) {
+                    if (i == i0 || i == i1 || i == i2 || i == i3) {
+                        continue;
+                    }
+
+                    // Directed edges of the faces that can be seen from the point
+                    std::set<std::pair<int, int> > visible_edges;
+                    std::vector<HullFace> remaining;
+                    remaining.reserve(hull.size());
+                    for (std::vector<HullFace>::const_iterator it = hull.begin(); it != hull.end(); ++it) {
+                        if (it->normal.Dot(points[i]) - it->offset > eps) {
+                            for (int j = 0; j < 3; ++j) {
+                                visible_edges.insert(std::make_pair(it->v[j], it->v[(j + 1) % 3]));
+                            }
+                        } else {
+                            remaining.push_back(*it);
+                        }
+                    }
+
+                    if (visible_edges.empty()) {
+                        continue;
+                    }
+
+                    hull.swap(remaining);
+
+                    // Connect the horizon, i.e. edges of which the opposite
+                    // face is not visible, to the point.
+                    for (std::set<std::pair<int, int> >::const_iterator it = visible_edges.begin(); it != visible_edges.end(); ++it) {
+                        if (visible_edges.find(std::make_pair(it->second, it->first)) == visible_edges.end()) {
+                            add_face(it->first, it->second, (int)i);
+                        }
+                    }
+                }
+
+                for (std::vector<HullFace>::const_iterator it = hull.begin(); it != hull.end(); ++it) {
+                    faces.insert(faces.end(), it->v, it->v + 3);
+                }
+
+                return true;
+            }
+
+            /// Triangulates an axis-aligned box with outward oriented faces.
+            static void box(const gp_XYZ& lower, const gp_XYZ& upper, std::vector<gp_XYZ>& points, std::vector<int>& faces)
+            {
+                // Corner i has the upper x, y, z coordinate when bit 0, 1, 2 is set respectively.
+                static const int box_faces[36] = {
+                    0, 2, 3, 0, 3, 1,
+                    4, 5, 7, 4, 7, 6,
+                    0, 1, 5, 0, 5, 4,
+                    2, 6, 7, 2, 7, 3,
+                    0, 4, 6, 0, 6, 2,
+                    1, 3, 7, 1, 7, 5
+                };
+                const int offset = (int)points.size();
+                for (int i = 0; i < 8; ++i) {
+                    points.push_back(gp_XYZ(
+                        (i & 1) ? upper.X() : lower.X(),
+                        (i & 2) ? upper.Y() : lower.Y(),
+                        (i & 4) ? upper.Z() : lower.Z()));
+                }
+                for (int i = 0; i < 36; ++i) {
+                    faces.push_back(offset + box_faces[i]);
+                }
+            }
+
 		private:
+			int addMaterial(const IfcGeom::IfcRepresentationShapeItem& item) {
+				int surface_style_id = -1;
+				if (item.hasStyle()) {
+					Material adapter(&item.Style());
+					std::vector<Material>::const_iterator jt = std::find(_materials.begin(), _materials.end(), adapter);
+					if (jt == _materials.end()) {
+						surface_style_id = (int)_materials.size();
+						_materials.push_back(adapter);
+					} else {
+						surface_style_id = (int)(jt - _materials.begin());
+					}
+				}
+
+				if (settings().get(IteratorSettings::APPLY_DEFAULT_MATERIALS) && surface_style_id == -1) {
+					Material material(IfcGeom::get_default_style(settings().element_type()));
+					std::vector<Material>::const_iterator mit = std::find(_materials.begin(), _materials.end(), material);
+					if (mit == _materials.end()) {
+						surface_style_id = (int)_materials.size();
+						_materials.push_back(material);
+					} else {
+						surface_style_id = (int)(mit - _materials.begin());
+					}
+				}
+
+				return surface_style_id;
+			}
+
+			// Replaces the triangulation by its bounding box without triangulating the BRep
+			void addBoundingBox(const BRep& shape_model) {
+				Bnd_Box bounds;
+				for (IfcGeom::IfcRepresentationShapeItems::const_iterator iit = shape_model.begin(); iit != shape_model.end(); ++iit) {
+					Bnd_Box item_bounds;
+					try {
+						BRepBndLib::Add(iit->Shape(), item_bounds);
+					} catch (...) {
+						Logger::Message(Logger::LOG_ERROR, "Failed to compute bounding box of shape");
+						continue;
+					}
+					if (item_bounds.IsVoid()) {
+						continue;
+					}
+					double xyz[6];
+					item_bounds.Get(xyz[0], xyz[1], xyz[2], xyz[3], xyz[4], xyz[5]);
+					for (int i = 0; i < 8; ++i) {
+						gp_XYZ corner(xyz[(i & 1) ? 3 : 0], xyz[(i & 2) ? 4 : 1], xyz[(i & 4) ? 5 : 2]);
+						iit->Placement().Transforms(corner);
+						bounds.Add(gp_Pnt(corner));
+					}
+				}
+
+				if (bounds.IsVoid()) {
+					return;
+				}
+
+				double xyz[6];
+				bounds.Get(xyz[0], xyz[1], xyz[2], xyz[3], xyz[4], xyz[5]);
+				if (settings().get(IteratorSettings::CONVERT_BACK_UNITS)) {
+					for (int i = 0; i < 6; ++i) {
+						xyz[i] /= settings().unit_magnitude();
+					}
+				}
+
+				const int surface_style_id = addMaterial(*shape_model.begin());
+
+				std::vector<gp_XYZ> points;
+				std::vector<int> faces;
+				box(gp_XYZ(xyz[0], xyz[1], xyz[2]), gp_XYZ(xyz[3], xyz[4], xyz[5]), points, faces);
+				setMesh(points, faces, std::vector<int>(faces.size() / 3, surface_style_id));
+			}
+
+			// Replaces the triangulation by a reduced level of detail. Representations
+			// of only edges are kept as is. Otherwise the edges are dropped, as these are
+			// the face boundaries of the full triangulation, and any loose edges of mixed
+			// representations are not carried over to the reduced vertices either.
+			void reduce(int level_of_detail, int lod_resolution) {
+				if (level_of_detail == IteratorSettings::LOD_FULL || _faces.empty()) {
+					return;
+				}
+
+				std::vector<gp_XYZ> points;
+				points.reserve(_verts.size() / 3);
+				for (size_t i = 0; i + 2 < _verts.size(); i += 3) {
+					points.push_back(gp_XYZ(_verts[i], _verts[i + 1], _verts[i + 2]));
+				}
+
+				std::vector<gp_XYZ> reduced_points;
+				std::vector<int> reduced_faces, reduced_material_ids;
+
+				if (level_of_detail == IteratorSettings::LOD_SIMPLIFIED) {
+					cluster_vertices(points, _faces, _material_ids, lod_resolution, reduced_points, reduced_faces, reduced_material_ids);
+				} else {
+					const int surface_style_id = _material_ids.empty() ? -1 : _material_ids.front();
+					if (level_of_detail == IteratorSettings::LOD_CONVEX_HULL && convex_hull(points, reduced_faces)) {
+						reduced_points.swap(points);
+					} else {
+						// Planar or linear geometry has no volumetric hull, use the box instead
+						gp_XYZ lower = points.front(), upper = points.front();
+						for (std::vector<gp_XYZ>::const_iterator it = points.begin(); it != points.end(); ++it) {
+							for (int i = 1; i <= 3; ++i) {
+								lower.SetCoord(i, (std::min)(lower.Coord(i), it->Coord(i)));
+								upper.SetCoord(i, (std::max)(upper.Coord(i), it->Coord(i)));
+							}
+						}
+						box(lower, upper, reduced_points, reduced_faces);
+					}
+					reduced_material_ids.assign(reduced_faces.size() / 3, surface_style_id);
+				}
+
+				setMesh(reduced_points, reduced_faces, reduced_material_ids);
+			}
+
+			// Replaces the vertex and face buffers. Only referenced points are stored.
+			// When normals are requested every triangle is given its own vertices and
+			// flat normal, as the reduced geometry does not correspond to surfaces anymore.
+			void setMesh(const std::vector<gp_XYZ>& points, const std::vector<int>& faces, const std::vector<int>& material_ids) {
+				_verts.clear();
+				_faces.clear();
+				_edges.clear();
+				_normals.clear();
+				uvs_.clear();
+				_material_ids = material_ids;
+
+				const bool calculate_normals = !settings().get(IteratorSettings::WELD_VERTICES) &&
+					!settings().get(IteratorSettings::NO_NORMALS);
+
+				if (calculate_normals) {
+					for (size_t i = 0; i + 2 < faces.size(); i += 3) {
+						const gp_XYZ& a = points[faces[i]];
+						const gp_XYZ& b = points[faces[i + 1]];
+						const gp_XYZ& c = points[faces[i + 2]];
+						gp_XYZ normal = (b - a) ^ (c - a);
+						const double m = normal.Modulus();
+						if (m > 1.e-12) {
+							normal /= m;
+						}
+						for (int j = 0; j < 3; ++j) {
+							const gp_XYZ& p = points[faces[i + j]];
+							_verts.push_back(static_cast<P>(p.X()));
+							_verts.push_back(static_cast<P>(p.Y()));
+							_verts.push_back(static_cast<P>(p.Z()));
+							_normals.push_back(static_cast<P>(normal.X()));
+							_normals.push_back(static_cast<P>(normal.Y()));
+							_normals.push_back(static_cast<P>(normal.Z()));
+							_faces.push_back((int)(i + j));
+						}
+					}
+					if (settings().get(IfcGeom::IteratorSettings::GENERATE_UVS)) {
+						uvs_ = box_project_uvs(_verts, _normals);
+					}
+				} else {
+					std::vector<int> remap(points.size(), -1);
+					for (std::vector<int>::const_iterator it = faces.begin(); it != faces.end(); ++it) {
+						if (remap[*it] == -1) {
+							remap[*it] = (int)_verts.size() / 3;
+							_verts.push_back(static_cast<P>(points[*it].X()));
+							_verts.push_back(static_cast<P>(points[*it].Y()));
+							_verts.push_back(static_cast<P>(points[*it].Z()));
+						}
+						_faces.push_back(remap[*it]);
+					}
+				}
+			}
+
 			// Welds vertices that belong to different faces
 			int addVertex(int material_index, const gp_XYZ& p) {
                 const bool convert = settings().get(IteratorSettings::CONVERT_BACK_UNITS);
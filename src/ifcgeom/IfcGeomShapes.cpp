@@ -558,6 +558,14 @@ bool IfcGeom::Kernel::convert(const IfcSchema::IfcBooleanResult* l, TopoDS_Shape
 		return false;
 	}
 
+	if (getValue(GV_MAX_BOOLEAN_OPERANDS) >= 0. && boolean_operand_limit_exceeded(count_boolean_operands(l), l)) {
+		// Fall back to the innermost first operand, i.e. the unclipped body
+		while (operand1->as<IfcSchema::IfcBooleanResult>()) {
+			operand1 = operand1->as<IfcSchema::IfcBooleanResult>()->FirstOperand();
+		}
+		return convert_shape(operand1, shape);
+	}
+
 	std::vector<IfcSchema::IfcBooleanOperand*> second_operands;
 	second_operands.push_back(operand2);
 
@@ -612,6 +620,11 @@ bool IfcGeom::Kernel::convert(const IfcSchema::IfcBooleanResult* l, TopoDS_Shape
 		return true;
 	}
 
+	if (element_budget_exhausted(l)) {
+		shape = s1;
+		return true;
+	}
+
 	const double first_operand_volume = shape_volume(s1);
 	if (first_operand_volume <= ALMOST_ZERO) {
 		Logger::Message(Logger::LOG_WARNING, "Empty solid for:", l->FirstOperand());
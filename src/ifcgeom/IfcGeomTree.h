@@ -31,10 +31,36 @@
 #include <BRepAlgoAPI_Common.hxx>
 #include <BRepAlgoAPI_Cut.hxx>
 #include <BRepClass3d_SolidClassifier.hxx>
+#include <BRepTools.hxx>
+#include <BRep_Builder.hxx>
+#include <BRepExtrema_DistShapeShape.hxx>
+#include <BRepBuilderAPI_MakeVertex.hxx>
+#include <IntCurvesFace_ShapeIntersector.hxx>
+#include <gp_Lin.hxx>
+#include <Precision.hxx>
+
+#include <algorithm>
+#include <cmath>
+#include <cstdint>
+#include <limits>
+#include <cstring>
+#include <fstream>
+#include <sstream>
 
 namespace IfcGeom {
 
 	namespace impl {
+		template <typename T>
+		struct ray_intersection {
+			T instance;
+			gp_Pnt position;
+			double distance;
+
+			bool operator<(const ray_intersection& other) const {
+				return distance < other.distance;
+			}
+		};
+
 		template <typename T>
 		class tree {
 
@@ -42,6 +68,8 @@ namespace IfcGeom {
 
 			void add(const T& t, const Bnd_Box& b) {
 				tree_.Add(t, b);
+				boxes_[t] = b;
+				bounds_.Add(b);
 			}
 
 			void add(const T& t, const TopoDS_Shape& s) {
@@ -52,13 +80,12 @@ namespace IfcGeom {
 			}
 
 			std::vector<T> select_box(const T& t, bool completely_within = false, double extend=-1.e-5) const {
-				typename map_t::const_iterator it = shapes_.find(t);
-				if (it == shapes_.end()) {
+				typename box_map_t::const_iterator it = boxes_.find(t);
+				if (it == boxes_.end()) {
 					return std::vector<T>();
 				}
 
-				Bnd_Box b;
-				BRepBndLib::AddClose(it->second, b);
+				Bnd_Box b = it->second;
 
 				// Gap is assumed to be positive throughout the codebase,
 				// but at least for IsOut() in the selector a negative
@@ -83,9 +110,7 @@ namespace IfcGeom {
 					ts_filtered.reserve(ts.size());
 					typename std::vector<T>::const_iterator it = ts.begin();
 					for (; it != ts.end(); ++it) {
-						const TopoDS_Shape& shp = shapes_.find(*it)->second;
-						Bnd_Box B;
-						BRepBndLib::AddClose(shp, B);
+						const Bnd_Box& B = boxes_.find(*it)->second;
 
 						// BndBox::CornerMin() /-Max() introduced in OCCT 6.8
 						double x1, y1, z1, x2, y2, z2;
@@ -112,7 +137,13 @@ namespace IfcGeom {
 
 				std::vector<T> ts_filtered;
 
-				const TopoDS_Shape& A = shapes_.find(t)->second;
+				// Trees read from disk without shapes only support box queries
+				typename map_t::const_iterator shp = shapes_.find(t);
+				if (shp == shapes_.end()) {
+					return ts_filtered;
+				}
+
+				const TopoDS_Shape& A = shp->second;
 				if (IfcGeom::Kernel::count(A, TopAbs_SHELL) == 0) {
 					return ts_filtered;
 				}
@@ -121,7 +152,11 @@ namespace IfcGeom {
 
 				typename std::vector<T>::const_iterator it = ts.begin();
 				for (it = ts.begin(); it != ts.end(); ++it) {
-					const TopoDS_Shape& B = shapes_.find(*it)->second;
+					shp = shapes_.find(*it);
+					if (shp == shapes_.end()) {
+						continue;
+					}
+					const TopoDS_Shape& B = shp->second;
 					if (IfcGeom::Kernel::count(B, TopAbs_SHELL) == 0) {
 						continue;
 					}
@@ -167,7 +202,11 @@ namespace IfcGeom {
 
 				typename std::vector<T>::const_iterator it = ts.begin();
 				for (it = ts.begin(); it != ts.end(); ++it) {
-					const TopoDS_Shape& B = shapes_.find(*it)->second;
+					typename map_t::const_iterator shp = shapes_.find(*it);
+					if (shp == shapes_.end()) {
+						continue;
+					}
+					const TopoDS_Shape& B = shp->second;
 					
 					if (IfcGeom::Kernel::count(B, TopAbs_SHELL) == 0) {
 						continue;
@@ -195,8 +234,11 @@ namespace IfcGeom {
 
 				typename std::vector<T>::const_iterator it = ts.begin();
 				for (it = ts.begin(); it != ts.end(); ++it) {
-					const TopoDS_Shape& B = shapes_.find(*it)->second;
-					TopExp_Explorer exp(B, TopAbs_SOLID);
+					typename map_t::const_iterator shp = shapes_.find(*it);
+					if (shp == shapes_.end()) {
+						continue;
+					}
+					TopExp_Explorer exp(shp->second, TopAbs_SOLID);
 					for (; exp.More(); exp.Next()) {
 						BRepClass3d_SolidClassifier cls(exp.Current(), p, 1e-5);
 						if (cls.State() != TopAbs_OUT) {
@@ -209,12 +251,217 @@ namespace IfcGeom {
 				return ts_filtered;
 			}
 
+			/// Returns the k elements nearest to p, ordered by increasing distance.
+			/// The search radius starts at a fraction of the size of the tree and
+			/// grows until it is known to contain the k nearest elements, so that
+			/// the exact distance is only computed for elements close to p.
+			std::vector<T> select_nearest(const gp_Pnt& p, int k = 1) const {
+				std::vector<T> ts;
+				if (k <= 0 || bounds_.IsVoid()) {
+					return ts;
+				}
+
+				const double distance_to_bounds = box_distance(bounds_, p);
+				const double max_radius = distance_to_bounds + std::sqrt(bounds_.SquareExtent());
+				double radius = distance_to_bounds + std::sqrt(bounds_.SquareExtent()) / 64.;
+
+				std::map<T, double> distances;
+				std::vector<std::pair<double, T> > candidates;
+
+				for (;;) {
+					candidates.clear();
+					std::vector<T> within_box = select_box(p, radius);
+					typename std::vector<T>::const_iterator it = within_box.begin();
+					for (; it != within_box.end(); ++it) {
+						if (box_distance(boxes_.find(*it)->second, p) > radius) {
+							continue;
+						}
+						typename std::map<T, double>::const_iterator jt = distances.find(*it);
+						if (jt == distances.end()) {
+							jt = distances.insert(std::make_pair(*it, distance(*it, p))).first;
+						}
+						candidates.push_back(std::make_pair(jt->second, *it));
+					}
+
+					const bool exhausted = radius >= max_radius;
+					if ((int)candidates.size() >= k || exhausted) {
+						const size_t n = (std::min)((size_t)k, candidates.size());
+						std::partial_sort(candidates.begin(), candidates.begin() + n, candidates.end());
+						// Elements outside of the radius are further away than the
+						// k-th candidate only if its distance is within the radius.
+						if (n == 0 || exhausted || candidates[n - 1].first <= radius) {
+							for (size_t i = 0; i < n; ++i) {
+								ts.push_back(candidates[i].second);
+							}
+							return ts;
+						}
+						radius = candidates[n - 1].first;
+					} else {
+						radius *= 2.;
+					}
+					radius = (std::min)(radius, max_radius);
+				}
+			}
+
+			/// Returns the elements within the given distance of p, ordered by
+			/// increasing distance. Points inside solids are at distance zero.
+			std::vector<T> select_within(const gp_Pnt& p, double max_distance) const {
+				std::vector<std::pair<double, T> > candidates;
+				std::vector<T> within_box = select_box(p, max_distance);
+				typename std::vector<T>::const_iterator it = within_box.begin();
+				for (; it != within_box.end(); ++it) {
+					if (box_distance(boxes_.find(*it)->second, p) > max_distance) {
+						continue;
+					}
+					const double d = distance(*it, p);
+					if (d <= max_distance) {
+						candidates.push_back(std::make_pair(d, *it));
+					}
+				}
+				std::sort(candidates.begin(), candidates.end());
+
+				std::vector<T> ts;
+				ts.reserve(candidates.size());
+				typename std::vector<std::pair<double, T> >::const_iterator jt = candidates.begin();
+				for (; jt != candidates.end(); ++jt) {
+					ts.push_back(jt->second);
+				}
+				return ts;
+			}
+
+			/// Returns the first intersection of every element that is hit by the ray
+			/// from origin along direction up to length, ordered by increasing distance.
+			/// For elements read without a shape, the bounding box is intersected.
+			std::vector< ray_intersection<T> > select_ray(const gp_Pnt& origin, const gp_Dir& direction, double length = Precision::Infinite()) const {
+				const gp_Lin line(origin, direction);
+				ray_selector s(line);
+				tree_.Select(s);
+
+				std::vector< ray_intersection<T> > intersections;
+
+				typename std::vector<T>::const_iterator it = s.results().begin();
+				for (; it != s.results().end(); ++it) {
+					ray_intersection<T> intersection;
+					intersection.instance = *it;
+					intersection.distance = std::numeric_limits<double>::infinity();
+
+					typename map_t::const_iterator shp = shapes_.find(*it);
+					if (shp == shapes_.end()) {
+						double near_distance, far_distance;
+						if (!ray_box_intersection(boxes_.find(*it)->second, origin, direction, near_distance, far_distance)) {
+							continue;
+						}
+						intersection.distance = near_distance;
+					} else {
+						IntCurvesFace_ShapeIntersector intersector;
+						intersector.Load(shp->second, 1.e-5);
+						intersector.Perform(line, 0., length);
+						if (!intersector.IsDone()) {
+							continue;
+						}
+						for (int i = 1; i <= intersector.NbPnt(); ++i) {
+							intersection.distance = (std::min)(intersection.distance, intersector.WParameter(i));
+						}
+					}
+
+					if (intersection.distance <= length) {
+						intersection.position = gp_Pnt(origin.XYZ() + direction.XYZ() * intersection.distance);
+						intersections.push_back(intersection);
+					}
+				}
+
+				std::sort(intersections.begin(), intersections.end());
+				return intersections;
+			}
+
+			/// The distance between p and the shape of an element, or its bounding box
+			/// in case the tree was read without shapes.
+			double distance(const T& t, const gp_Pnt& p) const {
+				typename map_t::const_iterator shp = shapes_.find(t);
+				if (shp == shapes_.end()) {
+					typename box_map_t::const_iterator it = boxes_.find(t);
+					return it == boxes_.end() ? std::numeric_limits<double>::infinity() : box_distance(it->second, p);
+				}
+
+				for (TopExp_Explorer exp(shp->second, TopAbs_SOLID); exp.More(); exp.Next()) {
+					BRepClass3d_SolidClassifier cls(exp.Current(), p, 1e-5);
+					if (cls.State() != TopAbs_OUT) {
+						return 0.;
+					}
+				}
+
+				BRepExtrema_DistShapeShape dss(BRepBuilderAPI_MakeVertex(p).Vertex(), shp->second);
+				if (dss.IsDone() && dss.NbSolution() > 0) {
+					return dss.Value();
+				}
+
+				return box_distance(boxes_.find(t)->second, p);
+			}
+
 		protected:
 
+			std::vector<T> select_box(const gp_Pnt& p, double radius) const {
+				Bnd_Box b;
+				b.Add(p);
+				b.Enlarge(radius);
+				return select_box(b);
+			}
+
+			static double box_distance(const Bnd_Box& b, const gp_Pnt& p) {
+				if (b.IsVoid()) {
+					return std::numeric_limits<double>::infinity();
+				}
+				double xyz[6];
+				b.Get(xyz[0], xyz[1], xyz[2], xyz[3], xyz[4], xyz[5]);
+				double d = 0.;
+				for (int i = 0; i < 3; ++i) {
+					const double c = p.Coord(i + 1);
+					const double delta = (std::max)((std::max)(xyz[i] - c, c - xyz[i + 3]), 0.);
+					d += delta * delta;
+				}
+				return std::sqrt(d);
+			}
+
+			// Slab test of a ray against a box, distances along the ray are
+			// clamped to be non-negative.
+			static bool ray_box_intersection(const Bnd_Box& b, const gp_Pnt& origin, const gp_Dir& direction, double& near_distance, double& far_distance) {
+				if (b.IsVoid()) {
+					return false;
+				}
+				double xyz[6];
+				b.Get(xyz[0], xyz[1], xyz[2], xyz[3], xyz[4], xyz[5]);
+				near_distance = 0.;
+				far_distance = std::numeric_limits<double>::infinity();
+				for (int i = 0; i < 3; ++i) {
+					const double o = origin.Coord(i + 1);
+					const double d = direction.Coord(i + 1);
+					if (std::fabs(d) < 1.e-12) {
+						if (o < xyz[i] || o > xyz[i + 3]) {
+							return false;
+						}
+						continue;
+					}
+					double t0 = (xyz[i] - o) / d;
+					double t1 = (xyz[i + 3] - o) / d;
+					if (t0 > t1) {
+						std::swap(t0, t1);
+					}
+					near_distance = (std::max)(near_distance, t0);
+					far_distance = (std::min)(far_distance, t1);
+					if (near_distance > far_distance) {
+						return false;
+					}
+				}
+				return true;
+			}
+
 			typedef NCollection_UBTree<T, Bnd_Box> tree_t;
 			typedef std::map<T, TopoDS_Shape> map_t;
+			typedef std::map<T, Bnd_Box> box_map_t;
 			tree_t tree_;
 			map_t shapes_;
+			box_map_t boxes_;
+			Bnd_Box bounds_;
 
 			class selector : public tree_t::Selector
 			{
@@ -242,6 +489,32 @@ namespace IfcGeom {
 				const Bnd_Box& bounds_;
 			};
 
+			class ray_selector : public tree_t::Selector
+			{
+			public:
+				ray_selector(const gp_Lin& l)
+					: tree_t::Selector()
+					, line_(l)
+				{}
+
+				Standard_Boolean Reject(const Bnd_Box& b) const {
+					return b.IsOut(line_);
+				}
+
+				Standard_Boolean Accept(const T& o) {
+					results_.push_back(o);
+					return Standard_True;
+				}
+
+				const std::vector<T>& results() const {
+					return results_;
+				}
+
+			private:
+				std::vector<T> results_;
+				const gp_Lin& line_;
+			};
+
 		};
 	}
 
@@ -258,13 +531,13 @@ namespace IfcGeom {
 			add_file(f, settings);
 		}
 
-		void add_file(IfcParse::IfcFile& f, const IfcGeom::IteratorSettings& settings) {
+		void add_file(IfcParse::IfcFile& f, const IfcGeom::IteratorSettings& settings, int num_threads = 1) {
 			IfcGeom::IteratorSettings settings_ = settings;
 			settings_.set(IfcGeom::IteratorSettings::DISABLE_TRIANGULATION, true);
 			settings_.set(IfcGeom::IteratorSettings::USE_WORLD_COORDS, true);
 			settings_.set(IfcGeom::IteratorSettings::SEW_SHELLS, true);
 
-			IfcGeom::Iterator<double> it(settings_, &f);
+			IfcGeom::Iterator<double> it(settings_, &f, num_threads);
 
 			if (it.initialize()) {
 				do {
@@ -273,6 +546,128 @@ namespace IfcGeom {
 				} while (it.next());
 			}
 		}
+
+		/// Writes the bounding boxes of the elements in the tree, and optionally
+		/// their shapes, to a binary file. Elements are identified by their GlobalId
+		/// so that the tree can be read back for the same model with read().
+		/// Shapes are stored in the Open Cascade BRep format, which includes their
+		/// triangulation when present. Doubles are stored in native byte order.
+		void write(const std::string& filename, bool include_shapes = true) const {
+			std::ofstream stream(filename.c_str(), std::ios::binary);
+			if (!stream) {
+				throw IfcParse::IfcException("Unable to open " + filename + " for writing");
+			}
+
+			stream.write(file_magic(), FILE_MAGIC_SIZE);
+			write_value(stream, file_version());
+			write_value(stream, static_cast<uint8_t>(include_shapes));
+			write_value(stream, static_cast<uint64_t>(boxes_.size()));
+
+			for (box_map_t::const_iterator it = boxes_.begin(); it != boxes_.end(); ++it) {
+				write_string(stream, *it->first->get("GlobalId"));
+
+				double xyz[6];
+				it->second.Get(xyz[0], xyz[1], xyz[2], xyz[3], xyz[4], xyz[5]);
+				stream.write(reinterpret_cast<const char*>(xyz), sizeof(xyz));
+
+				if (include_shapes) {
+					std::ostringstream brep;
+					map_t::const_iterator shp = shapes_.find(it->first);
+					if (shp != shapes_.end()) {
+						BRepTools::Write(shp->second, brep);
+					}
+					write_string(stream, brep.str());
+				}
+			}
+
+			if (!stream) {
+				throw IfcParse::IfcException("Failed to write " + filename);
+			}
+		}
+
+		/// Reads the elements written by write() and adds them to the tree. The
+		/// GlobalIds are resolved in the file provided, which should be the model
+		/// for which the tree was written. No geometry is processed, so that spatial
+		/// queries can be answered right away. When the file was written without
+		/// shapes, only select_box() queries are supported.
+		void read(IfcParse::IfcFile& f, const std::string& filename) {
+			std::ifstream stream(filename.c_str(), std::ios::binary);
+			if (!stream) {
+				throw IfcParse::IfcException("Unable to open " + filename + " for reading");
+			}
+
+			char magic[FILE_MAGIC_SIZE];
+			stream.read(magic, FILE_MAGIC_SIZE);
+			if (!stream || std::memcmp(magic, file_magic(), FILE_MAGIC_SIZE) != 0 || read_value<uint32_t>(stream) != file_version()) {
+				throw IfcParse::IfcException(filename + " is not a valid tree file");
+			}
+
+			const bool include_shapes = read_value<uint8_t>(stream) != 0;
+			const uint64_t n = read_value<uint64_t>(stream);
+
+			BRep_Builder builder;
+			for (uint64_t i = 0; i < n; ++i) {
+				const std::string guid = read_string(stream);
+
+				double xyz[6];
+				stream.read(reinterpret_cast<char*>(xyz), sizeof(xyz));
+				if (!stream) {
+					throw IfcParse::IfcException("Unexpected end of " + filename);
+				}
+
+				IfcUtil::IfcBaseEntity* inst = (IfcUtil::IfcBaseEntity*)f.instance_by_guid(guid);
+
+				Bnd_Box b;
+				b.Update(xyz[0], xyz[1], xyz[2], xyz[3], xyz[4], xyz[5]);
+				add(inst, b);
+
+				if (include_shapes) {
+					const std::string brep = read_string(stream);
+					if (!brep.empty()) {
+						std::istringstream brep_stream(brep);
+						TopoDS_Shape shp;
+						BRepTools::Read(shp, brep_stream, builder);
+						shapes_[inst] = shp;
+					}
+				}
+			}
+		}
+
+	private:
+		enum { FILE_MAGIC_SIZE = 8 };
+		static const char* file_magic() { return "IFCTREE\n"; }
+		static uint32_t file_version() { return 1; }
+
+		template <typename V>
+		static void write_value(std::ostream& stream, V v) {
+			stream.write(reinterpret_cast<const char*>(&v), sizeof(V));
+		}
+
+		template <typename V>
+		static V read_value(std::istream& stream) {
+			V v = V();
+			stream.read(reinterpret_cast<char*>(&v), sizeof(V));
+			if (!stream) {
+				throw IfcParse::IfcException("Unexpected end of tree file");
+			}
+			return v;
+		}
+
+		static void write_string(std::ostream& stream, const std::string& str) {
+			write_value(stream, static_cast<uint64_t>(str.size()));
+			stream.write(str.data(), str.size());
+		}
+
+		static std::string read_string(std::istream& stream) {
+			std::string str(static_cast<size_t>(read_value<uint64_t>(stream)), '\0');
+			if (!str.empty()) {
+				stream.read(&str[0], str.size());
+				if (!stream) {
+					throw IfcParse::IfcException("Unexpected end of tree file");
+				}
+			}
+			return str;
+		}
 	};
 
 }
@@ -89,7 +89,10 @@ bool IfcGeom::Kernel::convert_shape(const IfcBaseClass* l, TopoDS_Shape& r) {
 		const double precision = getValue(GV_PRECISION);
 		apply_tolerance(r, precision);
 #ifndef NO_CACHE
-		cache.Shape[id] = r;
+		// Simplified results due to an exhausted time budget are not to be reused by other products
+		if (!element_budget_exceeded_) {
+			cache.Shape[id] = r;
+		}
 #endif
 	} else if (!ignored) {
 		const char* const msg = processed
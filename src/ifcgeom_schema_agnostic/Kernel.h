@@ -54,7 +54,13 @@ namespace IfcGeom {
 			// Whether to process shapes of type Face or higher (1) Wire or lower (-1) or all (0)
 			GV_DIMENSIONALITY,
             GV_LAYERSET_FIRST,
-			GV_DISABLE_BOOLEAN_RESULT
+			GV_DISABLE_BOOLEAN_RESULT,
+			// Time in seconds after which boolean operations for a single product are skipped
+			// Default: -1.0 (= no time budget)
+			GV_ELEMENT_TIME_BUDGET,
+			// Maximum number of boolean operands evaluated for a single product
+			// Default: -1.0 (= no limit)
+			GV_MAX_BOOLEAN_OPERANDS
 		};
 
 		Kernel(IfcParse::IfcFile* file_ = 0);
@@ -124,16 +124,46 @@ class iterator(_iterator):
 
 
 class tree(ifcopenshell_wrapper.tree):
-    def __init__(self, file=None, settings=None):
+    def __init__(self, file=None, settings=None, num_threads=1):
         args = [self]
-        if file is not None:
+        if file is not None and num_threads == 1:
             args.append(file.wrapped_data)
             if settings is not None:
                 args.append(settings)
         ifcopenshell_wrapper.tree.__init__(*args)
+        if file is not None and num_threads != 1:
+            self.add_file(file, settings or ifcopenshell_wrapper.settings(), num_threads)
 
-    def add_file(self, file, settings):
-        ifcopenshell_wrapper.tree.add_file(self, file.wrapped_data, settings)
+    def add_file(self, file, settings, num_threads=1):
+        ifcopenshell_wrapper.tree.add_file(self, file.wrapped_data, settings, num_threads)
+
+    def write(self, path, include_shapes=True):
+        """
+        Writes the bounding boxes, and optionally the shapes, of the elements
+        in the tree to disk so that it can be restored using read() without
+        processing the geometry of the model again. Without shapes only
+        select_box() queries are supported after reading.
+
+        example:
+
+        t = ifcopenshell.geom.tree(ifc_file, settings, num_threads=8)
+        t.write("model.tree")
+        """
+        ifcopenshell_wrapper.tree.write(self, os.path.abspath(path), include_shapes)
+
+    def read(self, file, path):
+        """
+        Adds the elements stored by write() to the tree. The elements are
+        looked up by GlobalId in file, which should be the model from which
+        the tree was written.
+
+        example:
+
+        t = ifcopenshell.geom.tree()
+        t.read(ifc_file, "model.tree")
+        print(t.select_box(wall))
+        """
+        ifcopenshell_wrapper.tree.read(self, file.wrapped_data, os.path.abspath(path))
 
     def select(self, value, **kwargs):
         def unwrap(value):
@@ -166,6 +196,85 @@ class tree(ifcopenshell_wrapper.tree):
             args.append(kwargs.get("extend", -1.0e-5))
         return [entity_instance(e) for e in ifcopenshell_wrapper.tree.select_box(*args)]
 
+    def select_nearest(self, point, k=1):
+        """
+        Returns the k elements nearest to point, ordered by increasing distance
+        """
+        return [entity_instance(e) for e in ifcopenshell_wrapper.tree.select_nearest(self, _point(point), k)]
+
+    def select_within(self, point, distance):
+        """
+        Returns the elements within distance of point, ordered by increasing distance
+        """
+        return [entity_instance(e) for e in ifcopenshell_wrapper.tree.select_within(self, _point(point), distance)]
+
+    def select_ray(self, origin, direction, length=None):
+        """
+        Returns (element, (x, y, z), distance) tuples for the first intersection
+        with every element hit by the ray, ordered by increasing distance
+        """
+        args = [self, _point(origin), _point(direction)]
+        if length is not None:
+            args.append(length)
+        return [(entity_instance(e), p, d) for e, p, d in ifcopenshell_wrapper.tree.select_ray(*args)]
+
+    def select_box_batch(self, boxes, completely_within=False):
+        """
+        Runs select_box() for an (N, 2, 3) array of lower and upper box corners
+        and returns a list with the elements selected for every box
+        """
+        results = ifcopenshell_wrapper.tree.select_box_batch(self, _flatten(boxes, 6), completely_within)
+        return [[entity_instance(e) for e in es] for es in results]
+
+    def select_nearest_batch(self, points, k=1):
+        """
+        Runs select_nearest() for an (N, 3) array of points
+        """
+        results = ifcopenshell_wrapper.tree.select_nearest_batch(self, _flatten(points, 3), k)
+        return [[entity_instance(e) for e in es] for es in results]
+
+    def select_within_batch(self, points, distance):
+        """
+        Runs select_within() for an (N, 3) array of points
+        """
+        results = ifcopenshell_wrapper.tree.select_within_batch(self, _flatten(points, 3), distance)
+        return [[entity_instance(e) for e in es] for es in results]
+
+    def select_ray_batch(self, origins, directions, length=None):
+        """
+        Runs select_ray() for (N, 3) arrays of ray origins and directions
+
+        example:
+
+        origins = numpy.array(face_centers)
+        directions = numpy.repeat([[0., 0., -1.]], len(origins), axis=0)
+        for hits in t.select_ray_batch(origins, directions, length=5.):
+            if hits:
+                element, point, distance = hits[0]
+        """
+        import numpy as np
+
+        rays = np.hstack(
+            (np.asarray(origins, dtype=float).reshape(-1, 3), np.asarray(directions, dtype=float).reshape(-1, 3))
+        )
+        args = [self, rays.ravel().tolist()]
+        if length is not None:
+            args.append(length)
+        results = ifcopenshell_wrapper.tree.select_ray_batch(*args)
+        return [[(entity_instance(e), p, d) for e, p, d in hits] for hits in results]
+
+
+def _point(value):
+    if all(map(lambda v: hasattr(value, v), "XYZ")):
+        return value.X(), value.Y(), value.Z()
+    return tuple(map(float, value))
+
+
+def _flatten(values, n):
+    import numpy as np
+
+    return np.asarray(values, dtype=float).reshape(-1, n).ravel().tolist()
+
 
 def create_shape(settings, inst, repr=None):
     """
@@ -203,6 +312,53 @@ def iterate(settings, file_or_filename, num_threads=1, include=None, exclude=Non
                 break
 
 
+def iterate_instances(settings, file_or_filename, num_threads=1, include=None, exclude=None):
+    """
+    Yields (element, geometry_id, matrix) tuples with the geometry of every
+    IfcRepresentationMap or otherwise shared representation created once
+
+    The INSTANCE_MAPPED_ITEMS setting is enabled on the settings provided, so
+    that products referencing the same IfcRepresentationMap share a single
+    geometry and the mapping transformation is incorporated in the matrix.
+    The matrix is the flat 4x3 column-major tuple of element.transformation.
+    The geometry only needs to be read from element.geometry the first time a
+    geometry_id is encountered.
+
+    example:
+
+    meshes = {}
+    for element, geometry_id, matrix in ifcopenshell.geom.iterate_instances(settings, ifc_file):
+        if geometry_id not in meshes:
+            meshes[geometry_id] = (element.geometry.verts, element.geometry.faces)
+        instances.append((element.guid, geometry_id, matrix))
+    """
+    settings.set(settings.INSTANCE_MAPPED_ITEMS, True)
+    for element in iterate(settings, file_or_filename, num_threads, include, exclude):
+        yield element, element.geometry.id, element.transformation.matrix.data
+
+
+def create_level_of_detail(geometry, level_of_detail, resolution=8):
+    """
+    Return a reduced level of detail of a triangulated geometry, so that
+    bounding boxes, convex hulls or simplified meshes can be obtained
+    alongside the full triangulation
+
+    level_of_detail is one of settings.LOD_SIMPLIFIED, settings.LOD_CONVEX_HULL
+    or settings.LOD_BOUNDING_BOX. For LOD_SIMPLIFIED, vertices are clustered
+    on a grid of resolution cells along every axis. In order to obtain the
+    reduced geometry instead of the full triangulation, use
+    settings.set_level_of_detail() which also avoids triangulating the
+    geometry at all for LOD_BOUNDING_BOX.
+
+    example:
+
+    shape = ifcopenshell.geom.create_shape(settings, wall)
+    hull = ifcopenshell.geom.create_level_of_detail(shape.geometry, settings.LOD_CONVEX_HULL)
+    print(len(shape.geometry.faces), len(hull.faces))
+    """
+    return ifcopenshell_wrapper.triangulation_double_precision(geometry, level_of_detail, resolution)
+
+
 def make_shape_function(fn):
     def entity_instance_or_none(e):
         return None if e is None else entity_instance(e)
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+def get_coordinates(points, dimensions=3):
+    """Returns an (N,dimensions) array of the coordinates of points or directions
+
+    Points with fewer coordinates, like 2D points, are padded with zeros.
+    """
+    coordinates = np.zeros((len(points), dimensions))
+    for i, point in enumerate(points):
+        values = point[0]
+        coordinates[i, : len(values)] = values[:dimensions]
+    return coordinates
+
+
+def transform(coordinates, matrix):
+    """Applies a 4x4 matrix to an (N,3) array of coordinates
+
+    Directions are transformed by a matrix without translation.
+    """
+    return np.matmul(coordinates, matrix[:3, :3].T) + matrix[:3, 3]
+
+
+def z_rotation_matrix(angle):
+    matrix = np.eye(4)
+    matrix[0, :2] = np.cos(angle), -np.sin(angle)
+    matrix[1, :2] = np.sin(angle), np.cos(angle)
+    return matrix
+
+
+def translation_matrix(offset):
+    matrix = np.eye(4)
+    matrix[:3, 3] = offset
+    return matrix
+
+
+class CoordinateBatch:
+    """Edits the coordinates of many 3D points and point lists at once
+
+    The rows of IfcCartesianPointList3Ds followed by the coordinates of
+    IfcCartesianPoints are read into a single (N,3) array. After the array is
+    edited, write only updates the point lists and points with changed rows.
+    Points which are not 3D are ignored.
+
+    Example::
+
+        batch = ifcopenshell.util.coordinate.CoordinateBatch(
+            ifc_file.by_type("IfcCartesianPoint"), ifc_file.by_type("IfcCartesianPointList3D"))
+        is_far = np.any(np.abs(batch.coordinates) > 1000000, axis=1)
+        batch.coordinates[is_far] += (-1000000, -1000000, 0)
+        batch.write()
+    """
+
+    def __init__(self, points=(), point_lists=()):
+        self.point_lists = list(point_lists)
+        self.points = [p for p in points if len(p.Coordinates) == 3]
+        rows = [p.CoordList for p in self.point_lists]
+        self.list_offsets = np.cumsum([0] + [len(r) for r in rows])
+        coordinates = []
+        for row in rows:
+            coordinates.extend(row)
+        coordinates.extend(p.Coordinates for p in self.points)
+        self.coordinates = np.array(coordinates, dtype=float).reshape(-1, 3)
+        self.original_coordinates = self.coordinates.copy()
+
+    def get_point_rows(self):
+        start = self.list_offsets[-1]
+        return np.arange(start, start + len(self.points))
+
+    def write(self):
+        changed = np.any(self.coordinates != self.original_coordinates, axis=1)
+        for i, point_list in enumerate(self.point_lists):
+            start, end = self.list_offsets[i], self.list_offsets[i + 1]
+            if changed[start:end].any():
+                point_list.CoordList = self.coordinates[start:end].tolist()
+        start = self.list_offsets[-1]
+        for i in np.flatnonzero(changed[start:]).tolist():
+            self.points[i].Coordinates = self.coordinates[start + i].tolist()
+        self.original_coordinates = self.coordinates.copy()
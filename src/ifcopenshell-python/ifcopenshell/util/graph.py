@@ -0,0 +1,139 @@
+import hashlib
+import ifcopenshell
+
+
+def get_sorted_instances(ifc_file, skip=None):
+    """Yields every instance of a file after the instances it references
+
+    This is an iterative depth first search over direct references only, so
+    deep reference chains do not reach the recursion limit. Instances for
+    which skip returns True are neither yielded nor followed.
+
+    Example::
+
+        for inst in ifcopenshell.util.graph.get_sorted_instances(ifc_file):
+            # All instances referenced by inst were already yielded
+            pass
+    """
+    visited = set()
+    for root in ifc_file:
+        if root.id() in visited or (skip and skip(root)):
+            continue
+        stack = [(root, False)]
+        while stack:
+            inst, is_expanded = stack.pop()
+            if is_expanded:
+                yield inst
+                continue
+            if inst.id() in visited:
+                continue
+            visited.add(inst.id())
+            stack.append((inst, True))
+            for reference in ifc_file.traverse(inst, max_levels=1)[1:]:
+                if reference.id() and reference.id() not in visited and not (skip and skip(reference)):
+                    stack.append((reference, False))
+
+
+def get_key(inst, get_id):
+    """Returns a key of the class and attribute values of an instance
+
+    References are keyed by get_id, which lets instances be compared by the
+    ids their references have after they are mapped or deduplicated.
+    """
+    return (inst.is_a(), tuple(get_value_key(v, get_id) for v in inst))
+
+
+def get_value_key(value, get_id):
+    if isinstance(value, (list, tuple)):
+        return tuple(get_value_key(v, get_id) for v in value)
+    elif isinstance(value, ifcopenshell.entity_instance):
+        if value.id() == 0:
+            return (value.is_a(), get_value_key(value[0], get_id))
+        return ("#", get_id(value))
+    return value
+
+
+def get_digest(inst, get_id):
+    """Returns a compact digest of the key of an instance, to keep memory bounded for large keys"""
+    return hashlib.blake2b(repr(get_key(inst, get_id)).encode("utf-8"), digest_size=16).digest()
+
+
+def map_value(value, ifc_file, get_instance):
+    """Replicates an attribute value in a file, mapping references with get_instance
+
+    Express simple types are not instances of the file, so they are just
+    created again.
+    """
+    if isinstance(value, (list, tuple)):
+        return type(value)(map_value(v, ifc_file, get_instance) for v in value)
+    elif isinstance(value, ifcopenshell.entity_instance):
+        if value.id() == 0:
+            return ifc_file.create_entity(value.is_a(), value[0])
+        return get_instance(value)
+    return value
+
+
+def copy_unique_instances(ifc_file, new_file, is_unique=None):
+    """Copies the instances of a file into new_file, without duplicates
+
+    Instances are copied once, after the instances they reference. An
+    instance is identified by a key of its class, its attribute values and
+    the new ids of its direct references, which are already deduplicated.
+    Instances with the same key as a previous instance are not copied, and
+    references to them are mapped to the previous instance instead.
+    Instances for which is_unique returns True are always copied. The header
+    of the file is copied too.
+
+    Yields every instance of the file, and whether it was a duplicate.
+
+    Example::
+
+        new_file = ifcopenshell.file(schema=ifc_file.schema)
+        for inst, is_duplicate in ifcopenshell.util.graph.copy_unique_instances(ifc_file, new_file):
+            pass
+    """
+    copy_header(ifc_file, new_file)
+    instance_mapping = {}
+    keys = {}
+
+    def get_id(inst):
+        return instance_mapping[inst.id()].id()
+
+    def get_instance(inst):
+        return instance_mapping[inst.id()]
+
+    for inst in get_sorted_instances(ifc_file):
+        key = None
+        if not (is_unique and is_unique(inst)):
+            key = get_digest(inst, get_id)
+            if key in keys:
+                instance_mapping[inst.id()] = keys[key]
+                yield inst, True
+                continue
+        instance_mapping[inst.id()] = new_file.create_entity(
+            inst.is_a(), *[map_value(v, new_file, get_instance) for v in inst]
+        )
+        if key is not None:
+            keys[key] = instance_mapping[inst.id()]
+        yield inst, False
+
+
+def copy_header(ifc_file, new_file):
+    """Copies the file description and file name of the header of a file"""
+    header_attributes = {
+        "file_description": ("description", "implementation_level"),
+        "file_name": (
+            "name",
+            "time_stamp",
+            "author",
+            "organization",
+            "preprocessor_version",
+            "originating_system",
+            "authorization",
+        ),
+    }
+    for entity, attributes in header_attributes.items():
+        source, target = getattr(ifc_file.header, entity), getattr(new_file.header, entity)
+        for attribute in attributes:
+            value = getattr(source, attribute)
+            setattr(target, attribute, list(value) if isinstance(value, tuple) else value)
@@ -22,4 +22,127 @@ def get_local_placement(plc):
         parent = np.eye(4)
     else:
         parent = get_local_placement(plc.PlacementRelTo)
-    return np.dot(get_axis2placement(plc.RelativePlacement), parent)
+    return np.dot(parent, get_axis2placement(plc.RelativePlacement))
+
+
+def a2p_batch(o, z, x):
+    """Vectorised a2p, taking (N,3) arrays and returning an (N,4,4) array"""
+    r = np.zeros((len(o), 4, 4))
+    r[:, :3, 0] = x
+    r[:, :3, 1] = np.cross(z, x)
+    r[:, :3, 2] = z
+    r[:, :3, 3] = o
+    r[:, 3, 3] = 1
+    return r
+
+
+class PlacementResolver:
+    """Resolves the absolute matrices of all local placements of a file at once
+
+    Placements are sorted topologically by their depth in the PlacementRelTo
+    hierarchy, and the matrices of each depth are computed in one batched
+    matrix multiplication with the matrices of their parents. Shared parent
+    placements are therefore only resolved once.
+
+    The absolute matrices are stored in an (N,4,4) array, with an index from
+    placement ids to rows. After placements are edited, call update with the
+    edited placements to recompute them and the placements relative to them.
+
+    Example::
+
+        resolver = ifcopenshell.util.placement.PlacementResolver(ifc_file)
+        matrix = resolver.get_matrix(wall.ObjectPlacement)
+        matrices = resolver.get_matrices([w.ObjectPlacement for w in walls])
+    """
+
+    def __init__(self, ifc_file):
+        self.file = ifc_file
+        self.resolve()
+
+    def resolve(self):
+        placements = self.file.by_type("IfcLocalPlacement")
+        self.placements = placements
+        self.index = {p.id(): i for i, p in enumerate(placements)}
+        self.parents = np.array([self.get_parent_index(p) for p in placements], dtype=int).reshape(-1)
+        self.children = {}
+        for i, parent in enumerate(self.parents):
+            if parent != -1:
+                self.children.setdefault(parent, []).append(i)
+        self.relative_matrices = self.get_relative_matrices(placements)
+        self.matrices = np.tile(np.eye(4), (len(placements), 1, 1))
+        self.resolve_rows(np.flatnonzero(self.parents == -1))
+
+    def update(self, placements):
+        """Recomputes placements which were edited, and all placements relative to them
+
+        If a placement is new or its PlacementRelTo changed, everything is
+        resolved again.
+        """
+        rows = []
+        for placement in placements:
+            row = self.index.get(placement.id())
+            if row is None or self.parents[row] != self.get_parent_index(placement):
+                return self.resolve()
+            rows.append(row)
+        if not rows:
+            return
+        rows = np.array(rows, dtype=int)
+        self.relative_matrices[rows] = self.get_relative_matrices([self.placements[r] for r in rows])
+        # Placements relative to another updated placement are resolved as its descendants
+        updated = set(rows.tolist())
+        roots = [r for r in rows.tolist() if not self.has_ancestor(r, updated)]
+        self.resolve_rows(np.array(roots, dtype=int))
+
+    def get_matrix(self, placement):
+        if placement is None:
+            return np.eye(4)
+        return self.matrices[self.index[placement.id()]]
+
+    def get_matrices(self, placements):
+        """Returns an (N,4,4) array of the absolute matrices of the placements"""
+        rows = np.array([self.index.get(p.id(), -1) if p is not None else -1 for p in placements], dtype=int)
+        matrices = np.tile(np.eye(4), (len(rows), 1, 1))
+        matrices[rows != -1] = self.matrices[rows[rows != -1]]
+        return matrices
+
+    def resolve_rows(self, rows):
+        # Resolves the rows and their descendants, one depth at a time
+        while len(rows):
+            parents = self.parents[rows]
+            is_root = parents == -1
+            self.matrices[rows[is_root]] = self.relative_matrices[rows[is_root]]
+            self.matrices[rows[~is_root]] = np.matmul(
+                self.matrices[parents[~is_root]], self.relative_matrices[rows[~is_root]]
+            )
+            rows = np.array([c for r in rows.tolist() for c in self.children.get(r, ())], dtype=int)
+
+    def has_ancestor(self, row, rows):
+        parent = self.parents[row]
+        while parent != -1:
+            if parent in rows:
+                return True
+            parent = self.parents[parent]
+        return False
+
+    def get_parent_index(self, placement):
+        # Placements relative to unsupported placements, like grid placements, are treated as absolute
+        parent = placement.PlacementRelTo
+        if parent is None:
+            return -1
+        return self.index.get(parent.id(), -1)
+
+    def get_relative_matrices(self, placements):
+        o = np.zeros((len(placements), 3))
+        z = np.tile((0.0, 0.0, 1.0), (len(placements), 1))
+        x = np.tile((1.0, 0.0, 0.0), (len(placements), 1))
+        for i, placement in enumerate(placements):
+            relative_placement = placement.RelativePlacement
+            coordinates = relative_placement.Location.Coordinates
+            o[i, : len(coordinates)] = coordinates
+            if getattr(relative_placement, "Axis", None):
+                z[i] = relative_placement.Axis.DirectionRatios
+            if relative_placement.RefDirection:
+                ref_direction = relative_placement.RefDirection.DirectionRatios
+                x[i] = 0
+                x[i, : len(ref_direction)] = ref_direction
+        return a2p_batch(o, z, x)
@@ -1,5 +1,6 @@
 import os
 import json
+import collections
 import time
 import ifcopenshell
 
@@ -40,10 +41,17 @@ def reassign_class(ifc_file, element, new_class):
 class Migrator:
     def __init__(self):
         self.migrated_ids = {}
+        self.plans = {}
+        self.unmapped_classes = collections.Counter()
+        self.unmapped_attributes = collections.Counter()
         self.class_4_to_2x3 = json.load(open(os.path.join(cwd, "class_4_to_2x3.json"), "r"))
 
         # IFC4 classes, and their IFC4 attribute : IFC2X3 attributes
         self.attribute_4_to_2x3 = json.load(open(os.path.join(cwd, "attribute_4_to_2x3.json"), "r"))
+        self.attribute_2x3_to_4 = {
+            ifc_class: {v: k for k, v in attributes.items()}
+            for ifc_class, attributes in self.attribute_4_to_2x3.items()
+        }
 
         self.default_values = {
             "ChangeAction": "NOCHANGE",
@@ -95,102 +103,128 @@ class Migrator:
         }
 
     def migrate(self, element, new_file):
-        try:
-            return new_file.by_id(self.migrated_ids[element.id()])
-        except:
-            pass
-        # print("Migrating", element)
+        """Migrates an element and everything it references to the schema of new_file
+
+        Instances are migrated after the instances they reference, using an
+        explicit stack rather than recursion. Each class is planned once, by
+        mapping the attributes of its equivalent class in the new schema to
+        its own attributes. Classes and attributes which could not be migrated
+        are counted in unmapped_classes and unmapped_attributes.
+        """
+        if element.id() in self.migrated_ids:
+            return self.get_migrated_element(element, new_file)
+        stack = [(element, None)]
+        visiting = set()
+        while stack:
+            inst, values = stack.pop()
+            if inst.id() in self.migrated_ids:
+                continue
+            plan = self.get_plan(inst, new_file)
+            if plan is None:
+                self.unmapped_classes[inst.is_a()] += 1
+                self.migrated_ids[inst.id()] = None
+                continue
+            if values is not None:
+                self.migrated_ids[inst.id()] = self.migrate_attributes(inst, new_file, plan, values).id()
+                continue
+            if inst.id() in visiting:
+                continue  # A cyclic reference, which is left unset
+            visiting.add(inst.id())
+            values = [getattr(inst, source) if source else None for index, attribute, source in plan[1]]
+            stack.append((inst, values))
+            for value in values:
+                for reference in self.get_references(value):
+                    if reference.id() not in self.migrated_ids:
+                        stack.append((reference, None))
+        return self.get_migrated_element(element, new_file)
+
+    def get_migrated_element(self, element, new_file):
+        migrated_id = self.migrated_ids.get(element.id())
+        return None if migrated_id is None else new_file.by_id(migrated_id)
+
+    def get_references(self, value):
+        if isinstance(value, ifcopenshell.entity_instance):
+            if value.id():
+                yield value
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                yield from self.get_references(item)
+
+    def get_plan(self, element, new_file):
+        """Returns the new class of an element and its (index, attribute, source attribute name) list"""
+        key = (element.is_a(), new_file.schema)
+        if key in self.plans:
+            return self.plans[key]
         schema = ifcopenshell.ifcopenshell_wrapper.schema_by_name(new_file.schema)
-        new_element = self.migrate_class(element, new_file)
-        # print("Migrated class from {} to {}".format(element, new_element))
-        new_element_schema = schema.declaration_by_name(new_element.is_a())
-        if not hasattr(new_element_schema, "all_attributes"):
-            return element  # The element has no attributes, so migration is done
-        new_element = self.migrate_attributes(element, new_file, new_element, new_element_schema)
-        self.migrated_ids[element.id()] = new_element.id()
-        return new_element
+        new_class = self.migrate_class(element, new_file, schema)
+        if not new_class:
+            self.plans[key] = None
+            return None
+        declaration = schema.declaration_by_name(new_class)
+        attributes = []
+        for i, attribute in enumerate(declaration.all_attributes()):
+            if declaration.derived()[i]:
+                continue
+            source = self.get_source_attribute(element, new_file, new_class, attribute.name())
+            attributes.append((i, attribute, source))
+        self.plans[key] = (new_class, attributes)
+        return self.plans[key]
 
-    def migrate_class(self, element, new_file):
+    def migrate_class(self, element, new_file, schema):
         try:
-            new_element = new_file.create_entity(element.is_a())
+            return schema.declaration_by_name(element.is_a()).name()
         except:
             # The element does not exist in this schema
             # Complex migration is not yet supported (e.g. polygonal face set to faceted brep)
             if new_file.schema == "IFC2X3":
-                new_element = new_file.create_entity(self.class_4_to_2x3[element.is_a()])
-            elif new_file.schema == "IFC4":
-                print("Class migration to IFC4 not yet supported for", element)
-                pass
-        return new_element
-
-    def migrate_attributes(self, element, new_file, new_element, new_element_schema):
-        for i, attribute in enumerate(new_element_schema.all_attributes()):
-            if new_element_schema.derived()[i]:
-                continue
-            self.migrate_attribute(attribute, element, new_file, new_element, new_element_schema)
-        return new_element
+                return self.class_4_to_2x3.get(element.is_a())
 
-    def migrate_attribute(self, attribute, element, new_file, new_element, new_element_schema):
-        # print("Migrating attribute", element, new_element, attribute.name())
-        if hasattr(element, attribute.name()):
-            value = getattr(element, attribute.name())
-            # print("Attribute names matched", value)
+    def get_source_attribute(self, element, new_file, new_class, name):
+        if hasattr(element, name):
+            return name
         elif new_file.schema == "IFC2X3":
             # IFC4 to IFC2X3: We know the IFC2X3 attribute name, but not its IFC4 equivalent
-            # print("Searching for an equivalent", new_element, attribute.name())
-            try:
-                equivalent_map = self.attribute_4_to_2x3[new_element.is_a()]
-                equivalent = list(equivalent_map.keys())[list(equivalent_map.values()).index(attribute.name())]
-                if hasattr(element, equivalent):
-                    # print("Equivalent found", equivalent)
-                    value = getattr(element, equivalent)
-                else:
-                    return
-            except:
-                print(
-                    "Unable to find equivalent attribute of {} to migrate from {} to {}".format(
-                        attribute.name(), element, new_element
-                    )
-                )
-                return  # We tried our best
+            equivalent = self.attribute_2x3_to_4.get(element.is_a(), {}).get(name)
         elif new_file.schema == "IFC4":
             # IFC2X3 to IFC4: We know the IFC4 attribute name, but not its IFC2X3 equivalent
-            # print("Searching for an equivalent", element, new_element, attribute.name())
-            try:
-                equivalent = self.attribute_4_to_2x3[new_element.is_a()][attribute.name()]
-                # print("Searching for equivalent", equivalent)
-                if hasattr(element, equivalent):
-                    value = getattr(element, equivalent)
-                else:
-                    return
-            except:
-                print(
-                    "Unable to find equivalent attribute of {} to migrate from {} to {}".format(
-                        attribute.name(), element, new_element
-                    )
-                )
-                return  # We tried our best
-
-        # print("Continuing migration of {} to migrate from {} to {}".format(attribute.name(), element, new_element))
-        if value is None and not attribute.optional():
-            value = self.generate_default_value(attribute, new_file)
-            if value is None:
-                print("Failed to generate default value for {} on {}".format(attribute.name(), element))
-        elif isinstance(value, ifcopenshell.entity_instance):
-            value = self.migrate(value, new_file)
+            equivalent = self.attribute_4_to_2x3.get(new_class, {}).get(name)
+        else:
+            equivalent = None
+        if equivalent and hasattr(element, equivalent):
+            return equivalent
+
+    def migrate_attributes(self, element, new_file, plan, values):
+        new_class, attributes = plan
+        new_element = new_file.create_entity(new_class)
+        for (index, attribute, source), value in zip(attributes, values):
+            if value is not None:
+                value = self.migrate_value(value, new_file)
+            # Values of unmapped classes are left unset, so aggregates of only those are too
+            if value is None or (isinstance(value, list) and not value):
+                if attribute.optional():
+                    continue
+                value = self.generate_default_value(attribute, new_file)
+                if value is None:
+                    self.unmapped_attributes[(new_class, attribute.name())] += 1
+                    continue
+            new_element[index] = value
+        return new_element
+
+    def migrate_value(self, value, new_file):
+        if isinstance(value, ifcopenshell.entity_instance):
+            if value.id():
+                return self.get_migrated_element(value, new_file)
         elif isinstance(value, (list, tuple)):
-            if value and isinstance(value[0], ifcopenshell.entity_instance):
-                new_value = []
-                for item in value:
-                    new_value.append(self.migrate(item, new_file))
-                value = new_value
-        setattr(new_element, attribute.name(), value)
+            if value and isinstance(value[0], (ifcopenshell.entity_instance, list, tuple)):
+                values = [self.migrate_value(v, new_file) for v in value]
+                return [v for v in values if v is not None]
+        return value
 
     def generate_default_value(self, attribute, new_file):
         if attribute.name() in self.default_values:
             return self.default_values[attribute.name()]
-        elif self.default_entities[attribute.name()]:
-            return self.default_entities[attribute.name()]
+        elif self.default_entities.get(attribute.name()):
+            return self.default_entities.get(attribute.name())
         elif attribute.name() == "OwnerHistory":
             self.default_entities[attribute.name()] = new_file.create_entity(
                 "IfcOwnerHistory",
@@ -219,4 +253,4 @@ class Migrator:
                     "CreationDate": int(time.time()),
                 }
             )
-        return self.default_entities[attribute.name()]
+        return self.default_entities.get(attribute.name())
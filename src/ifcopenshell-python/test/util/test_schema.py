@@ -0,0 +1,35 @@
+import ifcopenshell
+import ifcopenshell.util.schema
+
+
+def create_representation(ifc_file, items):
+    placement = ifc_file.createIfcAxis2Placement3D(ifc_file.createIfcCartesianPoint((0.0, 0.0, 0.0)))
+    context = ifc_file.createIfcGeometricRepresentationContext(None, "Model", 3, 1.0e-05, placement)
+    return ifc_file.createIfcShapeRepresentation(context, "Body", "Tessellation", items)
+
+
+def create_face_set(ifc_file):
+    points = ifc_file.createIfcCartesianPointList3D([(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0)])
+    return ifc_file.createIfcTriangulatedFaceSet(points, None, None, [(1, 2, 3)], None)
+
+
+def test_migrating_an_aggregate_which_references_an_unmapped_class():
+    ifc_file = ifcopenshell.file(schema="IFC4")
+    point = ifc_file.createIfcCartesianPoint((0.0, 0.0, 0.0))
+    representation = create_representation(ifc_file, [point, create_face_set(ifc_file)])
+    new_file = ifcopenshell.file(schema="IFC2X3")
+    migrator = ifcopenshell.util.schema.Migrator()
+    new_representation = migrator.migrate(representation, new_file)
+    assert [i.is_a() for i in new_representation.Items] == ["IfcCartesianPoint"]
+    assert migrator.unmapped_classes == {"IfcTriangulatedFaceSet": 1}
+    assert not migrator.unmapped_attributes
+
+
+def test_counting_a_required_attribute_left_empty_by_an_unmapped_class():
+    ifc_file = ifcopenshell.file(schema="IFC4")
+    representation = create_representation(ifc_file, [create_face_set(ifc_file)])
+    new_file = ifcopenshell.file(schema="IFC2X3")
+    migrator = ifcopenshell.util.schema.Migrator()
+    new_representation = migrator.migrate(representation, new_file)
+    assert new_representation.Items is None
+    assert migrator.unmapped_attributes == {("IfcShapeRepresentation", "Items"): 1}
@@ -1,52 +1,203 @@
 #!/usr/bin/env python3
 # This can be packaged with `pyinstaller --onefile --clean --icon=icon.ico ifcpatch.py`
 
-import ifcopenshell
+import os
+import glob
+import json
+import time
 import logging
 import argparse
+import importlib
+import traceback
+import multiprocessing
+import ifcopenshell
 
 def execute(args, is_library=None):
+    """Patches a file with a recipe, or a pipeline of recipes
+
+    A pipeline is given as args['recipes'], an ordered list of (recipe,
+    arguments) pairs. The file is loaded and written once, and passed in
+    memory from one recipe to the next. It is only parsed again when a recipe
+    returns text and more recipes follow.
+    """
     logging.basicConfig(filename=args['log'], filemode='a', level=logging.DEBUG)
     logger = logging.getLogger('IFCPatch')
+    return patch_file(args, logger, is_library=is_library)
+
+def patch_file(args, logger, is_library=None, timings=None):
     print('# Loading IFC file ...')
+    start = time.perf_counter()
     ifc_file = ifcopenshell.open(args['input'])
-    print('# Loading patch recipe ...')
-    patcher = getattr(__import__('recipes.{}'.format(args['recipe'])), args['recipe']).Patcher(
-            args['input'], ifc_file, logger, args['arguments'])
-    print('# Patching ...')
-    patcher.patch()
-    ifc_file = patcher.file
+    logger.info('Loaded {} in {:.3f}s'.format(args['input'], time.perf_counter() - start))
+    if timings is not None:
+        timings.append(('load', time.perf_counter() - start))
+    steps = args.get('recipes') or [(args['recipe'], args.get('arguments'))]
+    ifc_file = run_pipeline(args['input'], ifc_file, steps, logger, timings=timings)
     if is_library is True:
         return ifc_file
     print('# Writing patched file ...')
     if not args['output']:
         args['output'] = args['input']
+    start = time.perf_counter()
     if isinstance(ifc_file, str):
         with open(args['output'], 'w') as text_file:
             text_file.write(ifc_file)
     else:
         ifc_file.write(args['output'])
+    logger.info('Wrote {} in {:.3f}s'.format(args['output'], time.perf_counter() - start))
+    if timings is not None:
+        timings.append(('write', time.perf_counter() - start))
+
+def run_pipeline(src, ifc_file, steps, logger, timings=None):
+    """Runs recipes in order, passing the patched file of each to the next
+
+    The duration of each step in seconds is logged, and appended to timings
+    as a (recipe, seconds) pair if a list is given.
+    """
+    for recipe, arguments in steps:
+        print('# Patching with {} ...'.format(recipe))
+        start = time.perf_counter()
+        if isinstance(ifc_file, str):
+            ifc_file = ifcopenshell.file.from_string(ifc_file)
+        patcher = get_recipe(recipe).Patcher(src, ifc_file, logger, arguments)
+        patcher.patch()
+        ifc_file = patcher.file
+        duration = time.perf_counter() - start
+        logger.info('Patched with {} in {:.3f}s'.format(recipe, duration))
+        print('# Patched with {} in {:.3f}s'.format(recipe, duration))
+        if timings is not None:
+            timings.append((recipe, duration))
+    return ifc_file
+
+def get_recipe(recipe):
+    # Recipes are found next to this module, rather than relative to the working directory
+    if __package__:
+        return importlib.import_module('{}.recipes.{}'.format(__package__, recipe))
+    return importlib.import_module('recipes.{}'.format(recipe))
+
+def execute_batch(args):
+    """Patches many files with the same pipeline in a pool of processes
+
+    args['inputs'] is a list of files or glob patterns. Patched files are
+    written to the args['output'] directory if given, otherwise they replace
+    their inputs. Each file has its own log in args['log_dir'], named after
+    the file. A file which fails is reported, and does not stop the others.
+
+    Returns a summary of the results, which is also written as JSON to
+    args['report'] if given.
+    """
+    inputs = get_inputs(args['inputs'])
+    output_dir = args.get('output')
+    log_dir = args.get('log_dir') or output_dir or '.'
+    os.makedirs(log_dir, exist_ok=True)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    steps = args.get('recipes') or [(args['recipe'], args.get('arguments'))]
+    tasks = []
+    for path in inputs:
+        name = os.path.basename(path)
+        tasks.append({
+            'input': path,
+            'output': os.path.join(output_dir, name) if output_dir else path,
+            'log': os.path.join(log_dir, '{}.log'.format(name)),
+            'recipes': steps,
+        })
+    start = time.perf_counter()
+    # Each process patches one file at a time, and is replaced afterwards to free its memory
+    with multiprocessing.Pool(args.get('processes') or None, maxtasksperchild=1) as pool:
+        results = []
+        for result in pool.imap_unordered(execute_batch_file, tasks):
+            print('# {} {} in {:.3f}s'.format(
+                'Patched' if result['is_success'] else 'Failed', result['input'], result['duration']))
+            results.append(result)
+    results.sort(key=lambda r: inputs.index(r['input']))
+    summary = {
+        'total_files': len(results),
+        'failed_files': len([r for r in results if not r['is_success']]),
+        'duration': time.perf_counter() - start,
+        'results': results,
+    }
+    if args.get('report'):
+        with open(args['report'], 'w') as report:
+            json.dump(summary, report, indent=4)
+    return summary
+
+def execute_batch_file(args):
+    logger = logging.getLogger('IFCPatch.{}'.format(args['input']))
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = logging.FileHandler(args['log'], mode='a')
+    logger.addHandler(handler)
+    result = {'input': args['input'], 'output': args['output'], 'log': args['log'], 'is_success': True}
+    timings = []
+    start = time.perf_counter()
+    try:
+        patch_file(args, logger, timings=timings)
+    except Exception as e:
+        logger.error(traceback.format_exc())
+        result['is_success'] = False
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    result['duration'] = time.perf_counter() - start
+    result['timings'] = timings
+    return result
+
+def get_inputs(inputs):
+    paths = []
+    for pattern in inputs:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(p for p in matches if p not in paths)
+    if len(set(os.path.basename(p) for p in paths)) != len(paths):
+        raise ValueError('Input files must have unique names, as outputs and logs are named after them')
+    return paths
+
+def print_summary(summary):
+    print('# Patched {} of {} files in {:.3f}s'.format(
+        summary['total_files'] - summary['failed_files'], summary['total_files'], summary['duration']))
+    for result in summary['results']:
+        steps = ', '.join('{} {:.3f}s'.format(name, duration) for name, duration in result['timings'])
+        print('{} {} ({})'.format('OK' if result['is_success'] else 'FAILED', result['input'], steps))
+        if not result['is_success']:
+            print('    {} (see {})'.format(result['error'], result['log']))
+
+def get_steps(recipes, arguments=None):
+    """Converts the recipes of the command line into pipeline steps
+
+    Each recipe is a list of its name followed by its arguments. For
+    compatibility, the arguments of a single recipe may also be given
+    separately.
+    """
+    if len(recipes) == 1 and arguments:
+        return [(recipes[0][0], arguments)]
+    return [(recipe[0], recipe[1:] or None) for recipe in recipes]
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     parser = argparse.ArgumentParser(
         description='Patches IFC files to fix badly formatted data')
     parser.add_argument(
         '-i',
         '--input',
         type=str,
+        nargs='+',
         required=True,
-        help='The IFC file to patch')
+        help='The IFC file to patch. Several files or glob patterns may be given to patch them in a batch')
     parser.add_argument(
         '-o',
         '--output',
         type=str,
-        help='The output file to save the patched IFC')
+        help='The output file to save the patched IFC, or the output directory of a batch')
     parser.add_argument(
         '-r',
         '--recipe',
         type=str,
+        nargs='+',
+        action='append',
         required=True,
-        help='Name of the recipe to use when patching')
+        help='Name of the recipe to use when patching, optionally followed by its arguments. '
+        'Repeat to run a pipeline of recipes in order')
     parser.add_argument(
         '-l',
         '--log',
@@ -58,8 +209,33 @@ if __name__ == '__main__':
         '--arguments',
         nargs='+',
         help='Specify custom arguments to the patch recipe')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        help='Number of processes of a batch, defaulting to the number of CPUs')
+    parser.add_argument(
+        '--log-dir',
+        type=str,
+        help='Directory of the log of each file of a batch, defaulting to the output directory')
+    parser.add_argument(
+        '--report',
+        type=str,
+        help='A JSON file to save the summary of a batch')
     args = vars(parser.parse_args())
+    if len(args['recipe']) > 1 and args['arguments']:
+        parser.error('-a/--arguments only applies to a single recipe, give the arguments of each -r after its name')
+    args['recipes'] = get_steps(args['recipe'], args['arguments'])
 
-    execute(args)
+    if len(args['input']) == 1 and not glob.has_magic(args['input'][0]):
+        args['input'] = args['input'][0]
+        execute(args)
+    else:
+        args['inputs'] = args['input']
+        args['processes'] = args['jobs']
+        summary = execute_batch(args)
+        print_summary(summary)
+        if summary['failed_files']:
+            raise SystemExit(1)
 
     print('# All tasks are complete :-)')
@@ -1,5 +1,6 @@
 import ifcopenshell
-import ifcopenshell.util.element
+import ifcopenshell.util.graph
+
 
 class Patcher:
     def __init__(self, src, file, logger, args=None):
@@ -7,13 +8,125 @@ class Patcher:
         self.file = file
         self.logger = logger
         self.args = args
+        self.shared_classes = (
+            'IfcNamedUnit', 'IfcDerivedUnit', 'IfcDerivedUnitElement', 'IfcMonetaryUnit', 'IfcDimensionalExponents',
+            'IfcPerson', 'IfcOrganization', 'IfcPersonAndOrganization', 'IfcApplication')
 
     def patch(self):
-        source = ifcopenshell.open(self.args[0])
-        original_project = self.file.by_type('IfcProject')[0]
-        merged_project = self.file.add(source.by_type('IfcProject')[0])
-        for element in source.by_type('IfcRoot'):
-            self.file.add(element)
-        for inverse in self.file.get_inverse(merged_project):
-            ifcopenshell.util.element.replace_attribute(inverse, merged_project, original_project)
-        self.file.remove(merged_project)
+        """
+        Merges one or more source files into the file.
+
+        Each source is copied in a single pass, where every instance is
+        created after the instances it references, and an id map from the
+        source to the merged instances resolves its references. The project,
+        unit assignment and representation contexts of sources are merged into
+        those of the file, and identical units, actors, applications and owner
+        histories are only kept once. Contexts are only merged if their
+        placement, true north and precision are the same, and instances only
+        referenced by merged instances are not copied.
+        """
+        self.project = self.file.by_type('IfcProject')[0]
+        self.shared = {}
+        self.owner_histories = {}
+        self.contexts = {}
+        for element in self.file:
+            self.index_shared_instance(element)
+        for path in self.args:
+            self.logger.info('Merging {}'.format(path))
+            source = ifcopenshell.open(path)
+            self.merge(source)
+
+    def merge(self, source):
+        self.instance_mapping = {}
+        # Only the unit assignments of source projects are merged with the unit assignment of the project
+        self.unit_assignments = {p.UnitsInContext.id() for p in source.by_type('IfcProject') if p.UnitsInContext}
+        skipped_instances = self.get_skipped_instances(source)
+        total_instances = 0
+        merged_instances = 0
+        for element in ifcopenshell.util.graph.get_sorted_instances(source):
+            total_instances += 1
+            if element.id() in skipped_instances:
+                continue
+            merged_element = self.get_merged_instance(element)
+            if merged_element:
+                self.instance_mapping[element.id()] = merged_element
+                merged_instances += 1
+                continue
+            new = self.file.create_entity(
+                element.is_a(),
+                *[ifcopenshell.util.graph.map_value(v, self.file, self.get_mapped_instance) for v in element])
+            self.instance_mapping[element.id()] = new
+            self.index_shared_instance(new)
+            if new.is_a() == 'IfcGeometricRepresentationContext':
+                # The source project is merged, so its other contexts are added to the project
+                self.project.RepresentationContexts = list(self.project.RepresentationContexts or []) + [new]
+        self.logger.info(
+            'Copied {} instances, merged {} with existing instances, and skipped {} only used by them'.format(
+                total_instances - merged_instances - len(skipped_instances), merged_instances,
+                len(skipped_instances)))
+
+    def get_skipped_instances(self, source):
+        """Returns the ids of instances which are only referenced by merged projects, units and contexts"""
+        merged = list(source.by_type('IfcProject'))
+        if self.project.UnitsInContext:
+            merged.extend(source.by_id(i) for i in self.unit_assignments)
+        merged.extend(c for c in source.by_type('IfcGeometricRepresentationContext', include_subtypes=False)
+            if self.get_context_key(c, None) in self.contexts)
+        removed = {e.id() for e in merged}
+        skipped = set()
+        while merged:
+            element = merged.pop()
+            for reference in source.traverse(element, max_levels=1)[1:]:
+                # Contexts are merged or added to the project on their own
+                if not reference.id() or reference.id() in removed or reference.is_a('IfcRepresentationContext'):
+                    continue
+                if all(e.id() in removed for e in source.get_inverse(reference)):
+                    removed.add(reference.id())
+                    skipped.add(reference.id())
+                    merged.append(reference)
+        return skipped
+
+    def get_merged_instance(self, element):
+        if element.is_a('IfcProject'):
+            return self.project
+        elif element.id() in self.unit_assignments and self.project.UnitsInContext:
+            return self.project.UnitsInContext
+        elif element.is_a('IfcOwnerHistory'):
+            return self.owner_histories.get(self.get_owner_history_key(element, self.get_mapped_id))
+        elif element.is_a('IfcGeometricRepresentationContext'):
+            return self.contexts.get(self.get_context_key(element, self.get_mapped_id))
+        elif any(element.is_a(c) for c in self.shared_classes):
+            return self.shared.get(ifcopenshell.util.graph.get_key(element, self.get_mapped_id))
+
+    def index_shared_instance(self, element):
+        if element.is_a('IfcOwnerHistory'):
+            self.owner_histories.setdefault(self.get_owner_history_key(element, self.get_own_id), element)
+        elif element.is_a('IfcGeometricRepresentationContext'):
+            self.contexts.setdefault(self.get_context_key(element, self.get_own_id), element)
+        elif any(element.is_a(c) for c in self.shared_classes):
+            self.shared.setdefault(ifcopenshell.util.graph.get_key(element, self.get_own_id), element)
+
+    def get_own_id(self, element):
+        return element.id()
+
+    def get_mapped_id(self, element):
+        return self.instance_mapping[element.id()].id()
+
+    def get_mapped_instance(self, element):
+        return self.instance_mapping[element.id()]
+
+    def get_owner_history_key(self, owner_history, get_id):
+        # Dates differ between files, so histories of the same user and application are merged
+        return tuple(get_id(e) if e else None for e in (owner_history.OwningUser, owner_history.OwningApplication))
+
+    def get_context_key(self, context, get_id):
+        if context.is_a('IfcGeometricRepresentationSubContext'):
+            return (context.ContextIdentifier, context.ContextType, context.TargetView,
+                get_id(context.ParentContext))
+        # Placements are compared by value, as those of sources are never merged themselves
+        return (context.ContextIdentifier, context.ContextType, context.CoordinateSpaceDimension, context.Precision,
+            self.get_value_key(context.WorldCoordinateSystem),
+            self.get_value_key(context.TrueNorth) if context.TrueNorth else None)
+
+    def get_value_key(self, element):
+        return ifcopenshell.util.graph.get_key(element, self.get_value_key)
@@ -13,6 +13,9 @@ class Patcher:
         self.new = ifcopenshell.file(schema=self.args[0])
         migrator = ifcopenshell.util.schema.Migrator()
         for element in self.file:
-            print("Migrating", element)
-            print("Successfully converted to", migrator.migrate(element, self.new))
+            migrator.migrate(element, self.new)
+        for ifc_class, total in migrator.unmapped_classes.items():
+            self.logger.warning("Unable to migrate {} {} to {}".format(total, ifc_class, self.args[0]))
+        for (ifc_class, attribute), total in migrator.unmapped_attributes.items():
+            self.logger.warning("Unable to migrate the {} attribute of {} {}".format(attribute, total, ifc_class))
         self.file = self.new
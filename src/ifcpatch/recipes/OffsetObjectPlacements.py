@@ -1,4 +1,7 @@
 import math
+import numpy as np
+import ifcopenshell.util.coordinate
+
 
 class Patcher:
     def __init__(self, src, file, logger, args=None):
@@ -8,50 +11,47 @@ class Patcher:
         self.args = args
 
     def patch(self):
-        absolute_placements = []
+        absolute_placements = {}
 
         for product in self.file.by_type('IfcProduct'):
             if not product.ObjectPlacement:
                 continue
             absolute_placement = self.get_absolute_placement(product.ObjectPlacement)
             if absolute_placement.is_a('IfcLocalPlacement'):
-                absolute_placements.append(absolute_placement)
-        absolute_placements = set(absolute_placements)
-
-        for placement in absolute_placements:
-            offset_location = (
-                placement.RelativePlacement.Location.Coordinates[0] + float(self.args[0]),
-                placement.RelativePlacement.Location.Coordinates[1] + float(self.args[1]),
-                placement.RelativePlacement.Location.Coordinates[2] + float(self.args[2])
-            )
-
+                absolute_placements[absolute_placement.id()] = absolute_placement
+        absolute_placements = list(absolute_placements.values())
+        if not absolute_placements:
+            return
+
+        relative_placements = [p.RelativePlacement for p in absolute_placements]
+        offset = (float(self.args[0]), float(self.args[1]), float(self.args[2]))
+        angle = float(self.args[3])
+        rotation_matrix = ifcopenshell.util.coordinate.z_rotation_matrix(math.radians(angle))
+        matrix = rotation_matrix @ ifcopenshell.util.coordinate.translation_matrix(offset)
+
+        locations = ifcopenshell.util.coordinate.get_coordinates([p.Location for p in relative_placements])
+        locations = ifcopenshell.util.coordinate.transform(locations, matrix).tolist()
+        if angle:
+            z_axes = ifcopenshell.util.coordinate.get_coordinates(
+                [p.Axis for p in relative_placements if p.Axis])
+            z_axes = iter(ifcopenshell.util.coordinate.transform(z_axes, rotation_matrix).tolist())
+            x_axes = np.tile((1., 0., 0.), (len(relative_placements), 1))
+            has_x_axis = np.array([bool(p.RefDirection) for p in relative_placements])
+            x_axes[has_x_axis] = ifcopenshell.util.coordinate.get_coordinates(
+                [p.RefDirection for p in relative_placements if p.RefDirection])
+            x_axes = ifcopenshell.util.coordinate.transform(x_axes, rotation_matrix).tolist()
+
+        for i, placement in enumerate(absolute_placements):
             relative_placement = self.file.createIfcAxis2Placement3D(
-                self.file.createIfcCartesianPoint(offset_location))
+                self.file.createIfcCartesianPoint(locations[i]))
 
-            if placement.RelativePlacement.Axis:
-                relative_placement.Axis = placement.RelativePlacement.Axis
-            if placement.RelativePlacement.RefDirection:
-                relative_placement.RefDirection = placement.RelativePlacement.RefDirection
-
-            angle = float(self.args[3])
             if not angle:
-                placement.RelativePlacement = relative_placement
-                continue
-
-            rotation_matrix = self.z_rotation_matrix(math.radians(angle))
-            relative_placement.Location.Coordinates = self.multiply_by_matrix(offset_location, rotation_matrix)
-
-            if placement.RelativePlacement.Axis:
-                z_axis = placement.RelativePlacement.Axis.DirectionRatios
-                relative_placement.Axis = self.file.createIfcDirection(
-                    self.multiply_by_matrix(z_axis, rotation_matrix))
-
-            if placement.RelativePlacement.RefDirection:
-                x_axis = placement.RelativePlacement.RefDirection.DirectionRatios
+                relative_placement.Axis = relative_placements[i].Axis
+                relative_placement.RefDirection = relative_placements[i].RefDirection
             else:
-                x_axis = (1., 0., 0.)
-            relative_placement.RefDirection = self.file.createIfcDirection(
-                self.multiply_by_matrix(x_axis, rotation_matrix))
+                if relative_placements[i].Axis:
+                    relative_placement.Axis = self.file.createIfcDirection(next(z_axes))
+                relative_placement.RefDirection = self.file.createIfcDirection(x_axes[i])
 
             placement.RelativePlacement = relative_placement
 
@@ -59,17 +59,3 @@ class Patcher:
         if object_placement.PlacementRelTo:
             return self.get_absolute_placement(object_placement.PlacementRelTo)
         return object_placement
-
-    def z_rotation_matrix(self, angle):
-        return [
-            [math.cos(angle), -math.sin(angle), 0.],
-            [math.sin(angle), math.cos(angle), 0.],
-            [0., 0., 1.]
-        ]
-
-    def multiply_by_matrix(self, v, m):
-        return [
-            v[0]*m[0][0] + v[1]*m[0][1] + v[2]*m[0][2],
-            v[0]*m[1][0] + v[1]*m[1][1] + v[2]*m[1][2],
-            v[0]*m[2][0] + v[1]*m[2][1] + v[2]*m[2][2]
-        ]
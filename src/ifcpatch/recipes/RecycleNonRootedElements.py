@@ -1,5 +1,6 @@
-from collections import deque
-import ifcopenshell.util.element
+import ifcopenshell
+import ifcopenshell.util.graph
+
 
 class Patcher:
     def __init__(self, src, file, logger, args=None):
@@ -9,27 +10,18 @@ class Patcher:
         self.args = args
 
     def patch(self):
-        deleted = []
-        hashes = {}
-        for element in self.file:
-            if element.is_a('IfcRoot'):
-                continue
-            h = hash(tuple(element))
-            if h in hashes:
-                for inverse in self.file.get_inverse(element):
-                    ifcopenshell.util.element.replace_attribute(inverse, element, hashes[h])
-                deleted.append(element.id())
-            else:
-                hashes[h] = element
-        deleted.sort()
-        deleted_q = deque(deleted)
-        new = ''
-        for line in self.file.wrapped_data.to_string().split('\n'):
-            try:
-                if int(line.split('=')[0][1:]) != deleted_q[0]:
-                    new += (line + '\n')
-                else:
-                    deleted_q.popleft()
-            except:
-                new += (line + '\n')
-        self.file = new
+        """
+        Copies the file without duplicate non rooted instances.
+
+        Rooted instances are always copied. Removing duplicates one by one
+        from the file would be quadratic, so the kept instances are written
+        into a new file instead, with the header of the file.
+        """
+        new_file = ifcopenshell.file(schema=self.file.schema)
+        removed_instances = 0
+        for inst, is_duplicate in ifcopenshell.util.graph.copy_unique_instances(
+            self.file, new_file, is_unique=lambda inst: inst.is_a("IfcRoot")
+        ):
+            removed_instances += is_duplicate
+        self.logger.info("Removed {} duplicate non rooted instances".format(removed_instances))
+        self.file = new_file
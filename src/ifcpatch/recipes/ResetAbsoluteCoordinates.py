@@ -1,3 +1,7 @@
+import numpy as np
+import ifcopenshell.util.coordinate
+
+
 class Patcher:
     def __init__(self, src, file, logger, args=None):
         self.src = src
@@ -8,6 +12,10 @@ class Patcher:
     def patch(self):
         placement_coord_ids = set()
         for placement in self.file.by_type('IfcObjectPlacement'):
+            if placement.is_a('IfcLocalPlacement'):
+                # Parents are placements too, so only the location is needed
+                placement_coord_ids.add(placement.RelativePlacement.Location.id())
+                continue
             [placement_coord_ids.add(e.id()) for e in self.file.traverse(placement) if e.is_a('IfcCartesianPoint')]
 
         # Arbitrary threshold based on experience
@@ -29,41 +37,15 @@ class Patcher:
         except:
             # IFC2X3 does not have IfcCartesianPointList3D
             point_lists = []
-        for point_list in point_lists:
-            coord_list = [None] * len(point_list.CoordList)
-            for i, point in enumerate(point_list.CoordList):
-                if len(point) == 2 or not self.is_point_far_away(point):
-                    coord_list[i] = point
-                    continue
-                if not offset_point:
-                    offset_point = (-point[0], -point[1], -point[2])
-                    self.logger.info(f'Resetting absolute coordinates by {point}')
-                point = (
-                    point[0] + offset_point[0],
-                    point[1] + offset_point[1],
-                    point[2] + offset_point[2]
-                )
-                coord_list[i] = point
-            point_list.CoordList = coord_list
-        for point in self.file.by_type('IfcCartesianPoint'):
-            if len(point.Coordinates) == 2 or not self.is_point_far_away(point):
-                continue
-            if point.id() in placement_coord_ids:
-                continue
-            if not offset_point:
-                offset_point = (-point.Coordinates[0], -point.Coordinates[1], -point.Coordinates[2])
-                self.logger.info(f'Resetting absolute coordinates by {point}')
-            point.Coordinates = (
-                point.Coordinates[0] + offset_point[0],
-                point.Coordinates[1] + offset_point[1],
-                point.Coordinates[2] + offset_point[2]
-            )
+        points = [p for p in self.file.by_type('IfcCartesianPoint') if p.id() not in placement_coord_ids]
 
-    def is_point_far_away(self, point):
-        if hasattr(point, 'Coordinates'):
-            return abs(point.Coordinates[0]) > self.threshold \
-                or abs(point.Coordinates[1]) > self.threshold \
-                or abs(point.Coordinates[2]) > self.threshold
-        return abs(point[0]) > self.threshold \
-            or abs(point[1]) > self.threshold \
-            or abs(point[2]) > self.threshold
+        batch = ifcopenshell.util.coordinate.CoordinateBatch(points, point_lists)
+        is_far_away = np.any(np.abs(batch.coordinates) > self.threshold, axis=1)
+        if not is_far_away.any():
+            return
+        if not offset_point:
+            point = batch.coordinates[np.argmax(is_far_away)]
+            offset_point = tuple(-point)
+            self.logger.info(f'Resetting absolute coordinates by {tuple(point)}')
+        batch.coordinates[is_far_away] += offset_point
+        batch.write()
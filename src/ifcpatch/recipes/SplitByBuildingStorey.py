@@ -1,3 +1,10 @@
+import re
+import ifcopenshell
+import ifcopenshell.util.element
+import ifcopenshell.util.selector
+from concurrent.futures import ThreadPoolExecutor
+
+
 class Patcher:
     def __init__(self, src, file, logger, args=None):
         self.src = src
@@ -6,37 +13,172 @@ class Patcher:
         self.args = args
 
     def patch(self):
-        import ifcopenshell
-        from shutil import copyfile
-        storeys = self.file.by_type('IfcBuildingStorey')
-        for i, storey in enumerate(storeys):
-            dest = '{}-{}.ifc'.format(i, storey.Name)
-            copyfile(self.src, dest)
-            old_ifc = ifcopenshell.open(dest)
-            new_ifc = ifcopenshell.file(schema=self.file.schema)
-            if self.file.schema == 'IFC2X3':
-                elements = old_ifc.by_type('IfcProject') + old_ifc.by_type('IfcProduct')
-            else:
-                elements = old_ifc.by_type('IfcContext') + old_ifc.by_type('IfcProduct')
-            inverse_elements = []
-            for element in elements:
-                if element.is_a('IfcElement') \
-                        and not self.is_in_storey(element, storey):
-                    element.Representation = None
-                    continue
-                if element.is_a('IfcElement'):
-                    styled_rep_items = [i for i in old_ifc.traverse(element) if i.is_a('IfcRepresentationItem') and i.StyledByItem]
-                    [new_ifc.add(i.StyledByItem[0]) for i in styled_rep_items]
-                new_ifc.add(element)
-                inverse_elements.extend(old_ifc.get_inverse(element))
-            for inverse_element in inverse_elements:
-                new_ifc.add(inverse_element)
-            for element in new_ifc.by_type('IfcElement'):
-                if not self.is_in_storey(element, storey):
-                    new_ifc.remove(element)
-            new_ifc.write(dest)
-
-    def is_in_storey(self, element, storey):
-        return element.ContainedInStructure \
-            and element.ContainedInStructure[0].RelatingStructure.is_a('IfcBuildingStorey') \
-            and element.ContainedInStructure[0].RelatingStructure.GlobalId == storey.GlobalId
+        """
+        Splits the file into one file per partition, written as {i}-{Name}.ifc.
+
+        By default, partitions are building storeys. The first argument may
+        instead be "building", "zone" or "selector", followed in the latter
+        case by one selector query per partition.
+
+        Every partition has the project and spatial structure, its elements and
+        their openings and parts, and all that they reference, like types,
+        representations and styles. Relationships are copied with only the
+        objects which are in the partition. Inverses and styles are looked up
+        once and shared by all partitions.
+        """
+        mode = self.args[0] if self.args else "storey"
+        self.relationships = {}
+        self.styled_items = {}
+        partitions = self.get_partitions(mode)
+        skeleton = self.get_skeleton()
+        with ThreadPoolExecutor() as executor:
+            futures = []
+            for i, (name, elements) in enumerate(partitions):
+                dest = "{}-{}.ifc".format(i, re.sub(r'[\\/:*?"<>|]', "_", str(name)))
+                new_file = self.split(skeleton, self.get_members(elements))
+                self.logger.info("Writing {} with {} elements".format(dest, len(elements)))
+                # Serialisation needs the file, but the disk write can overlap the next partition
+                futures.append(executor.submit(self.write, dest, new_file.to_string()))
+            for future in futures:
+                future.result()
+
+    def get_partitions(self, mode):
+        if mode in ("storey", "building"):
+            ifc_class = "IfcBuildingStorey" if mode == "storey" else "IfcBuilding"
+            partitions = {e.id(): (e.Name, []) for e in self.file.by_type(ifc_class)}
+            parents = {}
+            for rel in self.file.by_type("IfcRelContainedInSpatialStructure"):
+                structure = rel.RelatingStructure
+                if structure.id() not in parents:
+                    parents[structure.id()] = self.get_parent(structure, ifc_class)
+                parent = parents[structure.id()]
+                if parent:
+                    partitions[parent.id()][1].extend(e for e in rel.RelatedElements if e.is_a("IfcElement"))
+            return list(partitions.values())
+        elif mode == "zone":
+            return [(zone.Name, self.get_zone_elements(zone)) for zone in self.file.by_type("IfcZone")]
+        elif mode == "selector":
+            selector = ifcopenshell.util.selector.Selector()
+            return [
+                (query, [e for e in selector.parse(self.file, query) if e.is_a("IfcProduct")])
+                for query in self.args[1:]
+            ]
+        raise ValueError("Unknown partition {}, expected storey, building, zone or selector".format(mode))
+
+    def get_parent(self, element, ifc_class):
+        while element and not element.is_a(ifc_class):
+            element = element.Decomposes[0].RelatingObject if element.Decomposes else None
+        return element
+
+    def get_zone_elements(self, zone):
+        elements = []
+        rels = zone.IsGroupedBy
+        # IFC2X3 has a single grouping relationship, IFC4 has a set
+        for rel in rels if isinstance(rels, tuple) else [rels] if rels else []:
+            for obj in rel.RelatedObjects:
+                if obj.is_a("IfcZone"):
+                    elements.extend(self.get_zone_elements(obj))
+                elif obj.is_a("IfcSpatialStructureElement"):
+                    elements.append(obj)
+                    for contained in obj.ContainsElements:
+                        elements.extend(contained.RelatedElements)
+                elif obj.is_a("IfcProduct"):
+                    elements.append(obj)
+        return elements
+
+    def get_skeleton(self):
+        if self.file.schema == "IFC2X3":
+            skeleton = self.file.by_type("IfcProject")
+        else:
+            skeleton = self.file.by_type("IfcContext")
+        return skeleton + [e for e in self.file.by_type("IfcProduct") if not e.is_a("IfcElement")]
+
+    def get_members(self, elements):
+        members = {}
+        queue = list(elements)
+        while queue:
+            element = queue.pop()
+            if element.id() in members:
+                continue
+            members[element.id()] = element
+            if element.is_a("IfcElement"):
+                queue.extend(rel.RelatedOpeningElement for rel in element.HasOpenings)
+            for rel in getattr(element, "IsDecomposedBy", []) or []:
+                if not rel.RelatingObject.is_a("IfcSpatialStructureElement"):
+                    queue.extend(rel.RelatedObjects)
+        return list(members.values())
+
+    def split(self, skeleton, members):
+        new_file = ifcopenshell.file(schema=self.file.schema)
+        included = set()
+        types = {}
+        for element in skeleton + members:
+            if element.id() in included:
+                continue
+            included.add(element.id())
+            new_file.add(element)
+            for styled_item in self.get_styled_items(element):
+                new_file.add(styled_item)
+            element_type = ifcopenshell.util.element.get_type(element)
+            if element_type:
+                types[element_type.id()] = element_type
+        included.update(types.keys())
+        relationships = {}
+        for element in skeleton + members + list(types.values()):
+            for rel in self.get_relationships(element):
+                relationships[rel.id()] = rel
+        for rel in relationships.values():
+            self.add_relationship(new_file, rel, included)
+        return new_file
+
+    def get_relationships(self, element):
+        if element.id() not in self.relationships:
+            self.relationships[element.id()] = [
+                r for r in self.file.get_inverse(element) if r.is_a("IfcRelationship")
+            ]
+        return self.relationships[element.id()]
+
+    def get_styled_items(self, element):
+        styled_items = []
+        if not getattr(element, "Representation", None):
+            return styled_items
+        for representation in element.Representation.Representations:
+            if representation.id() not in self.styled_items:
+                self.styled_items[representation.id()] = [
+                    i.StyledByItem[0]
+                    for i in self.file.traverse(representation)
+                    if i.is_a("IfcRepresentationItem") and i.StyledByItem
+                ]
+            styled_items.extend(self.styled_items[representation.id()])
+        return styled_items
+
+    def add_relationship(self, new_file, rel, included):
+        """
+        Copies a relationship with only the products and types in the
+        partition. Relationships left without a relating or related object
+        are skipped.
+        """
+        attributes = []
+        for value in rel:
+            if isinstance(value, tuple) and value:
+                value = tuple(v for v in value if self.is_included(v, included))
+                if not value:
+                    return
+                value = tuple(new_file.add(v) if isinstance(v, ifcopenshell.entity_instance) else v for v in value)
+            elif isinstance(value, ifcopenshell.entity_instance):
+                if not self.is_included(value, included):
+                    return
+                value = new_file.add(value)
+            attributes.append(value)
+        return new_file.create_entity(rel.is_a(), *attributes)
+
+    def is_included(self, value, included):
+        if not isinstance(value, ifcopenshell.entity_instance) or not value.id():
+            return True
+        if value.is_a("IfcProduct") or value.is_a("IfcTypeObject"):
+            return value.id() in included
+        return True
+
+    def write(self, dest, text):
+        with open(dest, "w") as text_file:
+            text_file.write(text)
@@ -37,6 +37,9 @@
 }
 
 %ignore IfcGeom::impl::tree::selector;
+%ignore IfcGeom::impl::tree::ray_selector;
+%ignore IfcGeom::impl::tree::select_ray;
+%ignore IfcGeom::impl::ray_intersection;
 
 %include "../ifcgeom/ifc_geom_api.h"
 %include "../ifcgeom/IfcGeomIteratorSettings.h"
@@ -49,6 +52,41 @@
 // But frankly I don't care as most methods are subtlely different anyway.
 %include "../ifcgeom/IfcGeomTree.h"
 
+%{
+	static PyObject* tree_instances_to_python(const std::vector<IfcUtil::IfcBaseEntity*>& ps) {
+		PyObject* result = PyTuple_New(ps.size());
+		for (size_t i = 0; i < ps.size(); ++i) {
+			PyTuple_SetItem(result, i, pythonize((IfcUtil::IfcBaseClass*) ps[i]));
+		}
+		return result;
+	}
+
+	static PyObject* tree_ray_intersections_to_python(const std::vector< IfcGeom::impl::ray_intersection<IfcUtil::IfcBaseEntity*> >& intersections) {
+		PyObject* result = PyList_New(intersections.size());
+		for (size_t i = 0; i < intersections.size(); ++i) {
+			const IfcGeom::impl::ray_intersection<IfcUtil::IfcBaseEntity*>& x = intersections[i];
+			PyList_SetItem(result, i, Py_BuildValue("(N(ddd)d)",
+				pythonize((IfcUtil::IfcBaseClass*) x.instance),
+				x.position.X(), x.position.Y(), x.position.Z(),
+				x.distance));
+		}
+		return result;
+	}
+
+	static gp_Dir tree_ray_direction(double x, double y, double z) {
+		if (std::sqrt(x * x + y * y + z * z) < 1.e-12) {
+			throw IfcParse::IfcException("Ray direction should not be a null vector");
+		}
+		return gp_Dir(x, y, z);
+	}
+
+	static void tree_check_batch_size(const std::vector<double>& values, size_t n, const std::string& name) {
+		if (values.size() % n != 0) {
+			throw IfcParse::IfcException(name + " should be provided as a flat sequence of " + boost::lexical_cast<std::string>(n) + " floats each");
+		}
+	}
+%}
+
 %extend IfcGeom::tree {
 
 	static IfcEntityList::ptr vector_to_list(const std::vector<IfcUtil::IfcBaseEntity*>& ps) {
@@ -90,6 +128,79 @@
 		return IfcGeom_tree_vector_to_list(ps);
 	}
 
+	IfcEntityList::ptr select_nearest(const gp_Pnt& p, int k = 1) const {
+		std::vector<IfcUtil::IfcBaseEntity*> ps = $self->select_nearest(p, k);
+		return IfcGeom_tree_vector_to_list(ps);
+	}
+
+	IfcEntityList::ptr select_within(const gp_Pnt& p, double distance) const {
+		std::vector<IfcUtil::IfcBaseEntity*> ps = $self->select_within(p, distance);
+		return IfcGeom_tree_vector_to_list(ps);
+	}
+
+	PyObject* select_ray(const gp_Pnt& origin, const gp_Pnt& direction, double length = Precision::Infinite()) const {
+		return tree_ray_intersections_to_python($self->select_ray(origin, tree_ray_direction(direction.X(), direction.Y(), direction.Z()), length));
+	}
+
+	// Batch variants take flat sequences of coordinates and return a list
+	// with the results for every point, box or ray.
+
+	PyObject* select_box_batch(const std::vector<double>& boxes, bool completely_within = false) const {
+		tree_check_batch_size(boxes, 6, "Boxes");
+		std::vector< std::vector<IfcUtil::IfcBaseEntity*> > results(boxes.size() / 6);
+		for (size_t i = 0; i < results.size(); ++i) {
+			Bnd_Box b;
+			b.Add(gp_Pnt(boxes[6 * i + 0], boxes[6 * i + 1], boxes[6 * i + 2]));
+			b.Add(gp_Pnt(boxes[6 * i + 3], boxes[6 * i + 4], boxes[6 * i + 5]));
+			results[i] = $self->select_box(b, completely_within);
+		}
+		PyObject* result = PyList_New(results.size());
+		for (size_t i = 0; i < results.size(); ++i) {
+			PyList_SetItem(result, i, tree_instances_to_python(results[i]));
+		}
+		return result;
+	}
+
+	PyObject* select_nearest_batch(const std::vector<double>& points, int k = 1) const {
+		tree_check_batch_size(points, 3, "Points");
+		std::vector< std::vector<IfcUtil::IfcBaseEntity*> > results(points.size() / 3);
+		for (size_t i = 0; i < results.size(); ++i) {
+			results[i] = $self->select_nearest(gp_Pnt(points[3 * i + 0], points[3 * i + 1], points[3 * i + 2]), k);
+		}
+		PyObject* result = PyList_New(results.size());
+		for (size_t i = 0; i < results.size(); ++i) {
+			PyList_SetItem(result, i, tree_instances_to_python(results[i]));
+		}
+		return result;
+	}
+
+	PyObject* select_within_batch(const std::vector<double>& points, double distance) const {
+		tree_check_batch_size(points, 3, "Points");
+		std::vector< std::vector<IfcUtil::IfcBaseEntity*> > results(points.size() / 3);
+		for (size_t i = 0; i < results.size(); ++i) {
+			results[i] = $self->select_within(gp_Pnt(points[3 * i + 0], points[3 * i + 1], points[3 * i + 2]), distance);
+		}
+		PyObject* result = PyList_New(results.size());
+		for (size_t i = 0; i < results.size(); ++i) {
+			PyList_SetItem(result, i, tree_instances_to_python(results[i]));
+		}
+		return result;
+	}
+
+	PyObject* select_ray_batch(const std::vector<double>& rays, double length = Precision::Infinite()) const {
+		tree_check_batch_size(rays, 6, "Rays");
+		std::vector< std::vector< IfcGeom::impl::ray_intersection<IfcUtil::IfcBaseEntity*> > > results(rays.size() / 6);
+		for (size_t i = 0; i < results.size(); ++i) {
+			const gp_Pnt origin(rays[6 * i + 0], rays[6 * i + 1], rays[6 * i + 2]);
+			results[i] = $self->select_ray(origin, tree_ray_direction(rays[6 * i + 3], rays[6 * i + 4], rays[6 * i + 5]), length);
+		}
+		PyObject* result = PyList_New(results.size());
+		for (size_t i = 0; i < results.size(); ++i) {
+			PyList_SetItem(result, i, tree_ray_intersections_to_python(results[i]));
+		}
+		return result;
+	}
+
 	IfcEntityList::ptr select(const std::string& shape_serialization) const {
 		std::stringstream stream(shape_serialization);
 		BRepTools_ShapeSet shapes;
@@ -166,7 +277,7 @@ struct ShapeRTTI : public boost::static_visitor<PyObject*>
 		def d():
 			import numbers
 			for x in dir(self):
-				if x.isupper() and x not in {"NUM_SETTINGS", "USE_PYTHON_OPENCASCADE"}:
+				if x.isupper() and x not in {"NUM_SETTINGS", "USE_PYTHON_OPENCASCADE"} and not x.startswith("LOD_"):
 					v = getattr(self, x)
 					if isinstance(v, numbers.Integral):
 						yield x
@@ -289,6 +400,7 @@ struct ShapeRTTI : public boost::static_visitor<PyObject*>
         unique_id = property(unique_id)
         transformation = property(transformation)
         product = property(product_)
+        budget_exceeded = property(budget_exceeded)
 	%}
 
 };
@@ -349,6 +461,8 @@ struct ShapeRTTI : public boost::static_visitor<PyObject*>
 			? +1.0
 			: -1.0
 		);
+		kernel.setValue(IfcGeom::Kernel::GV_ELEMENT_TIME_BUDGET, settings.element_time_budget());
+		kernel.setValue(IfcGeom::Kernel::GV_MAX_BOOLEAN_OPERANDS, settings.max_boolean_operands());
 			
 		if (instance->declaration().is(Schema::IfcProduct::Class())) {
 			if (representation) {